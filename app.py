@@ -3,12 +3,35 @@ import io
 import re
 import uuid
 import base64
-from datetime import datetime
-from flask import Flask, request, jsonify, session, redirect, url_for, render_template, send_from_directory, Response
+import hashlib
+import json
+import time
+import threading
+import unicodedata
+from datetime import datetime, timedelta
+from flask import Flask, request, jsonify, session, redirect, url_for, render_template, send_from_directory, Response, g, has_request_context
 from functools import wraps
 import pymysql
 from collections import Counter
-from db_config import get_db_config  # 确保存在数据库配置文件
+from db_pool import get_pool, get_db_connection, add_query_listener
+from db_monitor import (QueryStats, route_summary, log_slow_query, SLOW_QUERY_THRESHOLD_MS,
+                        NPLUS1_THRESHOLD,
+                        begin_n_plus_one_detection, end_n_plus_one_detection)
+from cache_backend import get_cache
+from ref_cache import (get_courses, get_teachers, get_course_teachers, get_teacher_course_ids, course_names,
+                       invalidate_reference_data, invalidate_teacher_courses, reference_cache_stats,
+                       TEACHERS, COURSE_TEACHERS, REF_CACHE_TTL)
+from leave_counters import (record_new_leave, record_status_change, get_leave_counts, get_monthly_stats,
+                            get_top_students)
+from avatar_catalog import AvatarCatalog
+from event_bus import get_event_bus, publish
+from chat_state import record_chat_message, read_receipts, apply_pending_reads, cap_read_position
+from chat_archive import fetch_archived_page, start_chat_archiver
+from chat_contacts import (rebuild_chat_contacts, get_student_contacts, get_staff_contacts, get_chat_contact,
+                           STUDENT, COUNSELOR, TEACHER)
+from ws_gateway import WebSocket, WebSocketResponse, WebSocketClosed, WebSocketUnsupported
+from leave_artifacts import (save_artifact, attach_artifact_urls, STUDENT_SIGNATURE, COUNSELOR_SIGNATURE,
+                             ATTACHMENT, SIGNATURE_FOLDER, CERTIFICATE_FOLDER)
 from terminal.counselor_operation import CounselorOperation
 
 # 初始化Flask应用
@@ -20,17 +43,55 @@ app.config['DEBUG'] = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'  #
 # 确保签字文件夹存在
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# 数据库连接工具函数
-def get_db_connection():
-    """获取数据库连接"""
-    try:
-        config = get_db_config()
-        conn = pymysql.connect(** config)
-        print("数据库连接成功")
-        return conn
-    except Exception as e:
-        print(f"数据库连接失败: {e}")
-        raise
+# 头像目录索引（启动时扫描一次，上传接口登记新文件）
+AVATAR_FOLDER = os.path.join(app.root_path, 'data', 'avatars')
+avatar_catalog = AvatarCatalog(AVATAR_FOLDER)
+
+# 数据库连接：get_db_connection（db_pool.py）在同一请求内复用一个连接
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """请求结束时归还本请求借出的数据库连接"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.close()
+
+# SQL执行统计：记录每个请求的查询条数/耗时，慢查询写入日志
+def record_sql_query(sql, params, elapsed):
+    """连接池语句监听器：累计到当前请求的统计中"""
+    elapsed_ms = elapsed * 1000
+    route = None
+    if has_request_context():
+        stats = g.get('sql_stats')
+        if stats is None:
+            stats = g.sql_stats = QueryStats()
+        stats.add(sql, elapsed_ms)
+        route = request.url_rule.rule if request.url_rule else request.path
+    log_slow_query(route, sql, params, elapsed_ms)
+
+add_query_listener(record_sql_query)
+
+@app.after_request
+def add_sql_timing_header(response):
+    """输出 Server-Timing 响应头，并按路由汇总SQL统计"""
+    stats = g.get('sql_stats') or QueryStats()
+    if request.url_rule and request.endpoint != 'static':
+        route_summary.record(request.url_rule.rule, stats)
+    response.headers['Server-Timing'] = stats.server_timing()
+    return response
+
+# N+1查询检测（开发/测试时设置 SQL_NPLUS1_THRESHOLD 开启）：请求内只记录告警日志，
+# 不改变响应（此时处理函数已提交写操作，报错会让客户端重试已成功的写入）；测试中用 detect_n_plus_one 报错
+if NPLUS1_THRESHOLD > 0:
+    @app.before_request
+    def start_n_plus_one_detection():
+        label = request.url_rule.rule if request.url_rule else request.path
+        g.nplus1_detector = begin_n_plus_one_detection(label=label)
+
+    @app.teardown_request
+    def stop_n_plus_one_detection(exc):
+        detector = g.pop('nplus1_detector', None)
+        if detector is not None:
+            end_n_plus_one_detection(detector)
 
 # 登录验证装饰器（带角色权限控制）
 def login_required(role=None):
@@ -44,14 +105,42 @@ def login_required(role=None):
             # 验证角色权限（如指定角色，仅允许该角色访问）
             if role and session['user_info']['role_name'] != role:
                 return "没有访问权限", 403
-            # 同步头像到 session
-            sync_user_avatar()
+            # 资料（头像、姓名）有变更时才重新从数据库同步到 session
+            user_info = session['user_info']
+            if user_info.get('profile_version') != get_profile_version(user_info.get('role_name'), user_info.get('user_account')):
+                sync_user_avatar()
             return f(*args, **kwargs)
         return decorated_function
     return decorator
 
+# 用户资料版本号：头像/姓名变更时换成新的随机值，session 中记录的版本与之一致时无需查库
+# 版本号保存在共享缓存的 "profile" 命名空间（Redis 后端时多进程可见）；条目过期或被淘汰后生成新值，
+# 对应用户的会话会重新加载一次
+PROFILE_VERSION_TTL = 7 * 24 * 3600
+_profile_cache = get_cache().namespace("profile", ttl=PROFILE_VERSION_TTL)
+
+def get_profile_version(role, user_account):
+    """获取用户资料当前版本号"""
+    return _profile_cache.get_or_load(f"{role}:{user_account}", lambda: uuid.uuid4().hex[:12],
+                                      tags=(f"user:{user_account}",))
+
+def bump_profile_version(role, user_account, **fields):
+    """
+    用户资料变更后调用：更换版本号，该用户其他会话在下次请求时会重新同步
+    如变更的是当前登录用户本人，直接用 fields（如 avatar、user_name）更新 session，无需再查库
+    """
+    version = uuid.uuid4().hex[:12]
+    _profile_cache.set(f"{role}:{user_account}", version, tags=(f"user:{user_account}",))
+
+    user_info = session.get('user_info') if has_request_context() else None
+    if fields and user_info and user_info.get('role_name') == role and user_info.get('user_account') == user_account:
+        user_info.update(fields)
+        user_info['profile_version'] = version
+        session.modified = True
+    return version
+
 def sync_user_avatar():
-    """从数据库同步用户头像到 session"""
+    """从数据库同步用户头像和姓名到 session，并记录当前资料版本号"""
     if 'user_info' not in session:
         return
     
@@ -59,28 +148,90 @@ def sync_user_avatar():
     user_account = session['user_info'].get('user_account')
     
     table_map = {
-        "管理员": ("admin_info", "admin_id", "admin_avatar"),
-        "辅导员": ("counselor_info", "counselor_id", "counselor_avatar"),
-        "讲师": ("teacher_info", "teacher_id", "teacher_avatar"),
-        "学生": ("student_info", "student_id", "student_avatar")
+        "管理员": ("admin_info", "admin_id", "admin_avatar", "admin_name"),
+        "辅导员": ("counselor_info", "counselor_id", "counselor_avatar", "counselor_name"),
+        "讲师": ("teacher_info", "teacher_id", "teacher_avatar", "teacher_name"),
+        "学生": ("student_info", "student_id", "student_avatar", "student_name")
     }
     
     if role not in table_map:
         return
     
-    table_name, id_field, avatar_field = table_map[role]
+    table_name, id_field, avatar_field, name_field = table_map[role]
+    # 先取版本号再查库，查询期间发生的变更会在下次请求时再同步
+    version = get_profile_version(role, user_account)
     
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(f"SELECT {avatar_field} FROM {table_name} WHERE {id_field} = %s", (user_account,))
+        cursor.execute(f"SELECT {avatar_field}, {name_field} FROM {table_name} WHERE {id_field} = %s", (user_account,))
         row = cursor.fetchone()
         if row and row[0]:
             session['user_info']['avatar'] = row[0]
+        if row and row[1]:
+            session['user_info']['user_name'] = row[1]
+        session['user_info']['profile_version'] = version
+        session.modified = True
         cursor.close()
         conn.close()
     except Exception:
-        pass  # 同步失败不影响正常功能
+        pass  # 同步失败不影响正常功能，下次请求重试
+
+# 条件请求（ETag / Last-Modified）：数据未变化时返回 304，不查询列表、不序列化响应体
+# 请假接口中关联数据（student_info 中的学生姓名等、课程名称）的版本号：网页端修改学生信息后更换；
+# 命令行或直接改库的修改在 REF_CACHE_TTL 秒内生效（与课程名称缓存的有效期一致）
+_leave_view_cache = get_cache().namespace("leave_view", ttl=REF_CACHE_TTL)
+
+def get_leave_view_version():
+    return _leave_view_cache.get_or_load("version", lambda: uuid.uuid4().hex[:12])
+
+def bump_leave_view_version():
+    """学生信息变更后调用，使请假列表/统计的 ETag 失效"""
+    _leave_view_cache.set("version", uuid.uuid4().hex[:12])
+
+def leave_etag(resource, where_sql, params):
+    """
+    按 student_leave 中符合条件记录的 (数量, 最近更新时间)、这些假条在 leave_artifacts 中登记的签名/佐证
+    (数量, 最近更新时间) 与关联数据版本号计算 ETag，返回 (etag, last_modified)
+    ETag 同时包含当前用户与查询参数，不同筛选/分页各自独立；where_sql 中的列不要加表别名
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*), MAX(update_time) FROM student_leave WHERE {where_sql}", params)
+    count, last_update = cursor.fetchone()
+    # 保存签名/佐证只写 leave_artifacts，不改 student_leave.update_time
+    cursor.execute(f"""
+        SELECT COUNT(*), MAX(la.update_time)
+        FROM student_leave sl
+        JOIN leave_artifacts la ON la.leave_id = sl.leave_id
+        WHERE {where_sql}
+    """, params)
+    artifact_count, artifact_update = cursor.fetchone()
+    last_modified = max(filter(None, (last_update, artifact_update)), default=None)
+    account = session.get('user_info', {}).get('user_account')
+    raw = (f"{resource}|{account}|{request.query_string.decode('utf-8', 'ignore')}|{count}|{last_update}"
+           f"|{artifact_count}|{artifact_update}|{get_leave_view_version()}")
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24], last_modified
+
+def not_modified_response(etag, last_modified):
+    """客户端缓存仍有效时返回 304 响应，否则返回 None"""
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+        matched = last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        matched = False
+    if not matched:
+        return None
+    return add_validators(Response(status=304), etag, last_modified)
+
+def add_validators(response, etag, last_modified):
+    """为成功的响应加上 ETag / Last-Modified（仅在成功分支调用），并要求浏览器每次携带验证信息重新校验"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 # 页面路由
 @app.route('/')
@@ -265,25 +416,10 @@ def counselor_profile():
         except Exception:
             pass
 
-    image_folder = os.path.join(app.root_path, 'data', 'avatars')
-    avatars = []
-    try:
-        for name in os.listdir(image_folder):
-            lower = name.lower()
-            if lower.endswith('.png') or lower.endswith('.jpg') or lower.endswith('.jpeg') or lower.endswith('.gif'):
-                avatars.append(name)
-    except FileNotFoundError:
-        avatars = []
+    avatars = avatar_catalog.selectable_avatars(session['user_info']['user_account'])
 
     # 优先使用数据库中的头像，其次使用 session，最后使用默认值
-    current_avatar = db_avatar or session.get('user_info', {}).get('avatar')
-    if not current_avatar:
-        if 'boy.png' in avatars:
-            current_avatar = 'boy.png'
-        elif avatars:
-            current_avatar = avatars[0]
-        else:
-            current_avatar = ''
+    current_avatar = db_avatar or session.get('user_info', {}).get('avatar') or avatar_catalog.default_avatar()
 
     # 同步到 session
     if 'user_info' in session and current_avatar:
@@ -417,7 +553,8 @@ def login():
             "user_account": db_account,
             "user_name": db_name,
             "role_name": target['role_name'],
-            "avatar": db_avatar or 'boy.png'  # 默认头像
+            "avatar": db_avatar or 'boy.png',  # 默认头像
+            "profile_version": get_profile_version(target['role_name'], db_account)
         }
         print(f"[DEBUG] session存储: {session['user_info']}")  # 调试
         
@@ -514,38 +651,20 @@ def get_chat_contacts():
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         
-        # 获取当前辅导员负责的年级
+        # 负责年级的学生（chat_contacts 按负责年级物化，附未读数与最后一条消息，最近聊过的在前）
         counselor_id = session['user_info']['user_account']
-        cursor.execute("SELECT responsible_grade FROM counselor_info WHERE counselor_id = %s", (counselor_id,))
-        counselor = cursor.fetchone()
-        
-        if not counselor or not counselor['responsible_grade']:
-            conn.close()
-            return jsonify({"success": True, "data": []})
-        
-        responsible_grade = str(counselor['responsible_grade']).strip()
-        
-        # 获取该年级的学生列表
-        sql = """
-            SELECT student_id, student_name, student_avatar as avatar
-            FROM student_info 
-            WHERE LEFT(student_id, 4) = %s
-            ORDER BY student_id
-        """
-        
-        cursor.execute(sql, (responsible_grade,))
-        students = cursor.fetchall()
+        students = apply_pending_reads(counselor_id, get_student_contacts(cursor, counselor_id))
         
         # 转换为前端需要的格式
         contacts = []
         for student in students:
             contacts.append({
-                "id": student['student_id'],
-                "name": student['student_name'],
+                "id": student['id'],
+                "name": student['name'],
                 "avatar": student['avatar'] or 'boy.png',
-                "unread": 0,
-                "last_message": "点击开始聊天",
-                "last_time": ""
+                "unread": int(student['unread']),
+                "last_message": student['last_message'] or "点击开始聊天",
+                "last_time": student['last_time']
             })
         
         conn.close()
@@ -555,6 +674,288 @@ def get_chat_contacts():
         print(f"获取联系人列表失败: {e}")
         return jsonify({"success": False, "message": "获取联系人列表失败"})
 
+# 聊天记录分页：首屏/向上翻页每次返回的条数与单次上限
+CHAT_PAGE_SIZE = 50
+CHAT_PAGE_MAX = 200
+
+
+def parse_chat_since(value):
+    """解析聊天记录的 since 参数，格式不对返回 None（按未传处理）"""
+    value = value.strip()
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def fetch_chat_page(cursor, user_id, contact_id, columns):
+    """
+    按游标读取两人之间的聊天记录，返回 (messages, has_more)，messages 按发送顺序（message_id 升序）
+
+    查询参数：
+    - after_id: 只返回 message_id 大于它的新消息（轮询增量）
+    - since: 只返回该时间之后的消息（YYYY-MM-DD HH:MM:SS 或 YYYY-MM-DD），未传 after_id 时生效，格式不对时忽略
+    - before_id: 返回比它更早的一页（向上翻看历史）
+    - limit: 单次条数（默认50，最大200）
+    都不传时返回最近 limit 条；has_more 表示该方向上还有未返回的消息
+
+    先查热表 chat_messages；向上翻页（before_id）翻过热表最早一条后继续从学期归档表读取（见 chat_archive.py），
+    首屏只在热表中没有两人的消息时才读归档，增量拉取只查热表
+
+    columns 为 message_id 之外要查询的字段（其中 DATE_FORMAT 的 % 需写成 %%）
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', CHAT_PAGE_SIZE)), CHAT_PAGE_MAX))
+    except ValueError:
+        limit = CHAT_PAGE_SIZE
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    since = parse_chat_since(request.args.get('since', ''))
+
+    sql = f"""
+        SELECT message_id, {columns}
+        FROM chat_messages
+        WHERE ((sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s))
+    """
+    params = [user_id, contact_id, contact_id, user_id]
+
+    ascending = False
+    if after_id is not None:
+        sql += " AND message_id > %s"
+        params.append(after_id)
+        ascending = True
+    elif since:
+        sql += " AND create_time > %s"
+        params.append(since)
+        ascending = True
+    elif before_id is not None:
+        sql += " AND message_id < %s"
+        params.append(before_id)
+
+    # 增量按 id 正序取最早的 limit 条；首屏和向上翻页按 id 倒序取最近的 limit 条再反转
+    sql += " ORDER BY message_id " + ("ASC" if ascending else "DESC") + " LIMIT %s"
+    params.append(limit + 1)
+
+    cursor.execute(sql, params)
+    messages = list(cursor.fetchall())
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    if not ascending and not has_more:
+        # 热表在该方向上已取完：翻看历史（或热表中没有消息）时从归档补足，否则只判断归档中是否还有更早的
+        oldest_id = messages[-1]['message_id'] if messages else before_id
+        remaining = limit - len(messages) if before_id is not None or not messages else 0
+        archived, has_more = fetch_archived_page(cursor, user_id, contact_id, columns, oldest_id, remaining)
+        messages.extend(archived)
+    if not ascending:
+        messages.reverse()
+    return messages, has_more
+
+
+# 站内事件推送（SSE）：连接空闲时每 EVENT_KEEPALIVE 秒发一次心跳，超过 EVENT_STREAM_MAX_AGE 秒主动断开，
+# 浏览器自动重连时重新校验登录状态
+EVENT_KEEPALIVE = 20
+EVENT_STREAM_MAX_AGE = 300
+EVENT_RETRY_MS = 3000
+
+
+@app.route('/api/events', methods=['GET'])
+@login_required()
+def event_stream():
+    """当前用户的事件流（text/event-stream），事件类型见 event_bus.py"""
+    bus = get_event_bus()
+    subscription = bus.subscribe(session['user_info']['user_account'])
+
+    def generate():
+        deadline = time.monotonic() + EVENT_STREAM_MAX_AGE
+        try:
+            yield f"retry: {EVENT_RETRY_MS}\n\n"
+            while time.monotonic() < deadline:
+                item = subscription.get(timeout=EVENT_KEEPALIVE)
+                bus.refresh(subscription)
+                if item is None:
+                    yield ": keepalive\n\n"
+                    continue
+                event, data = item
+                yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+        finally:
+            bus.unsubscribe(subscription)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def insert_chat_message(cursor, sender_id, sender_name, sender_role, receiver_id, receiver_name, receiver_role, content):
+    """写入一条聊天消息并更新双方会话状态（调用方提交事务），返回 message_id"""
+    cursor.execute("""
+        INSERT INTO chat_messages (sender_id, sender_name, sender_role, receiver_id, receiver_name, receiver_role, content, create_time)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+    """, (sender_id, sender_name, sender_role, receiver_id, receiver_name, receiver_role, content))
+    message_id = cursor.lastrowid
+    record_chat_message(cursor, message_id, sender_id, receiver_id, content)
+    return message_id
+
+
+def mark_chat_read(reader_id, peer_id, message_ids):
+    """记录 reader_id 已读到 peer_id 发来的 message_ids 中最大的一条；只记在内存，由 read_receipts 定时批量写库"""
+    if message_ids:
+        read_receipts.mark(reader_id, peer_id, max(message_ids))
+
+
+def publish_chat_message(message_id, sender_id, sender_name, sender_role, receiver_id, content):
+    """聊天消息提交后推送给接收方，返回推送的消息数据"""
+    data = {
+        "message_id": message_id,
+        "sender_id": sender_id,
+        "sender_name": sender_name,
+        "sender_role": sender_role,
+        "content": content,
+        "create_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    publish([receiver_id], "chat", data)
+    return data
+
+
+# 聊天 WebSocket：空闲 CHAT_SOCKET_KEEPALIVE 秒发一次 ping，在线状态按 event_bus.PRESENCE_REFRESH 续期；单条消息最长 CHAT_MESSAGE_MAX_LENGTH 字
+CHAT_SOCKET_KEEPALIVE = 25
+CHAT_MESSAGE_MAX_LENGTH = 2000
+
+
+@app.route('/ws/chat', websocket=True)
+@login_required()
+def chat_socket():
+    """
+    聊天长连接（WebSocket），每条消息为 JSON：
+    客户端 -> 服务端：
+      {"type": "send", "client_id": ..., "to": 账号, "content": ...}  回复 ack（含 message_id）或 error
+      {"type": "typing", "to": 账号}                                   转发 typing 事件给对方
+      {"type": "read", "contact_id": 账号, "message_id": ...}          记录已读位置并转发 read 事件
+      {"type": "ping"}                                                 回复 pong
+    服务端 -> 客户端：上述回复，以及 {"type": 事件类型, "data": ...}（事件见 event_bus.py）
+    不支持 WebSocket 时返回 400，页面改用 /api/events 与各角色的 HTTP 发送接口
+    """
+    user = dict(session['user_info'])
+    if user['role_name'] not in (STUDENT, COUNSELOR, TEACHER):
+        return jsonify({"success": False, "message": "没有聊天权限"}), 403
+    try:
+        ws = WebSocket.accept(request.environ)
+    except WebSocketUnsupported as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    # 长连接内的多条消息不按一个请求做 N+1 检测
+    detector = g.pop('nplus1_detector', None)
+    if detector is not None:
+        end_n_plus_one_detection(detector)
+
+    bus = get_event_bus()
+    subscription = bus.subscribe(user['user_account'])
+    contacts = {}  # 本连接已校验过的联系人：账号 -> {role, name} 或 None
+
+    def forward_events():
+        while not ws.closed:
+            item = subscription.get(timeout=CHAT_SOCKET_KEEPALIVE)
+            if item is None:
+                continue
+            event, data = item
+            try:
+                ws.send(json.dumps({"type": event, "data": data}, ensure_ascii=False, default=str))
+            except WebSocketClosed:
+                break
+
+    writer = threading.Thread(target=forward_events, name=f"ws-chat-{user['user_account']}", daemon=True)
+    writer.start()
+    try:
+        while True:
+            raw = ws.receive(timeout=CHAT_SOCKET_KEEPALIVE)
+            bus.refresh(subscription)
+            if raw is None:
+                ws.ping()
+                continue
+            try:
+                message = json.loads(raw)
+                reply = handle_chat_socket_message(user, contacts, message)
+            except (ValueError, AttributeError):
+                reply = {"type": "error", "message": "消息格式错误"}
+            except pymysql.MySQLError as e:  # 含连接池等待超时（PoolTimeoutError）
+                print(f"处理聊天长连接消息失败: {str(e)}")
+                reply = {"type": "error", "client_id": message.get('client_id'), "message": "服务器繁忙，请稍后重试"}
+            if reply is not None:
+                ws.send(json.dumps(reply, ensure_ascii=False, default=str))
+    except WebSocketClosed:
+        pass
+    finally:
+        ws.close()
+        bus.unsubscribe(subscription)
+        subscription.put(None)  # 唤醒写线程使其退出
+        writer.join(timeout=1)
+    return WebSocketResponse()
+
+
+def handle_chat_socket_message(user, contacts, message):
+    """处理聊天长连接上的一条客户端消息，返回需要回复给该连接的数据（无需回复时返回 None）"""
+    kind = message.get('type')
+    if kind == 'ping':
+        return {"type": "pong"}
+
+    contact_id = str(message.get('to') or message.get('contact_id') or '').strip()
+    if contact_id not in contacts:
+        try:
+            conn = get_pool().acquire()
+            try:
+                cursor = conn.cursor(pymysql.cursors.DictCursor)
+                contacts[contact_id] = get_chat_contact(cursor, user['user_account'], contact_id) if contact_id else None
+            finally:
+                conn.close()
+        except pymysql.MySQLError as e:  # 含连接池等待超时（PoolTimeoutError）
+            print(f"查询聊天联系人失败: {str(e)}")
+            return {"type": "error", "client_id": message.get('client_id'), "message": "服务器繁忙，请稍后重试"}
+    contact = contacts[contact_id]
+
+    if kind == 'send':
+        client_id = message.get('client_id')
+        content = str(message.get('content') or '').strip()
+        if contact is None:
+            return {"type": "error", "client_id": client_id, "message": "不能给该用户发送消息"}
+        if not content or len(content) > CHAT_MESSAGE_MAX_LENGTH:
+            return {"type": "error", "client_id": client_id, "message": f"消息不能为空且不超过{CHAT_MESSAGE_MAX_LENGTH}字"}
+        conn = get_pool().acquire()
+        try:
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            message_id = insert_chat_message(cursor, user['user_account'], user['user_name'], user['role_name'],
+                                             contact_id, contact['name'], contact['role'], content)
+            conn.commit()
+        except Exception as e:
+            print(f"发送消息失败: {str(e)}")
+            return {"type": "error", "client_id": client_id, "message": "发送消息失败"}
+        finally:
+            conn.close()
+        data = publish_chat_message(message_id, user['user_account'], user['user_name'], user['role_name'],
+                                    contact_id, content)
+        return {"type": "ack", "client_id": client_id, "message_id": message_id, "create_time": data["create_time"]}
+
+    if contact is None:
+        return None
+    if kind == 'typing':
+        publish([contact_id], "typing", {"sender_id": user['user_account']})
+    elif kind == 'read':
+        try:
+            message_id = int(message.get('message_id'))
+        except (TypeError, ValueError, OverflowError):
+            return {"type": "error", "message": "缺少已读的消息ID"}
+        # 客户端上报的位置不可信：限制在该会话最后一条消息以内
+        conn = get_pool().acquire()
+        try:
+            message_id = cap_read_position(conn.cursor(), user['user_account'], contact_id, message_id)
+        finally:
+            conn.close()
+        if message_id is None or message_id <= 0:
+            return {"type": "error", "message": "没有可标记已读的消息"}
+        mark_chat_read(user['user_account'], contact_id, [message_id])
+        publish([contact_id], "read", {"reader_id": user['user_account'], "message_id": message_id})
+    return None
+
+
 @app.route('/api/chat/messages', methods=['GET'])
 @login_required(role='辅导员')
 def get_chat_messages():
@@ -578,32 +979,23 @@ def get_chat_messages():
         student_avatar_row = cursor.fetchone()
         student_avatar = student_avatar_row['student_avatar'] if student_avatar_row and student_avatar_row.get('student_avatar') else 'boy.png'
         
-        # 获取聊天记录
-        cursor.execute("""
-            SELECT message_id, sender_id, sender_name, sender_role, content, 
-                   DATE_FORMAT(create_time, '%%Y-%%m-%%d %%H:%%i:%%s') as create_time,
-                   CASE WHEN sender_id = %s THEN 1 ELSE 0 END as is_self
-            FROM chat_messages 
-            WHERE (sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s)
-            ORDER BY create_time ASC
-        """, (counselor_id, counselor_id, contact_id, contact_id, counselor_id))
-        
-        messages = cursor.fetchall()
+        # 获取聊天记录（支持 after_id / since / before_id 游标）
+        messages, has_more = fetch_chat_page(cursor, counselor_id, contact_id, """
+            sender_id, sender_name, sender_role, content, 
+            DATE_FORMAT(create_time, '%%Y-%%m-%%d %%H:%%i:%%s') as create_time
+        """)
         
         # 为每条消息添加头像
         for msg in messages:
+            msg['is_self'] = 1 if msg['sender_id'] == counselor_id else 0
             if msg['is_self']:
                 msg['avatar'] = counselor_avatar
             else:
                 msg['avatar'] = student_avatar
         
-        # 标记消息为已读
-        cursor.execute("""
-            UPDATE chat_messages SET is_read = 1 
-            WHERE sender_id = %s AND receiver_id = %s AND is_read = 0
-        """, (contact_id, counselor_id))
-        conn.commit()
-        return jsonify({"success": True, "data": messages})
+        # 记录已读位置（只读请求，批量写库）
+        mark_chat_read(counselor_id, contact_id, [msg['message_id'] for msg in messages if not msg['is_self']])
+        return jsonify({"success": True, "data": messages, "has_more": has_more})
         
     except Exception as e:
         print(f"获取消息失败: {e}")
@@ -740,9 +1132,16 @@ def add_user():
         else:
             return jsonify({"success": False, "message": "无效的角色类型"})
         
+        if role_type in (1, 2, 3):
+            rebuild_chat_contacts(cursor, account)
         conn.commit()
         conn.close()
         
+        if role_type == 3:
+            invalidate_reference_data(TEACHERS)
+        elif role_type == 1:
+            bump_leave_view_version()
+        
         role_map = {1: 'student', 2: 'counselor', 3: 'teacher', 4: 'admin'}
         role_name_map = {1: '学生', 2: '辅导员', 3: '教师', 4: '管理员'}
         details = f"新增{role_name_map.get(role_type, '用户')}：{user_name}"
@@ -892,9 +1291,23 @@ def update_user(account):
                                target_role='unknown', details=f"尝试修改用户：{account}", status='FAILED', error_msg='用户不存在')
             return jsonify({"success": False, "message": "用户不存在"})
         
+        # 角色或辅导员负责年级变化后联系人随之变化
+        if (new_role and new_role != current_role) or (current_role == 2 and new_grade):
+            rebuild_chat_contacts(cursor, account)
         conn.commit()
         conn.close()
         
+        # 姓名或角色变化后，让该用户已登录的会话重新同步资料
+        if new_name or (new_role and new_role != current_role):
+            profile_role_map = {1: '学生', 2: '辅导员', 3: '讲师', 4: '管理员'}
+            bump_profile_version(profile_role_map[current_role], account)
+        # 教师姓名变化或教师/非教师角色互转都会影响教师列表
+        if 3 in (current_role, new_role):
+            invalidate_reference_data(TEACHERS)
+        # 学生姓名等出现在请假列表中
+        if 1 in (current_role, new_role):
+            bump_leave_view_version()
+        
         role_map = {1: 'student', 2: 'counselor', 3: 'teacher', 4: 'admin'}
         role_name_map = {1: '学生', 2: '辅导员', 3: '教师', 4: '管理员'}
         update_details = []
@@ -968,8 +1381,16 @@ def delete_user(account):
                                target_role='unknown', details=f"尝试删除用户：{account}", status='FAILED', error_msg='用户不存在')
             return jsonify({"success": False, "message": "用户不存在"})
         
+        rebuild_chat_contacts(cursor, account)
         conn.commit()
         conn.close()
+        if deleted_user_role == 'teacher':
+            invalidate_reference_data(TEACHERS, COURSE_TEACHERS)
+            invalidate_teacher_courses(account)
+        elif deleted_user_role == 'student':
+            bump_leave_view_version()
+        # 清除该用户的缓存（资料版本号等），其已登录的会话下次请求时重新同步
+        get_cache().invalidate_tags(f"user:{account}")
         return jsonify({"success": True, "message": "用户删除成功"})
         
     except Exception as e:
@@ -984,14 +1405,7 @@ def delete_user(account):
 def get_all_courses():
     """获取所有课程列表（仅管理员）"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        
-        cursor.execute("SELECT course_id, course_name FROM course_info ORDER BY course_id")
-        courses = cursor.fetchall()
-        
-        conn.close()
-        return jsonify({"success": True, "data": courses})
+        return jsonify({"success": True, "data": get_courses()})
         
     except Exception as e:
         return jsonify({"success": False, "message": f"获取课程列表失败：{str(e)}"})
@@ -1042,6 +1456,7 @@ def update_student_courses(student_id):
                     INSERT INTO student_course (student_id, course_id)
                     VALUES (%s, %s)
                 """, (student_id, course_id))
+        rebuild_chat_contacts(cursor, student_id)
         
         conn.commit()
         conn.close()
@@ -1114,9 +1529,12 @@ def update_teacher_courses(teacher_id):
                     INSERT INTO teacher_course (teacher_id, course_id)
                     VALUES (%s, %s)
                 """, (teacher_id, course_id))
+        rebuild_chat_contacts(cursor, teacher_id)
         
         conn.commit()
         conn.close()
+        invalidate_reference_data(COURSE_TEACHERS)
+        invalidate_teacher_courses(teacher_id)
         
         log_admin_operation(
             operation_type='UPDATE',
@@ -1304,39 +1722,8 @@ def get_teacher_chat_students():
         
         teacher_id = session['user_info']['user_account']
         
-        # 方式1：从teacher_course表获取教师课程，再查选课学生
-        cursor.execute("""
-            SELECT DISTINCT si.student_id as id, si.student_name as name, si.student_avatar as avatar
-            FROM teacher_course tc
-            JOIN student_course scs ON tc.course_id = scs.course_id
-            JOIN student_info si ON scs.student_id = si.student_id
-            WHERE tc.teacher_id = %s
-            ORDER BY si.student_id
-        """, (teacher_id,))
-        students = cursor.fetchall()
-        
-        if not students:
-            # 方式2：从请假记录中获取该教师的课程，再查所有选课学生
-            cursor.execute("""
-                SELECT DISTINCT si.student_id as id, si.student_name as name, si.student_avatar as avatar
-                FROM student_leave sl
-                JOIN student_course scs ON sl.leave_course_id = scs.course_id
-                JOIN student_info si ON scs.student_id = si.student_id
-                WHERE FIND_IN_SET(%s, sl.leave_teacher_id) > 0
-                ORDER BY si.student_id
-            """, (teacher_id,))
-            students = cursor.fetchall()
-        
-        if not students:
-            # 方式3：仅从请假记录获取（最终兜底）
-            cursor.execute("""
-                SELECT DISTINCT sl.leave_student_id as id, sl.leave_student_name as name, si.student_avatar as avatar
-                FROM student_leave sl
-                LEFT JOIN student_info si ON sl.leave_student_id = si.student_id
-                WHERE FIND_IN_SET(%s, sl.leave_teacher_id) > 0
-                ORDER BY sl.leave_student_id
-            """, (teacher_id,))
-            students = cursor.fetchall()
+        # 所授课程的选课学生（chat_contacts 按 teacher_course x student_course 物化）
+        students = apply_pending_reads(teacher_id, get_student_contacts(cursor, teacher_id))
         
         conn.close()
         
@@ -1361,17 +1748,15 @@ def get_teacher_chat_messages():
         
         teacher_id = session['user_info']['user_account']
         
-        cursor.execute("""
-            SELECT content, sender_role,
-                   DATE_FORMAT(create_time, '%%Y-%%m-%%d %%H:%%i') as create_time
-            FROM chat_messages
-            WHERE (sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s)
-            ORDER BY create_time ASC
-        """, (teacher_id, student_id, student_id, teacher_id))
-        messages = cursor.fetchall()
+        messages, has_more = fetch_chat_page(cursor, teacher_id, student_id, """
+            content, sender_role,
+            DATE_FORMAT(create_time, '%%Y-%%m-%%d %%H:%%i') as create_time
+        """)
         conn.close()
+        # 记录已读位置（只读请求，批量写库）
+        mark_chat_read(teacher_id, student_id, [msg['message_id'] for msg in messages if msg['sender_role'] != TEACHER])
         
-        return jsonify({"success": True, "data": messages})
+        return jsonify({"success": True, "data": messages, "has_more": has_more})
         
     except Exception as e:
         print(f"获取聊天记录失败: {str(e)}")
@@ -1401,13 +1786,11 @@ def teacher_send_chat_message():
         student_row = cursor.fetchone()
         student_name = student_row['student_name'] if student_row else '学生'
         
-        cursor.execute("""
-            INSERT INTO chat_messages (sender_id, sender_name, sender_role, receiver_id, receiver_name, receiver_role, content, create_time)
-            VALUES (%s, %s, '讲师', %s, %s, '学生', %s, NOW())
-        """, (teacher_id, teacher_name, student_id, student_name, message))
+        message_id = insert_chat_message(cursor, teacher_id, teacher_name, TEACHER, student_id, student_name, STUDENT, message)
         
         conn.commit()
         conn.close()
+        publish_chat_message(message_id, teacher_id, teacher_name, '讲师', student_id, message)
         
         return jsonify({"success": True, "message": "发送成功"})
         
@@ -1540,6 +1923,7 @@ def _deprecated_upload_teacher_avatar():
         cursor.execute("UPDATE teacher_info SET teacher_avatar = %s WHERE teacher_id = %s", (filename, teacher_id))
         conn.commit()
         conn.close()
+        bump_profile_version('讲师', teacher_id, avatar=filename)
         
         return jsonify({"success": True, "avatar": filename, "message": "头像更新成功"})
         
@@ -1591,32 +1975,17 @@ def get_counselor_leave_count():
         responsible_grade = session['user_info'].get('responsible_grade', '')
         responsible_grade = str(responsible_grade).strip() if responsible_grade else ''
         
-        sql = """
-            SELECT 
-                SUM(CASE WHEN approval_status = '待审批' THEN 1 ELSE 0 END) as pending,
-                SUM(CASE WHEN approval_status = '已批准' THEN 1 ELSE 0 END) as approved,
-                SUM(CASE WHEN approval_status = '已驳回' THEN 1 ELSE 0 END) as rejected,
-                COUNT(*) as total
-            FROM student_leave
-            WHERE 1=1
-        """
-        
-        params = []
-        if responsible_grade:
-            sql += " AND LEFT(leave_student_id, 4) = %s"
-            params.append(responsible_grade)
-        
-        cursor.execute(sql, params)
-        result = cursor.fetchone()
+        # 读取写请假时同步维护的 leave_counters（按年级主键查找），不扫描 student_leave
+        counts = get_leave_counts(cursor, responsible_grade)
         conn.close()
         
         return jsonify({
             "success": True,
             "data": {
-                "pending": result['pending'] or 0,
-                "approved": result['approved'] or 0,
-                "rejected": result['rejected'] or 0,
-                "total": result['total'] or 0
+                "pending": counts.get('待审批', 0),
+                "approved": counts.get('已批准', 0),
+                "rejected": counts.get('已驳回', 0),
+                "total": sum(counts.values())
             }
         })
         
@@ -1624,22 +1993,108 @@ def get_counselor_leave_count():
         print(f"获取待审批数量失败: {e}")
         return jsonify({"success": False, "message": "获取数量失败"})
 
+# 辅导员请假列表分页：每页默认条数与上限
+LEAVE_PAGE_SIZE = 20
+LEAVE_PAGE_MAX = 100
+
+
+def encode_leave_cursor(start_time, leave_id):
+    """把 (leave_start_time, leave_id) 编码为不透明的翻页游标"""
+    raw = f"{start_time.strftime('%Y-%m-%d %H:%M:%S')}|{leave_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_leave_cursor(cursor):
+    """解析翻页游标，格式错误返回 None"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        start_time, leave_id = raw.split('|', 1)
+        return datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S'), int(leave_id)
+    except (ValueError, UnicodeError):
+        return None
+
+
 # 辅导员获取请假记录接口
 @app.route('/api/counselor/leave_requests', methods=['GET'])
 @login_required(role='辅导员')
 def get_counselor_leave_requests():
-    """获取辅导员相关的请假记录（基于负责年级）"""
+    """
+    获取辅导员相关的请假记录（基于负责年级），筛选与分页均在SQL中完成
+
+    查询参数：
+    - status: 待审批/已批准/已驳回（不传或 all 表示全部）
+    - start_date / end_date: 按请假开始日期筛选（YYYY-MM-DD，含首尾）
+    - keyword: 学号前缀或姓名关键字
+    - grade: 年级（仅未设置负责年级时生效）
+    - limit: 每页条数（默认20，最大100）
+    - cursor: 上一页返回的 next_cursor，按 (leave_start_time, leave_id) 倒序继续翻页
+
+    不带 cursor 的首页请求会在 X-Total-Count 响应头中返回符合条件的总数
+    """
     try:
+        # 获取当前登录辅导员的负责年级
+        responsible_grade = str(session['user_info'].get('responsible_grade') or '').strip()
+        grade = responsible_grade or request.args.get('grade', '').strip()
+        status = request.args.get('status', '').strip()
+        start_date = request.args.get('start_date', '').strip()
+        end_date = request.args.get('end_date', '').strip()
+        keyword = request.args.get('keyword', '').strip()
+        cursor_arg = request.args.get('cursor', '').strip()
+
+        try:
+            limit = int(request.args.get('limit', LEAVE_PAGE_SIZE))
+        except ValueError:
+            return jsonify({"success": False, "message": "limit 参数无效"}), 400
+        limit = max(1, min(limit, LEAVE_PAGE_MAX))
+
+        where = ["1=1"]
+        params = []
+        # 根据年级过滤学生请假记录（grade 为学号前4位生成列，走索引）
+        if grade:
+            where.append("sl.grade = %s")
+            params.append(grade)
+        if status and status != 'all':
+            if status not in ('待审批', '已批准', '已驳回'):
+                return jsonify({"success": False, "message": "status 参数无效"}), 400
+            where.append("sl.approval_status = %s")
+            params.append(status)
+        try:
+            if start_date:
+                where.append("sl.leave_start_time >= %s")
+                params.append(datetime.strptime(start_date, '%Y-%m-%d'))
+            if end_date:
+                where.append("sl.leave_start_time < %s")
+                params.append(datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
+        except ValueError:
+            return jsonify({"success": False, "message": "日期格式应为 YYYY-MM-DD"}), 400
+        if keyword:
+            if keyword.isdigit():
+                where.append("sl.leave_student_id LIKE %s")
+                params.append(keyword + '%')
+            else:
+                where.append("si.student_name LIKE %s")
+                params.append('%' + keyword + '%')
+
+        filter_sql = " AND ".join(where)
+        page_sql = filter_sql
+        page_params = list(params)
+        if cursor_arg:
+            position = decode_leave_cursor(cursor_arg)
+            if position is None:
+                return jsonify({"success": False, "message": "cursor 参数无效"}), 400
+            page_sql += " AND (sl.leave_start_time < %s OR (sl.leave_start_time = %s AND sl.leave_id < %s))"
+            page_params.extend([position[0], position[0], position[1]])
+
+        # 版本号按负责年级计算，筛选与翻页参数包含在 ETag 中
+        etag, last_modified = leave_etag('counselor_leave_requests', "grade = %s" if grade else "1=1", (grade,) if grade else ())
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
-        
-        # 获取当前登录辅导员的ID和负责年级
-        counselor_id = session['user_info']['user_account']
-        responsible_grade = session['user_info'].get('responsible_grade', '')
-        
-        # 根据年级过滤学生请假记录
-        # 从学生ID的前4位判断年级
-        sql = """
+
+        cursor.execute(f"""
             SELECT 
                 sl.leave_id,
                 sl.leave_student_id as student_id,
@@ -1660,30 +2115,43 @@ def get_counselor_leave_requests():
             LEFT JOIN 
                 student_info si ON sl.leave_student_id = si.student_id
             WHERE 
-                1=1
-        """
-        
-        # 如果有负责年级，添加年级过滤条件
-        params = []
-        if responsible_grade:
-            # 清理responsible_grade，去除空白字符
-            responsible_grade = str(responsible_grade).strip()
-            if responsible_grade:
-                sql += " AND LEFT(sl.leave_student_id, 4) = %s"
-                params.append(responsible_grade)
-        
-        # 添加排序
-        sql += " ORDER BY sl.leave_start_time DESC"
-        
-        cursor.execute(sql, params)
+                {page_sql}
+            ORDER BY sl.leave_start_time DESC, sl.leave_id DESC
+            LIMIT %s
+        """, page_params + [limit + 1])
         leave_requests = cursor.fetchall()
-        
+
+        # 多取一条用于判断是否还有下一页
+        next_cursor = None
+        if len(leave_requests) > limit:
+            leave_requests = leave_requests[:limit]
+            last = leave_requests[-1]
+            next_cursor = encode_leave_cursor(last['start_time'], last['leave_id'])
+        attach_artifact_urls(cursor, leave_requests)
+
+        total = None
+        if not cursor_arg:
+            # 只有按姓名搜索时才需要关联 student_info，否则计数可直接在 student_leave 的索引上完成
+            join_sql = "LEFT JOIN student_info si ON sl.leave_student_id = si.student_id" if keyword and not keyword.isdigit() else ""
+            cursor.execute(f"""
+                SELECT COUNT(*) as total
+                FROM student_leave sl
+                {join_sql}
+                WHERE {filter_sql}
+            """, params)
+            total = cursor.fetchone()['total']
+
         conn.close()
-        
-        return jsonify({
+
+        response = jsonify({
             "success": True,
-            "data": leave_requests
+            "data": leave_requests,
+            "next_cursor": next_cursor,
+            "total": total
         })
+        if total is not None:
+            response.headers['X-Total-Count'] = str(total)
+        return add_validators(response, etag, last_modified)
         
     except pymysql.MySQLError as e:
         print(f"数据库错误: {str(e)}")
@@ -1698,69 +2166,65 @@ def get_counselor_leave_requests():
         })
 
 # 辅导员请假统计API
+# 统计页图表与排行覆盖的月数
+STATS_MONTHS = 12
+
 @app.route('/api/counselor/leave_statistics', methods=['GET'])
 @login_required(role='辅导员')
 def get_leave_statistics():
     """获取请假统计数据"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        
-        responsible_grade = session['user_info'].get('responsible_grade', '')
-        
-        sql = """
-            SELECT sl.leave_id, sl.leave_student_id as student_id, si.student_name, sl.sort,
-                   sl.leave_start_time as start_time, sl.leave_end_time as end_time, sl.approval_status
-            FROM student_leave sl
-            LEFT JOIN student_info si ON sl.leave_student_id = si.student_id
-            WHERE 1=1
-        """
-        params = []
-        if responsible_grade:
-            sql += " AND LEFT(sl.leave_student_id, 4) = %s"
-            params.append(responsible_grade)
+        responsible_grade = str(session['user_info'].get('responsible_grade') or '').strip()
         
-        cursor.execute(sql, params)
-        records = cursor.fetchall()
-        conn.close()
+        # 总数、状态分布、图表与排行都统计最近 STATS_MONTHS 个月（含本月）
+        now = datetime.now()
+        month_index = now.year * 12 + now.month - STATS_MONTHS
+        since_month = f"{month_index // 12:04d}-{month_index % 12 + 1:02d}"
         
-        total = len(records)
-        status_count = Counter(r['approval_status'] for r in records)
-        type_count = Counter(r['sort'] or '其他' for r in records)
-        grade_count = Counter(r['student_id'][:4] + '级' for r in records if r['student_id'])
+        # 统计窗口随月份滚动，版本号带上窗口起点
+        etag, last_modified = leave_etag(f'counselor_leave_statistics:{since_month}',
+                                         "grade = %s" if responsible_grade else "1=1",
+                                         (responsible_grade,) if responsible_grade else ())
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
         
-        month_count = {}
-        for r in records:
-            if r['start_time']:
-                month_key = r['start_time'].strftime('%Y-%m') if hasattr(r['start_time'], 'strftime') else str(r['start_time'])[:7]
-                month_count[month_key] = month_count.get(month_key, 0) + 1
+        conn = get_db_connection()
+        cursor = conn.cursor()
         
+        # 读取写请假时同步维护的汇总表，只读统计窗口内的汇总行，耗时与历史数据量无关
+        status_count = Counter()
+        type_count = Counter()
+        grade_count = Counter()
+        month_count = Counter()
         total_days = 0
-        valid_count = 0
-        for r in records:
-            if r['start_time'] and r['end_time']:
-                try:
-                    start = r['start_time']
-                    end = r['end_time']
-                    days = (end - start).days + 1
-                    if days > 0:
-                        total_days += days
-                        valid_count += 1
-                except:
-                    pass
-        avg_days = round(total_days / valid_count, 1) if valid_count > 0 else 0
+        for grade, month, sort, status, leave_count, leave_days in get_monthly_stats(cursor, since_month, responsible_grade):
+            status_count[status] += leave_count
+            type_count[sort] += leave_count
+            grade_count[grade + '级'] += leave_count
+            month_count[month] += leave_count
+            total_days += leave_days
+        total = sum(status_count.values())
+        avg_days = round(total_days / total, 1) if total > 0 else 0
+        
+        # 请假次数排行（前10名），供统计页排行表使用；读按学生汇总的月度表
+        top_students = [{"id": row[0], "name": row[1] or row[0], "count": int(row[2]), "days": int(row[3] or 0)}
+                        for row in get_top_students(cursor, since_month, responsible_grade)]
+        conn.close()
         
-        return jsonify({
+        return add_validators(jsonify({
             "success": True,
             "data": {
                 "total": total,
                 "by_status": dict(status_count),
                 "by_type": dict(type_count),
                 "by_grade": dict(grade_count),
-                "by_month": dict(sorted(month_count.items())[-12:] if month_count else {}),
-                "avg_days": avg_days
+                "by_month": dict(sorted(month_count.items())),
+                "avg_days": avg_days,
+                "top_students": top_students,
+                "since_month": since_month
             }
-        })
+        }), etag, last_modified)
     except Exception as e:
         return jsonify({"success": False, "message": str(e)})
 
@@ -1787,10 +2251,14 @@ def counselor_approve_leave():
         counselor_name = session['user_info']['user_name']
         responsible_grade = session['user_info'].get('responsible_grade', '')
         
-        # 创建CounselorOperation实例并调用审批方法
-        counselor = CounselorOperation(counselor_id, counselor_name, responsible_grade)
+        # 创建CounselorOperation实例并调用审批方法（复用本请求的连接池连接）
+        counselor = CounselorOperation(counselor_id, counselor_name, responsible_grade, conn=get_db_connection())
         result = counselor.approve_leave_api(leave_id, action)
-        counselor._close_db()  # 确保关闭数据库连接
+        counselor._close_db()  # 关闭游标，连接由请求结束时统一归还
+        if result.get("success"):
+            publish([result.get("student_id")], "leave_status",
+                    {"leave_id": leave_id, "approval_status": result.get("approval_status"),
+                     "approver_name": counselor_name})
         
         return jsonify(result)
         
@@ -1827,20 +2295,23 @@ def teacher_approve_leave():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        # 1. 校验请假记录 - 修改为支持逗号分隔的course_code
+        # 1. 校验并读取请假记录（一条语句）：请假课程中有本教师所授课程（课程集合读缓存），或本人审批过
+        course_ids = get_teacher_course_ids(teacher_id)
         sql_check = """
-            SELECT sl.leave_id, sl.approval_status 
+            SELECT sl.leave_id, sl.approval_status, sl.leave_student_id
             FROM student_leave sl
             WHERE sl.leave_id = %s
-            AND (
-                # 使用FIND_IN_SET函数检查教师是否负责请假记录中的任一课程
-                EXISTS (SELECT 1 FROM teacher_courses tc 
-                        WHERE tc.teacher_id = %s 
-                        AND FIND_IN_SET(tc.course_id, sl.leave_course_id))
-                OR sl.approver_id = %s
-            )
+            AND (sl.approver_id = %s
         """
-        cursor.execute(sql_check, (leave_id, teacher_id, teacher_id))
+        params = [leave_id, teacher_id]
+        if course_ids:
+            sql_check += f"""
+                OR EXISTS (SELECT 1 FROM student_leave_course slc
+                           WHERE slc.leave_id = sl.leave_id
+                           AND slc.course_id IN ({', '.join(['%s'] * len(course_ids))}))
+            """
+            params.extend(course_ids)
+        cursor.execute(sql_check + ")", params)
         result = cursor.fetchone()
         
         if not result:
@@ -1854,30 +2325,28 @@ def teacher_approve_leave():
         # 2. 确定审批结果
         new_status = "已批准" if action == "approve" else "已驳回"
         approval_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        student_id = result[2]
         
-        # 3. 获取学生ID（用于更新times字段）
-        sql_get_student_id = """
-            SELECT leave_student_id FROM student_leave WHERE leave_id = %s
-        """
-        cursor.execute(sql_get_student_id, (leave_id,))
-        student_id_result = cursor.fetchone()
-        student_id = student_id_result[0] if student_id_result else None
-        
-        # 4. 事务处理：更新请假记录 + （仅同意时）更新学生times
+        # 3. 事务处理：更新请假记录 + 请假数量 + （仅同意时）更新学生times
         conn.begin()
         
-        # 4.1 更新请假记录
+        # 3.1 更新请假记录（仅待审批时更新，防止并发重复审批导致计数错误）
         sql_update = """
             UPDATE student_leave
             SET approval_status = %s, 
                 approver_id = %s, 
                 approver_name = %s, 
                 approval_time = %s
-            WHERE leave_id = %s
+            WHERE leave_id = %s AND approval_status = '待审批'
         """
         cursor.execute(sql_update, (new_status, teacher_id, teacher_name, approval_time, leave_id))
+        if cursor.rowcount != 1:
+            conn.rollback()
+            conn.close()
+            return jsonify({"success": False, "message": "该请假记录已被审批，无需重复审批"})
+        record_status_change(cursor, leave_id, "待审批", new_status)
         
-        # 4.2 仅"同意"时，更新student_info的times字段
+        # 3.2 仅"同意"时，更新student_info的times字段
         if action == "approve" and student_id:
             sql_update_student = """
                 UPDATE student_info
@@ -1888,6 +2357,8 @@ def teacher_approve_leave():
         
         conn.commit()
         conn.close()
+        publish([student_id], "leave_status",
+                {"leave_id": leave_id, "approval_status": new_status, "approver_name": teacher_name})
         
         return jsonify({
             "success": True,
@@ -1993,25 +2464,10 @@ def api_get_courses():
 @app.route('/api/teachers', methods=['GET'])
 @login_required(role='学生')
 def api_get_teachers():
-    """返回所有教师列表：[{teacher_id, teacher_name}, ...]"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-        cursor.execute("SELECT teacher_id, teacher_name FROM teacher_info ORDER BY teacher_id")
-        rows = cursor.fetchall()
-        return jsonify({"success": True, "data": rows})
+        return jsonify({"success": True, "data": get_teachers()})
     except pymysql.MySQLError as e:
         return jsonify({"success": False, "message": f"查询失败：{str(e)}"})
-    finally:
-        try:
-            cursor.close()
-        except Exception:
-            pass
-        try:
-            if conn and conn.open:
-                conn.close()
-        except Exception:
-            pass
 
 
 @app.route('/api/course_teachers', methods=['GET'])
@@ -2020,21 +2476,9 @@ def api_course_teachers():
     """根据 course_id 返回该课程的授课教师（返回 teacher_id, teacher_name 列表）"""
     course_id = request.args.get('course_id', '').strip()  # 直接使用course_id参数
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(pymysql.cursors.DictCursor)
-
         if course_id:
-            # 直接查询teacher_course表获取该课程的所有授课教师
-            cursor.execute("""
-                SELECT ti.teacher_id, ti.teacher_name
-                FROM teacher_course tc
-                JOIN teacher_info ti ON tc.teacher_id = ti.teacher_id
-                WHERE tc.course_id = %s
-            """, (course_id,))
-            rows = cursor.fetchall()
-            
-            # 过滤空结果
-            rows = [r for r in rows if r and r.get('teacher_id')]
+            # 该课程的所有授课教师（teacher_course + teacher_info，读缓存）
+            rows = get_course_teachers(course_id)
             
             # 如果没有找到，返回友好提示
             if not rows:
@@ -2044,23 +2488,11 @@ def api_course_teachers():
 
         else:
             # 无 course_id 则返回所有教师
-            cursor.execute("SELECT teacher_id, teacher_name FROM teacher_info ORDER BY teacher_id")
-            rows = cursor.fetchall()
-            return jsonify({"success": True, "data": rows})
+            return jsonify({"success": True, "data": get_teachers()})
 
     except Exception as e:
         print(f"获取课程教师信息失败: {str(e)}")
         return jsonify({"success": False, "message": f"查询失败：{str(e)}"})
-    finally:
-        try:
-            cursor.close()
-        except Exception:
-            pass
-        try:
-            if conn and conn.open:
-                conn.close()
-        except Exception:
-            pass
 
 
 @app.route('/api/student/leave', methods=['POST'])
@@ -2120,10 +2552,21 @@ def api_student_leave():
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         ''', (student_account, student_name, dept, course_codes, teacher_ids, leave_reason, start_time, end_time, approval_status, current_times, leave_type))
         
-        conn.commit()
-        
         # 获取新插入的leave_id
         leave_id = cursor.lastrowid
+        record_new_leave(cursor, leave_id)
+        
+        # 同一事务内写入请假-课程-教师关联表（教师端按此表走索引查询）
+        cursor.executemany('''
+            INSERT IGNORE INTO student_leave_course (leave_id, course_id, teacher_id)
+            VALUES (%s, %s, %s)
+        ''', [(leave_id, pair.get('course_id', '').strip(), pair.get('teacher_id', '').strip()) for pair in course_teacher_pairs])
+        
+        conn.commit()
+        publish(teacher_ids.split(','), "leave_notice", {
+            "leave_id": leave_id, "student_id": student_account, "student_name": student_name,
+            "course_ids": course_codes, "leave_start_time": start_time, "leave_end_time": end_time,
+        })
         
         return jsonify({"success": True, "message": "请假提交成功", "leave_id": leave_id})
         
@@ -2156,6 +2599,11 @@ def api_student_leave_records():
     conn = None
     cursor = None
     try:
+        etag, last_modified = leave_etag('student_leave_records', "leave_student_id = %s", (student_id,))
+        not_modified = not_modified_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+        
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         
@@ -2182,21 +2630,12 @@ def api_student_leave_records():
         
         records = cursor.fetchall()
         
-        # 获取所有课程名称的映射
-        cursor.execute("SELECT course_id, course_name FROM course_info")
-        course_map = {row['course_id']: row['course_name'] for row in cursor.fetchall()}
-        
-        # 为每条记录添加课程名称
+        # 为每条记录添加课程名称（课程名称映射读缓存）
         for record in records:
-            if record.get('course_id'):
-                course_ids = record['course_id'].split(',')
-                course_names = [course_map.get(cid.strip(), cid.strip()) for cid in course_ids]
-                record['course_names'] = ', '.join(course_names)
-            else:
-                record['course_names'] = ''
+            record['course_names'] = course_names(record.get('course_id'))
         
         print(f"查询成功，获取到{len(records)}条记录")
-        return jsonify({"success": True, "data": records})
+        return add_validators(jsonify({"success": True, "data": records}), etag, last_modified)
     except pymysql.MySQLError as e:
         print(f"MySQL错误查询学生请假记录失败: {str(e)}")
         return jsonify({"success": False, "message": f"数据库查询失败：{str(e)}"})
@@ -2247,37 +2686,10 @@ def get_leave_detail(leave_id):
             return jsonify({"success": False, "message": "无权查看此假条"})
         
         # 获取课程名称
-        if leave.get('course_id'):
-            course_ids = leave['course_id'].split(',')
-            placeholders = ','.join(['%s'] * len(course_ids))
-            cursor.execute(f"SELECT course_id, course_name FROM course_info WHERE course_id IN ({placeholders})", course_ids)
-            course_map = {row['course_id']: row['course_name'] for row in cursor.fetchall()}
-            leave['course_names'] = ', '.join([course_map.get(cid.strip(), cid.strip()) for cid in course_ids])
-        else:
-            leave['course_names'] = ''
-        
-        # 检查签名文件
-        signature_folder = os.path.join(app.root_path, 'data', 'signatures')
-        student_sign = f"{leave['student_id']}_{leave_id}.png"
-        counselor_sign = f"{leave.get('approver_id', '')}_{leave_id}.png" if leave.get('approver_id') else ''
-        
-        # 调试日志
-        print(f"[签名检查] leave_id={leave_id}, approver_id={leave.get('approver_id')}")
-        print(f"[签名检查] 辅导员签名文件: {os.path.join(signature_folder, counselor_sign)}")
-        print(f"[签名检查] 文件是否存在: {os.path.exists(os.path.join(signature_folder, counselor_sign)) if counselor_sign else 'N/A'}")
-        
-        leave['student_signature'] = f"/qianzi/{student_sign}" if os.path.exists(os.path.join(signature_folder, student_sign)) else None
-        leave['counselor_signature'] = f"/qianzi/{counselor_sign}" if counselor_sign and os.path.exists(os.path.join(signature_folder, counselor_sign)) else None
-        
-        # 检查佐证文件
-        if leave.get('attachment'):
-            attachment_folder = os.path.join(app.root_path, 'data', 'certificates')
-            if os.path.exists(os.path.join(attachment_folder, leave['attachment'])):
-                leave['attachment_url'] = f"/zhengming/{leave['attachment']}"
-            else:
-                leave['attachment_url'] = None
-        else:
-            leave['attachment_url'] = None
+        leave['course_names'] = course_names(leave.get('course_id'))
+        
+        # 签名与佐证文件 URL 取自 leave_artifacts 登记表，不访问文件系统
+        attach_artifact_urls(cursor, [leave])
         
         cursor.close()
         conn.close()
@@ -2296,33 +2708,23 @@ def get_student_chat_contacts():
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         
         student_id = session['user_info']['user_account']
-        grade = student_id[:4]
         
         # 获取当前学生头像
         cursor.execute("SELECT student_avatar FROM student_info WHERE student_id = %s", (student_id,))
         student_row = cursor.fetchone()
         student_avatar = student_row['student_avatar'] if student_row and student_row.get('student_avatar') else None
         
-        # 获取本年级的辅导员（含头像）
-        cursor.execute("""
-            SELECT counselor_id as id, counselor_name as name, '辅导员' as role, counselor_contact as contact, counselor_avatar as avatar
-            FROM counselor_info 
-            WHERE responsible_grade = %s
-        """, (grade,))
-        counselors = cursor.fetchall()
-        
-        # 获取学生选课的讲师（去重，含头像）
-        cursor.execute("""
-            SELECT DISTINCT ti.teacher_id as id, ti.teacher_name as name, '讲师' as role, ti.teacher_contact as contact, ti.teacher_avatar as avatar,
-                   GROUP_CONCAT(ci.course_name SEPARATOR ', ') as courses
-            FROM student_course scs
-            JOIN teacher_course tc ON scs.course_id = tc.course_id
-            JOIN teacher_info ti ON tc.teacher_id = ti.teacher_id
-            JOIN course_info ci ON scs.course_id = ci.course_id
-            WHERE scs.student_id = %s
-            GROUP BY ti.teacher_id, ti.teacher_name, ti.teacher_contact, ti.teacher_avatar
-        """, (student_id,))
-        teachers = cursor.fetchall()
+        # 本年级的辅导员与所选课程的讲师（含头像，讲师附共同课程名）
+        counselors, teachers = [], []
+        staff = apply_pending_reads(student_id, get_staff_contacts(cursor, student_id))
+        online = get_event_bus().is_online([contact['id'] for contact in staff])
+        for contact in staff:
+            contact['online'] = online[contact['id']]
+            if contact['role'] == COUNSELOR:
+                contact.pop('courses')
+                counselors.append(contact)
+            else:
+                teachers.append(contact)
         
         conn.close()
         return jsonify({
@@ -2353,17 +2755,13 @@ def get_student_chat_messages():
             return jsonify({"success": True, "data": []})
         
         # 获取聊天记录：学生发给联系人 或 联系人发给学生
-        cursor.execute("""
-            SELECT content, sender_role as sender_type, create_time as created_at 
-            FROM chat_messages 
-            WHERE (sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s)
-            ORDER BY create_time ASC
-        """, (student_id, contact_id, contact_id, student_id))
-        
-        messages = cursor.fetchall()
+        messages, has_more = fetch_chat_page(cursor, student_id, contact_id,
+                                             "content, sender_role as sender_type, create_time as created_at")
         conn.close()
+        # 记录已读位置（只读请求，批量写库）
+        mark_chat_read(student_id, contact_id, [msg['message_id'] for msg in messages if msg['sender_type'] != STUDENT])
         
-        return jsonify({"success": True, "data": messages})
+        return jsonify({"success": True, "data": messages, "has_more": has_more})
     except Exception as e:
         print(f"获取聊天记录失败: {str(e)}")
         return jsonify({"success": False, "message": "获取聊天记录失败"})
@@ -2403,13 +2801,11 @@ def send_student_chat_message():
         contact_name = contact_row['name'] if contact_row else contact_role
         
         # 插入消息记录
-        cursor.execute("""
-            INSERT INTO chat_messages (sender_id, sender_name, sender_role, receiver_id, receiver_name, receiver_role, content, create_time)
-            VALUES (%s, %s, '学生', %s, %s, %s, %s, NOW())
-        """, (student_id, student_name, contact_id, contact_name, contact_role, message))
+        message_id = insert_chat_message(cursor, student_id, student_name, STUDENT, contact_id, contact_name, contact_role, message)
         
         conn.commit()
         conn.close()
+        publish_chat_message(message_id, student_id, student_name, '学生', contact_id, message)
         
         return jsonify({"success": True, "message": "消息发送成功"})
     except Exception as e:
@@ -2430,17 +2826,13 @@ def get_counselor_chat_messages():
         
         counselor_id = session['user_info']['user_account']
         
-        cursor.execute("""
-            SELECT content, sender_role as sender_type, create_time as created_at 
-            FROM chat_messages 
-            WHERE (sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s)
-            ORDER BY create_time ASC
-        """, (counselor_id, student_id, student_id, counselor_id))
-        
-        messages = cursor.fetchall()
+        messages, has_more = fetch_chat_page(cursor, counselor_id, student_id,
+                                             "sender_id, content, sender_role as sender_type, create_time as created_at")
         conn.close()
         
-        return jsonify({"success": True, "data": messages})
+        # 记录已读位置（只读请求，批量写库）
+        mark_chat_read(counselor_id, student_id, [msg['message_id'] for msg in messages if msg['sender_id'] != counselor_id])
+        return jsonify({"success": True, "data": messages, "has_more": has_more})
     except Exception as e:
         print(f"获取辅导员聊天记录失败: {str(e)}")
         return jsonify({"success": False, "message": "获取聊天记录失败"})
@@ -2474,13 +2866,11 @@ def send_counselor_chat_message():
         student_name = student_row['student_name'] if student_row else '学生'
         
         # 插入消息记录
-        cursor.execute("""
-            INSERT INTO chat_messages (sender_id, sender_name, sender_role, receiver_id, receiver_name, receiver_role, content, create_time)
-            VALUES (%s, %s, '辅导员', %s, %s, '学生', %s, NOW())
-        """, (counselor_id, counselor_name, student_id, student_name, message))
+        message_id = insert_chat_message(cursor, counselor_id, counselor_name, COUNSELOR, student_id, student_name, STUDENT, message)
         
         conn.commit()
         conn.close()
+        publish_chat_message(message_id, counselor_id, counselor_name, '辅导员', student_id, message)
         
         return jsonify({"success": True, "message": "消息发送成功"})
     except Exception as e:
@@ -2492,24 +2882,21 @@ def send_counselor_chat_message():
 @app.route('/data/avatars/<path:filename>')
 def serve_head_image(filename):
     """提供头像图片访问"""
-    image_folder = os.path.join(app.root_path, 'data', 'avatars')
-    return send_from_directory(image_folder, filename)
+    return send_from_directory(AVATAR_FOLDER, filename)
 
 # 签名图片访问路由（支持新旧两种URL）
 @app.route('/qianzi/<path:filename>')
 @app.route('/data/signatures/<path:filename>')
 def serve_signature_image(filename):
     """提供签名图片访问"""
-    signature_folder = os.path.join(app.root_path, 'data', 'signatures')
-    return send_from_directory(signature_folder, filename)
+    return send_from_directory(SIGNATURE_FOLDER, filename)
 
 # 佐证文件访问路由（支持新旧两种URL）
 @app.route('/zhengming/<path:filename>')
 @app.route('/data/certificates/<path:filename>')
 def serve_attachment_file(filename):
     """提供佐证文件访问"""
-    attachment_folder = os.path.join(app.root_path, 'data', 'certificates')
-    return send_from_directory(attachment_folder, filename)
+    return send_from_directory(CERTIFICATE_FOLDER, filename)
 
 # 上传佐证文件API
 @app.route('/api/leave/upload_attachment', methods=['POST'])
@@ -2549,21 +2936,13 @@ def upload_leave_attachment():
             conn.close()
             return jsonify({"success": False, "message": "仅支持图片(png/jpg/gif)或PDF文件"})
         
-        # 创建存储文件夹
-        attachment_folder = os.path.join(app.root_path, 'data', 'certificates')
-        if not os.path.exists(attachment_folder):
-            os.makedirs(attachment_folder)
-        
         # 生成文件名：student_id_leave_id.ext
         filename = f"{student_id}_{leave_id}.{ext}"
-        filepath = os.path.join(attachment_folder, filename)
-        
-        # 保存文件
-        file.save(filepath)
         
-        # 更新数据库
+        # 更新假条的佐证文件名并登记文件，提交成功后文件才替换为正式文件名
         cursor.execute("UPDATE student_leave SET attachment = %s WHERE leave_id = %s", (filename, leave_id))
-        conn.commit()
+        with save_artifact(cursor, ATTACHMENT, leave_id, student_id, filename, file.read()) as url:
+            conn.commit()
         cursor.close()
         conn.close()
         
@@ -2571,7 +2950,7 @@ def upload_leave_attachment():
             "success": True, 
             "message": "佐证文件上传成功",
             "filename": filename,
-            "filepath": f"/zhengming/{filename}"
+            "filepath": url
         })
         
     except Exception as e:
@@ -2602,8 +2981,6 @@ def save_student_signature():
             cursor.close()
             conn.close()
             return jsonify({"success": False, "message": "无权操作此假条"})
-        cursor.close()
-        conn.close()
         
         # 解码base64并保存图片
         if ',' in signature_data:
@@ -2611,16 +2988,12 @@ def save_student_signature():
         
         image_data = base64.b64decode(signature_data)
         
-        # 保存文件
-        signature_folder = os.path.join(app.root_path, 'data', 'signatures')
-        if not os.path.exists(signature_folder):
-            os.makedirs(signature_folder)
-        
+        # 保存文件并登记
         filename = f"{student_id}_{leave_id}.png"
-        filepath = os.path.join(signature_folder, filename)
-        
-        with open(filepath, 'wb') as f:
-            f.write(image_data)
+        with save_artifact(cursor, STUDENT_SIGNATURE, leave_id, student_id, filename, image_data):
+            conn.commit()
+        cursor.close()
+        conn.close()
         
         return jsonify({"success": True, "message": "签名保存成功", "imagePath": filename})
     except Exception as e:
@@ -2651,8 +3024,6 @@ def save_counselor_signature():
             cursor.close()
             conn.close()
             return jsonify({"success": False, "message": "假条不存在"})
-        cursor.close()
-        conn.close()
         
         # 解码base64并保存图片
         if ',' in signature_data:
@@ -2660,16 +3031,12 @@ def save_counselor_signature():
         
         image_data = base64.b64decode(signature_data)
         
-        # 保存文件
-        signature_folder = os.path.join(app.root_path, 'data', 'signatures')
-        if not os.path.exists(signature_folder):
-            os.makedirs(signature_folder)
-        
+        # 保存文件并登记
         filename = f"{counselor_id}_{leave_id}.png"
-        filepath = os.path.join(signature_folder, filename)
-        
-        with open(filepath, 'wb') as f:
-            f.write(image_data)
+        with save_artifact(cursor, COUNSELOR_SIGNATURE, leave_id, counselor_id, filename, image_data):
+            conn.commit()
+        cursor.close()
+        conn.close()
         
         return jsonify({"success": True, "message": "签名保存成功", "imagePath": filename})
     except Exception as e:
@@ -2720,16 +3087,9 @@ def get_counselor_info():
 # 获取可用头像列表
 @app.route('/api/avatars', methods=['GET'])
 def get_avatars():
-    """获取可用头像列表"""
-    image_folder = os.path.join(app.root_path, 'data', 'avatars')
-    try:
-        avatars = [
-            name for name in os.listdir(image_folder)
-            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))
-        ]
-        return jsonify({"success": True, "data": avatars})
-    except FileNotFoundError:
-        return jsonify({"success": True, "data": []})
+    """获取可用头像列表（内置头像 + 当前用户上传的头像）"""
+    user_account = session.get('user_info', {}).get('user_account')
+    return jsonify({"success": True, "data": avatar_catalog.selectable_avatars(user_account)})
 
 # 学生更新联系方式
 @app.route('/api/student/contact', methods=['POST'])
@@ -2767,21 +3127,12 @@ def update_user_avatar():
     if not avatar:
         return jsonify({"success": False, "message": "未选择头像"})
 
-    image_folder = os.path.join(app.root_path, 'data', 'avatars')
-    try:
-        valid_files = [
-            name for name in os.listdir(image_folder)
-            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))
-        ]
-    except FileNotFoundError:
-        return jsonify({"success": False, "message": "头像目录不存在"})
-
-    if avatar not in valid_files:
-        return jsonify({"success": False, "message": "非法的头像文件"})
-
     role = session['user_info']['role_name']
     user_account = session['user_info']['user_account']
 
+    if not avatar_catalog.can_select(user_account, avatar):
+        return jsonify({"success": False, "message": "非法的头像文件"})
+
     table_map = {
         "管理员": ("admin_info", "admin_id"),
         "辅导员": ("counselor_info", "counselor_id"),
@@ -2823,8 +3174,7 @@ def update_user_avatar():
         except Exception:
             pass
 
-    if 'user_info' in session:
-        session['user_info']['avatar'] = avatar
+    bump_profile_version(role, user_account, avatar=avatar)
 
     return jsonify({"success": True, "message": "头像已保存", "avatar": avatar})
 
@@ -2860,13 +3210,13 @@ def upload_user_avatar():
     filename = f"avatar_{user_id}.{ext}"
     
     # 保存文件
-    image_folder = os.path.join(app.root_path, 'data', 'avatars')
-    filepath = os.path.join(image_folder, filename)
+    filepath = os.path.join(AVATAR_FOLDER, filename)
     
     try:
         file.save(filepath)
     except Exception as e:
         return jsonify({"success": False, "message": f"保存失败：{str(e)}"})
+    avatar_catalog.add_upload(user_id, filename)
     
     # 更新数据库
     role = session['user_info']['role_name']
@@ -2900,8 +3250,8 @@ def upload_user_avatar():
     except pymysql.MySQLError as e:
         return jsonify({"success": False, "message": f"数据库更新失败：{str(e)}"})
     
-    # 更新 session
-    session['user_info']['avatar'] = filename
+    # 更新 session 并使该用户其他会话重新同步
+    bump_profile_version(role, user_id, avatar=filename)
     
     return jsonify({"success": True, "message": "头像上传成功", "avatar": filename})
 
@@ -2910,14 +3260,7 @@ def upload_user_avatar():
 @login_required(role='学生')
 def student_profile_page():
     """学生个人信息页面"""
-    image_folder = os.path.join(app.root_path, 'data', 'avatars')
-    try:
-        available_avatars = [
-            name for name in os.listdir(image_folder)
-            if name.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))
-        ]
-    except FileNotFoundError:
-        available_avatars = []
+    available_avatars = avatar_catalog.selectable_avatars(session['user_info']['user_account'])
     
     # 从数据库获取头像
     try:
@@ -2982,7 +3325,7 @@ def export_leaves_excel():
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         
-        responsible_grade = session['user_info'].get('responsible_grade', '')
+        responsible_grade = str(session['user_info'].get('responsible_grade') or '').strip()
         status_filter = request.args.get('status', '')
         
         sql = """
@@ -2997,7 +3340,7 @@ def export_leaves_excel():
         """
         params = []
         if responsible_grade:
-            sql += " AND LEFT(sl.leave_student_id, 4) = %s"
+            sql += " AND sl.grade = %s"
             params.append(responsible_grade)
         if status_filter:
             sql += " AND sl.approval_status = %s"
@@ -3198,6 +3541,25 @@ def get_operation_logs():
         traceback.print_exc()
         return jsonify({"success": False, "message": f"获取日志失败：{str(e)}", "data": []})
 
+# 管理员专用接口 - SQL执行统计
+@app.route('/api/admin/sql-stats', methods=['GET'])
+@login_required(role='管理员')
+def get_sql_stats():
+    """按路由查看最近请求的SQL条数与耗时（仅管理员）"""
+    return jsonify({
+        "success": True,
+        "data": {
+            "routes": route_summary.snapshot(),
+            "pool": get_pool().stats(),
+            "reference_cache": reference_cache_stats(),
+            "ai_answer_cache": ai_answer_cache.stats(),
+            "cache": get_cache().stats(),
+            "events": get_event_bus().stats(),
+            "read_receipts": read_receipts.stats(),
+            "slow_threshold_ms": SLOW_QUERY_THRESHOLD_MS
+        }
+    })
+
 # 管理员专用接口 - 记录操作日志（辅助函数）
 def log_admin_operation(operation_type, target_account=None, target_name=None, target_role=None, details=None, status='SUCCESS', error_msg=None):
     """记录管理员操作日志"""
@@ -3211,24 +3573,23 @@ def log_admin_operation(operation_type, target_account=None, target_name=None, t
         # 获取客户端IP
         ip_address = request.remote_addr
         
-        # 创建新的数据库连接
+        # 单独借出一个连接，避免提交到业务请求中尚未提交的事务
         print(f"[LOG] 正在连接数据库...")
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        print(f"[LOG] 正在执行INSERT语句...")
-        cursor.execute("""
-            INSERT INTO admin_operation_logs 
-            (admin_account, admin_name, operation_type, target_user_account, target_user_name, 
-             target_user_role, operation_details, ip_address, status, error_message)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (admin_account, admin_name, operation_type, target_account, target_name, 
-              target_role, details, ip_address, status, error_msg))
-        
-        print(f"[LOG] 正在提交事务...")
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            
+            print(f"[LOG] 正在执行INSERT语句...")
+            cursor.execute("""
+                INSERT INTO admin_operation_logs 
+                (admin_account, admin_name, operation_type, target_user_account, target_user_name, 
+                 target_user_role, operation_details, ip_address, status, error_message)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (admin_account, admin_name, operation_type, target_account, target_name, 
+                  target_role, details, ip_address, status, error_msg))
+            
+            print(f"[LOG] 正在提交事务...")
+            conn.commit()
+            cursor.close()
         print(f"[LOG] ✓ 日志记录成功！")
     except Exception as e:
         print(f"[LOG] ✗ 记录操作日志失败: {str(e)}")
@@ -3237,9 +3598,103 @@ def log_admin_operation(operation_type, target_account=None, target_name=None, t
         # 日志记录失败不影响主业务
 
 # ========== AI助手（本地Ollama） ==========
+OLLAMA_URL = "http://localhost:11434/api/chat"
+AI_MODEL = "qwen3:4b"
+
+# 系统提示词
+AI_SYSTEM_PROMPT = """你是"请了吗"请假管理系统的智能助手小龙🐉。
+
+你可以帮助学生解答请假流程、提交申请、解释请假类型、查看记录、生成模板。
+
+重要：直接输出回复内容，不要输出任何思考过程、分析或计划。开头用"你好"或问候语。"""
+# 提示词版本：修改提示词后旧答案自动失效
+AI_PROMPT_VERSION = hashlib.sha1(AI_SYSTEM_PROMPT.encode('utf-8')).hexdigest()[:8]
+
+# 回答缓存：常见问题（如“怎么请假”）直接返回已有答案，不再占用模型与工作线程
+AI_CACHE_TTL = float(os.environ.get('AI_CACHE_TTL', '3600'))
+ai_answer_cache = get_cache().namespace("ai", ttl=AI_CACHE_TTL)
+
+AI_DEFAULT_REPLY = '你好！有什么可以帮你的吗？😊'
+
+
+class AIServiceError(Exception):
+    """模型服务返回错误（不缓存）"""
+
+
+class AIEmptyReplyError(AIServiceError):
+    """模型回复清理后没有可用内容（不缓存，返回默认问候）"""
+
+
+def normalize_ai_question(text):
+    """归一化问题作为缓存键：全角转半角、忽略大小写与空白、去掉句末标点"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = re.sub(r'\s+', '', text)
+    return text.rstrip('?!.~,。、')
+
+
+def clean_ai_reply(ai_reply):
+    """清理思考标签（qwen3特有）- 只保留最终回复，没有可用内容时返回空字符串"""
+    # 移除<think>标签内容
+    if '<think>' in ai_reply:
+        ai_reply = re.sub(r'<think>.*?</think>', '', ai_reply, flags=re.DOTALL).strip()
+    
+    # 移除未闭合的<think>标签及其后内容（思考未完成时）
+    if '<think>' in ai_reply:
+        ai_reply = re.sub(r'<think>.*', '', ai_reply, flags=re.DOTALL).strip()
+    
+    # 移除常见的思考过程开头（没有标签的情况）
+    thinking_patterns = [
+        r'^首先[，,].*?(?=\n\n|你好|我是|请|好的)',
+        r'^用户.*?(?=\n\n|你好|我是|请|好的)',
+        r'^我需要.*?(?=\n\n|你好|我是|请|好的)',
+        r'^作为.*?(?=\n\n|你好|我是|请|好的)',
+        r'^让我.*?(?=\n\n|你好|我是|请|好的)',
+    ]
+    for pattern in thinking_patterns:
+        ai_reply = re.sub(pattern, '', ai_reply, flags=re.DOTALL).strip()
+    
+    # 如果回复以思考词开头，尝试找到真正的回复
+    thinking_starts = ('首先', '用户', '我需要', '作为', '让我', '我的角色', 
+                     '请假模板，', '关键点', '这个问题', '好的，', '分析')
+    if ai_reply.startswith(thinking_starts) or '这可能意味着' in ai_reply[:100]:
+        # 查找真正回复的开始，找不到就视为没有可用回复
+        match = re.search(r'(你好[呀！~]?|亲爱的|我是小龙|请参考|以下是|✨|【请)', ai_reply)
+        ai_reply = ai_reply[match.start():] if match else ''
+    
+    return ai_reply.strip()
+
+
+def ask_ollama(user_message):
+    """调用本地Ollama模型，返回清理后的回复"""
+    import requests
+    
+    # 在用户消息末尾添加/no_think禁用思考模式
+    payload = {
+        "model": AI_MODEL,
+        "messages": [
+            {"role": "system", "content": AI_SYSTEM_PROMPT},
+            {"role": "user", "content": user_message + " /no_think"}
+        ],
+        "stream": False,
+        "options": {
+            "temperature": 0.7,
+            "num_predict": 500
+        }
+    }
+    
+    response = requests.post(OLLAMA_URL, json=payload, timeout=30)
+    if response.status_code != 200:
+        raise AIServiceError("AI服务暂时不可用")
+    
+    ai_reply = clean_ai_reply(response.json().get('message', {}).get('content', ''))
+    if not ai_reply:
+        raise AIEmptyReplyError("没有可用回复")
+    return ai_reply
+
+
 @app.route('/api/ai/chat', methods=['POST'])
 def ai_chat():
-    """调用本地Ollama模型进行对话"""
+    """调用本地Ollama模型进行对话（相同问题直接返回缓存答案）"""
     import requests
     
     try:
@@ -3249,73 +3704,21 @@ def ai_chat():
         if not user_message:
             return jsonify({"success": False, "message": "消息不能为空"})
         
-        # 系统提示词
-        system_prompt = """你是"请了吗"请假管理系统的智能助手小龙🐉。
-
-你可以帮助学生解答请假流程、提交申请、解释请假类型、查看记录、生成模板。
-
-重要：直接输出回复内容，不要输出任何思考过程、分析或计划。开头用"你好"或问候语。"""
-
-        # 调用本地Ollama API（在用户消息末尾添加/no_think禁用思考模式）
-        ollama_url = "http://localhost:11434/api/chat"
-        payload = {
-            "model": "qwen3:4b",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message + " /no_think"}
-            ],
-            "stream": False,
-            "options": {
-                "temperature": 0.7,
-                "num_predict": 500
-            }
-        }
+        question = normalize_ai_question(user_message)
+        key = f"{AI_PROMPT_VERSION}:{AI_MODEL}:{hashlib.sha1(question.encode('utf-8')).hexdigest()}"
+        loaded = []
         
-        response = requests.post(ollama_url, json=payload, timeout=30)
+        def load():
+            loaded.append(True)
+            return ask_ollama(user_message)
         
-        if response.status_code == 200:
-            result = response.json()
-            ai_reply = result.get('message', {}).get('content', '抱歉，我暂时无法回答。')
-            
-            # 清理思考标签（qwen3特有）- 只保留最终回复
-            import re as regex
-            
-            # 移除<think>标签内容
-            if '<think>' in ai_reply:
-                ai_reply = regex.sub(r'<think>.*?</think>', '', ai_reply, flags=regex.DOTALL).strip()
-            
-            # 移除未闭合的<think>标签及其后内容（思考未完成时）
-            if '<think>' in ai_reply:
-                ai_reply = regex.sub(r'<think>.*', '', ai_reply, flags=regex.DOTALL).strip()
-            
-            # 移除常见的思考过程开头（没有标签的情况）
-            thinking_patterns = [
-                r'^首先[，,].*?(?=\n\n|你好|我是|请|好的)',
-                r'^用户.*?(?=\n\n|你好|我是|请|好的)',
-                r'^我需要.*?(?=\n\n|你好|我是|请|好的)',
-                r'^作为.*?(?=\n\n|你好|我是|请|好的)',
-                r'^让我.*?(?=\n\n|你好|我是|请|好的)',
-            ]
-            for pattern in thinking_patterns:
-                ai_reply = regex.sub(pattern, '', ai_reply, flags=regex.DOTALL).strip()
-            
-            # 如果回复以思考词开头，尝试找到真正的回复
-            thinking_starts = ('首先', '用户', '我需要', '作为', '让我', '我的角色', 
-                             '请假模板，', '关键点', '这个问题', '好的，', '分析')
-            if ai_reply.startswith(thinking_starts) or '这可能意味着' in ai_reply[:100]:
-                # 查找真正回复的开始
-                match = regex.search(r'(你好[呀！~]?|亲爱的|我是小龙|请参考|以下是|✨|【请)', ai_reply)
-                if match:
-                    ai_reply = ai_reply[match.start():]
-                else:
-                    # 找不到就返回默认回复
-                    ai_reply = '你好！有什么可以帮你的吗？😊'
-            
-            if not ai_reply.strip():
-                ai_reply = '你好！有什么可以帮你的吗？😊'
-            return jsonify({"success": True, "reply": ai_reply})
-        else:
-            return jsonify({"success": False, "message": "AI服务暂时不可用"})
+        try:
+            ai_reply = ai_answer_cache.get_or_load(key, load, tags=("ai",))
+        except AIEmptyReplyError:
+            return jsonify({"success": True, "reply": AI_DEFAULT_REPLY, "cached": False})
+        except AIServiceError as e:
+            return jsonify({"success": False, "message": str(e)})
+        return jsonify({"success": True, "reply": ai_reply, "cached": not loaded})
             
     except requests.exceptions.ConnectionError:
         return jsonify({"success": False, "message": "请确保Ollama服务已启动（ollama serve）"})
@@ -3332,6 +3735,9 @@ if __name__ == '__main__':
         port = int(os.environ.get('FLASK_PORT', '8080'))
         debug = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
         
+        # 聊天记录归档：后台定时把超过保留天数的消息移入学期归档表（见 chat_archive.py）；
+        # 只在服务进程中启动，导入 app（测试、命令行工具）时不启动
+        start_chat_archiver()
         print(f"启动Flask应用: {host}:{port}, Debug: {debug}")
         app.run(host=host, port=port, debug=debug, use_reloader=False)
     except Exception as e:
@@ -0,0 +1,113 @@
+"""
+头像目录索引
+
+data/avatars 下既有内置的可选头像（boy.png、girl.png 等），也有用户上传的头像，
+上传头像随用户数增长。这里在启动时扫描一次目录，之后由上传接口登记新文件：
+1. 内置头像与用户上传头像分开保存，可选列表只返回内置头像 + 当前用户自己上传的头像
+2. 文件是否存在、用户能否选用某头像均为集合查找，不再每次请求 os.listdir
+3. 手工向目录中放入新的内置头像后需重启服务（或调用 refresh()）才会出现在列表中
+4. 索引是每个进程各自的，多个工作进程时上传只登记在处理上传的进程中：
+   其他进程查不到某用户的上传头像时按文件名检查磁盘（os.path.isfile），存在则补登记
+"""
+import os
+import re
+import threading
+
+AVATAR_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+# 用户上传头像的文件名：avatar_<账号>.<ext>（统一上传接口）、
+# teacher_<工号>_<随机串>.<ext>（旧教师上传接口）、<账号>_<随机串>.<ext>（早期上传）
+UPLOAD_NAME_RES = (
+    re.compile(r"^avatar_(?P<owner>.+)\.\w+$"),
+    re.compile(r"^teacher_(?P<owner>.+)_[0-9a-f]{8,}\.\w+$"),
+    re.compile(r"^(?P<owner>\d+)_[0-9a-f]{8,}\.\w+$"),
+)
+
+
+def upload_owner(filename):
+    """上传头像返回所属账号，内置头像返回 None"""
+    for pattern in UPLOAD_NAME_RES:
+        match = pattern.match(filename)
+        if match:
+            return match.group("owner")
+    return None
+
+
+class AvatarCatalog:
+    """线程安全的头像目录索引"""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._builtin = []      # 内置头像，按文件名排序
+        self._builtin_set = set()
+        self._uploads = {}      # 账号 -> {文件名}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """重新扫描目录"""
+        try:
+            names = [name for name in os.listdir(self.folder) if name.lower().endswith(AVATAR_EXTENSIONS)]
+        except FileNotFoundError:
+            names = []
+
+        builtin, uploads = [], {}
+        for name in sorted(names):
+            owner = upload_owner(name)
+            if owner is None:
+                builtin.append(name)
+            else:
+                uploads.setdefault(owner, set()).add(name)
+
+        with self._lock:
+            self._builtin = builtin
+            self._builtin_set = set(builtin)
+            self._uploads = uploads
+
+    def add_upload(self, user_account, filename):
+        """上传接口保存文件后登记"""
+        with self._lock:
+            self._uploads.setdefault(str(user_account), set()).add(filename)
+
+    def _discover(self, user_account, filenames):
+        """在磁盘上查找本进程尚未登记的、属于该用户的上传头像，存在的补登记，返回找到的文件名"""
+        found = []
+        for filename in filenames:
+            if (upload_owner(filename) == user_account and os.path.basename(filename) == filename
+                    and os.path.isfile(os.path.join(self.folder, filename))):
+                found.append(filename)
+        if found:
+            with self._lock:
+                self._uploads.setdefault(user_account, set()).update(found)
+        return found
+
+    def builtin_avatars(self):
+        with self._lock:
+            return list(self._builtin)
+
+    def selectable_avatars(self, user_account=None):
+        """可选头像：内置头像 + 该用户自己上传的头像（含其他进程处理的上传）"""
+        if not user_account:
+            return self.builtin_avatars()
+        user_account = str(user_account)
+        candidates = [f"avatar_{user_account}{ext}" for ext in AVATAR_EXTENSIONS]
+        with self._lock:
+            missing = [name for name in candidates if name not in self._uploads.get(user_account, ())]
+        self._discover(user_account, missing)
+        with self._lock:
+            return self._builtin + sorted(self._uploads.get(user_account, ()))
+
+    def can_select(self, user_account, filename):
+        """用户能否选用该头像（内置头像或自己上传的头像）"""
+        user_account = str(user_account)
+        with self._lock:
+            if filename in self._builtin_set or filename in self._uploads.get(user_account, ()):
+                return True
+        return bool(self._discover(user_account, [filename]))
+
+    def default_avatar(self):
+        """未设置头像时的默认值"""
+        with self._lock:
+            if 'boy.png' in self._builtin_set:
+                return 'boy.png'
+            return self._builtin[0] if self._builtin else ''
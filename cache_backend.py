@@ -0,0 +1,410 @@
+"""
+缓存后端
+
+应用内各类缓存（基础数据、资料版本号、AI 回答等）统一通过这里读写，按部署方式选择后端：
+1. memory：进程内 LRU + TTL，适用于单进程部署（默认）
+2. redis：通过 Redis 协议（RESP）访问 Redis 或兼容服务，多个工作进程共享同一份缓存，
+   某个进程写库后失效缓存，其他进程立即可见；值以 JSON 保存
+两种后端都支持按标签失效：写入时附带标签（如 "grade:2023"、"student:202301010101"），
+invalidate_tags() 删除带该标签的全部条目。
+
+业务代码通过 get_cache().namespace(名称, ttl) 取得命名空间，命名空间负责键前缀、
+本进程的命中率统计，以及同一键并发未命中时只加载一次。
+Redis 不可用时读写按未命中处理（直接查库），不影响业务。
+"""
+import json
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, unquote
+
+from db_config import get_cache_config
+
+MISSING = object()
+
+
+class CacheUnavailable(Exception):
+    """缓存服务连接失败或返回错误"""
+
+
+# ---------------------------------------------------------------------- #
+# 进程内后端
+# ---------------------------------------------------------------------- #
+class MemoryBackend:
+    """线程安全的进程内 LRU + TTL 缓存，带标签索引"""
+
+    name = "memory"
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._data = OrderedDict()  # key -> (expires_at 或 None, value, tags)
+        self._tags = {}             # tag -> {key}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] is not None and entry[0] <= time.monotonic():
+                self._remove(key)
+                return MISSING
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl=None, tags=()):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (expires_at, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.max_size:
+                self._remove(next(iter(self._data)))
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def invalidate_tags(self, *tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                self._tags.pop(tag, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def info(self):
+        with self._lock:
+            return {"backend": self.name, "size": len(self._data), "max_size": self.max_size}
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+# ---------------------------------------------------------------------- #
+# Redis 协议后端
+# ---------------------------------------------------------------------- #
+class RedisConnection:
+    """最小的 RESP 客户端：一个 socket，支持单条命令与流水线"""
+
+    def __init__(self, host, port, db=0, password=None, timeout=0.5):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.execute("AUTH", password)
+        if db:
+            self.execute("SELECT", db)
+
+    @staticmethod
+    def _encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise CacheUnavailable("Redis 连接已关闭")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            raise CacheUnavailable(payload.decode("utf-8", "replace"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(payload)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise CacheUnavailable(f"无法解析的 Redis 响应: {line!r}")
+
+    def pipeline(self, commands):
+        """一次发送多条命令，按顺序返回各自的结果"""
+        self.sock.sendall(b"".join(self._encode(args) for args in commands))
+        return [self._read_reply() for _ in commands]
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def subscribe(self, channel):
+        """进入订阅模式，逐条产出频道收到的消息（bytes）；连接断开时抛出 CacheUnavailable"""
+        self.execute("SUBSCRIBE", channel)
+        self.sock.settimeout(None)  # 订阅连接长时间阻塞等待消息
+        while True:
+            reply = self._read_reply()
+            if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                yield reply[2]
+
+    def close(self):
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend:
+    """
+    Redis 协议后端：键为 prefix + key，值为 JSON；标签 tag 对应有序集合 prefix + "tags:" + tag，
+    成员为带该标签的键、分数为该键的过期时间（毫秒时间戳，不过期为 +inf）。
+    写入时顺带删除已过期的成员，并把标签集合的过期时间延长到其中最晚过期的成员，
+    标签集合不会随写入次数无限增长，成员全部过期后集合也随之过期。
+    每个线程持有一个连接，出错时丢弃重连。
+    """
+
+    name = "redis"
+
+    def __init__(self, url="redis://127.0.0.1:6379/0", prefix="qinglema:", timeout=0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connect(self):
+        """新建一个独立连接（如订阅用），调用方负责关闭"""
+        return RedisConnection(self.host, self.port, self.db, self.password, self.timeout)
+
+    def _run(self, commands):
+        conn = getattr(self._local, "conn", None)
+        try:
+            if conn is None:
+                conn = self._local.conn = self.connect()
+            return conn.pipeline(commands)
+        except (OSError, ValueError, CacheUnavailable) as e:
+            if conn is not None:
+                conn.close()
+            self._local.conn = None
+            raise CacheUnavailable(f"Redis 访问失败: {e}") from e
+
+    def _tag_key(self, tag):
+        return f"{self.prefix}tags:{tag}"
+
+    def get(self, key):
+        raw = self._run([("GET", self.prefix + key)])[0]
+        if raw is None:
+            return MISSING
+        return json.loads(raw.decode("utf-8"))
+
+    def set(self, key, value, ttl=None, tags=()):
+        full_key = self.prefix + key
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        command = ("SET", full_key, payload) + (("PX", int(ttl * 1000)) if ttl else ())
+        now_ms = int(time.time() * 1000)
+        expires_at = now_ms + int(ttl * 1000) if ttl else "+inf"
+        commands = [command]
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            commands += [
+                ("ZADD", tag_key, expires_at, full_key),
+                ("ZREMRANGEBYSCORE", tag_key, "-inf", f"({now_ms}"),
+                ("ZRANGE", tag_key, -1, -1, "WITHSCORES"),
+                ("PTTL", tag_key),
+            ]
+        replies = self._run(commands)
+
+        # 标签集合的过期时间不早于其中最晚过期的成员；有不过期的成员时集合也不过期
+        expiry = []
+        for index, tag in enumerate(tags):
+            latest, pttl = replies[4 * index + 3], replies[4 * index + 4]
+            latest_at = float(latest[1])
+            if latest_at == float("inf"):
+                if pttl != -1:
+                    expiry.append(("PERSIST", self._tag_key(tag)))
+            elif pttl == -1 or now_ms + pttl < latest_at:
+                expiry.append(("PEXPIREAT", self._tag_key(tag), int(latest_at)))
+        if expiry:
+            self._run(expiry)
+
+    def delete(self, *keys):
+        if keys:
+            self._run([("DEL",) + tuple(self.prefix + key for key in keys)])
+
+    def invalidate_tags(self, *tags):
+        if not tags:
+            return
+        members = self._run([("ZRANGE", self._tag_key(tag), 0, -1) for tag in tags])
+        keys = [key for group in members for key in (group or ())]
+        self._run([("DEL",) + tuple(keys) + tuple(self._tag_key(tag) for tag in tags)])
+
+    def publish(self, channel, message):
+        """向频道 prefix + channel 发布消息"""
+        self._run([("PUBLISH", self.prefix + channel, message)])
+
+    def clear(self):
+        """删除本应用前缀下的全部键"""
+        cursor = b"0"
+        while True:
+            cursor, keys = self._run([("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)])[0]
+            if keys:
+                self._run([("DEL",) + tuple(keys)])
+            if cursor in (b"0", "0"):
+                break
+
+    def info(self):
+        return {"backend": self.name, "url": f"redis://{self.host}:{self.port}/{self.db}", "prefix": self.prefix}
+
+
+# ---------------------------------------------------------------------- #
+# 命名空间
+# ---------------------------------------------------------------------- #
+class CacheNamespace:
+    """某一类缓存：键前缀 + 默认 TTL + 本进程命中统计"""
+
+    def __init__(self, cache, name, ttl=None):
+        self.cache = cache
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._loading = {}  # key -> threading.Event，正在加载的键
+        self._lock = threading.Lock()
+
+    def _key(self, key):
+        return f"{self.name}:{key}"
+
+    def get(self, key):
+        """命中返回值，未命中（或缓存不可用）返回 MISSING"""
+        try:
+            return self.cache.backend.get(self._key(key))
+        except CacheUnavailable as e:
+            self._error(e)
+            return MISSING
+
+    def set(self, key, value, ttl=None, tags=()):
+        try:
+            self.cache.backend.set(self._key(key), value, ttl or self.ttl, tags)
+        except CacheUnavailable as e:
+            self._error(e)
+
+    def delete(self, *keys):
+        try:
+            self.cache.backend.delete(*[self._key(key) for key in keys])
+        except CacheUnavailable as e:
+            self._error(e)
+
+    def get_or_load(self, key, loader, ttl=None, tags=()):
+        """
+        命中直接返回，否则调用 loader() 加载并写入缓存；loader 抛出异常时不缓存
+
+        同一进程内同一个键并发未命中时只有一个线程执行 loader，其余线程等待其结果（加载失败则各自重试）
+        """
+        while True:
+            value = self.get(key)
+            if value is not MISSING:
+                with self._lock:
+                    self.hits += 1
+                return value
+            with self._lock:
+                waiter = self._loading.get(key)
+                if waiter is None:
+                    waiter = self._loading[key] = threading.Event()
+                    self.misses += 1
+                    break
+            waiter.wait()
+
+        try:
+            value = loader()
+            self.set(key, value, ttl, tags)
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            waiter.set()
+
+    def _error(self, error):
+        with self._lock:
+            self.errors += 1
+            report = self.errors == 1 or self.errors % 100 == 0
+        if report:
+            print(f"缓存访问失败（{self.name}，累计{self.errors}次），按未命中处理: {error}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / total, 3) if total else 0,
+            }
+
+
+class Cache:
+    """缓存入口：持有后端与各命名空间"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def namespace(self, name, ttl=None):
+        with self._lock:
+            if name not in self._namespaces:
+                self._namespaces[name] = CacheNamespace(self, name, ttl)
+            return self._namespaces[name]
+
+    def invalidate_tags(self, *tags):
+        """删除带任一标签的全部条目（所有命名空间）"""
+        try:
+            self.backend.invalidate_tags(*tags)
+        except CacheUnavailable as e:
+            print(f"缓存标签失效失败 {tags}: {e}")
+
+    def stats(self):
+        try:
+            info = self.backend.info()
+        except CacheUnavailable as e:
+            info = {"backend": self.backend.name, "error": str(e)}
+        with self._lock:
+            namespaces = dict(self._namespaces)
+        info["namespaces"] = {name: ns.stats() for name, ns in namespaces.items()}
+        return info
+
+
+def create_backend(config):
+    if config["backend"] == "redis":
+        return RedisBackend(config["redis_url"], config["key_prefix"], config["timeout"])
+    return MemoryBackend(config["max_size"])
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """获取进程内共享的缓存入口（按 db_config.get_cache_config 懒加载创建）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = Cache(create_backend(get_cache_config()))
+    return _cache
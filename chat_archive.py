@@ -0,0 +1,199 @@
+"""
+聊天记录分层存储
+
+chat_messages 只保留近期消息（热表），发送时间早于 archive_after_days 天的消息由归档任务按学期移入
+chat_messages_<学期>（如 chat_messages_2025_autumn、chat_messages_2026_spring，结构同热表，
+InnoDB 压缩行格式），并在 chat_archive_index 按会话登记每个学期归档了哪一段消息：
+    chat_archive_index(user_a, user_b, semester, min_message_id, max_message_id, message_count)
+    user_a / user_b 为会话双方账号中较小/较大的一个
+
+学期与前端“本学期”的口径一致：3月1日起为春季学期，9月1日起为秋季学期（次年1、2月仍属上一年秋季学期）。
+
+读取：聊天记录接口先查热表，向上翻页翻到热表最早一条之后，才按 chat_archive_index 找到该会话更早的学期表继续读
+（fetch_archived_page）；增量拉取新消息只查热表。会话状态（chat_state）中已归档的消息不再计入未读。
+
+归档：archive_old_messages(conn) 按 message_id 顺序每批移动 batch_size 条（复制到学期表、登记索引、从热表删除
+在同一事务内），多个进程同时运行时用 GET_LOCK 保证只有一个在归档。python app.py（含 server.py）启动服务时
+调用 start_chat_archiver() 开启后台线程定时执行（见 db_config.get_chat_archive_config），导入 app 时不启动；
+其他方式部署（如 WSGI 服务器）需在启动脚本中自行调用，也可手动执行 python sql/migrate.py archive。
+"""
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from db_config import get_chat_archive_config
+from db_pool import get_pool
+
+ARCHIVE_LOCK = "qinglema_chat_archive"
+# 归档表与热表共有的列（message_id 在归档表中不自增）
+COLUMNS = ("message_id, sender_id, sender_name, sender_role, receiver_id, receiver_name, receiver_role, "
+           "content, is_read, create_time")
+_SEMESTER_RE = re.compile(r"^\d{4}_(spring|autumn)$")
+
+
+def semester_of(moment):
+    """消息发送时间所属学期，如 2025_autumn（2025年9月至2026年2月）、2026_spring（2026年3月至8月）"""
+    if moment.month >= 9:
+        return f"{moment.year}_autumn"
+    if moment.month >= 3:
+        return f"{moment.year}_spring"
+    return f"{moment.year - 1}_autumn"
+
+
+def archive_table(semester):
+    if not _SEMESTER_RE.match(semester):
+        raise ValueError(f"无效的学期: {semester}")
+    return f"chat_messages_{semester}"
+
+
+def _ensure_archive_table(cursor, semester):
+    """建学期归档表（DDL 会隐式提交，需在归档事务开始前调用）"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {archive_table(semester)} (
+            message_id INT NOT NULL PRIMARY KEY COMMENT '消息ID（与热表一致）',
+            sender_id VARCHAR(20) NOT NULL COMMENT '发送者账号',
+            sender_name VARCHAR(50) COMMENT '发送者姓名',
+            sender_role VARCHAR(10) NOT NULL COMMENT '发送者角色',
+            receiver_id VARCHAR(20) NOT NULL COMMENT '接收者账号',
+            receiver_name VARCHAR(50) COMMENT '接收者姓名',
+            receiver_role VARCHAR(10) COMMENT '接收者角色',
+            content TEXT NOT NULL COMMENT '消息内容',
+            is_read TINYINT NOT NULL DEFAULT 0 COMMENT '是否已读',
+            create_time DATETIME NOT NULL COMMENT '发送时间',
+            KEY idx_sender_receiver_msg (sender_id, receiver_id, message_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 ROW_FORMAT=COMPRESSED COMMENT='聊天消息归档（{semester}）'
+    """)
+
+
+# ---------------------------------------------------------------------- #
+# 归档
+# ---------------------------------------------------------------------- #
+def _archive_batch(conn, cursor, cutoff, batch_size):
+    """移动热表最早的一批（至多 batch_size 条）早于 cutoff 的消息，返回 {学期: 条数}"""
+    cursor.execute("SELECT message_id, create_time FROM chat_messages ORDER BY message_id LIMIT %s", (batch_size,))
+    by_semester = {}
+    for message_id, create_time in cursor.fetchall():
+        if create_time >= cutoff:
+            break
+        by_semester.setdefault(semester_of(create_time), []).append(message_id)
+    if not by_semester:
+        return {}
+
+    for semester in by_semester:
+        _ensure_archive_table(cursor, semester)
+    try:
+        conn.begin()
+        for semester, ids in by_semester.items():
+            cursor.execute(f"""
+                INSERT IGNORE INTO {archive_table(semester)} ({COLUMNS})
+                SELECT {COLUMNS} FROM chat_messages WHERE message_id IN %s
+            """, (ids,))
+            cursor.execute("""
+                INSERT INTO chat_archive_index (user_a, user_b, semester, min_message_id, max_message_id, message_count)
+                SELECT LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id), %s,
+                       MIN(message_id), MAX(message_id), COUNT(*)
+                FROM chat_messages WHERE message_id IN %s
+                GROUP BY LEAST(sender_id, receiver_id), GREATEST(sender_id, receiver_id)
+                ON DUPLICATE KEY UPDATE min_message_id = LEAST(min_message_id, VALUES(min_message_id)),
+                                        max_message_id = GREATEST(max_message_id, VALUES(max_message_id)),
+                                        message_count = message_count + VALUES(message_count)
+            """, (semester, ids))
+            cursor.execute("DELETE FROM chat_messages WHERE message_id IN %s", (ids,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {semester: len(ids) for semester, ids in by_semester.items()}
+
+
+def archive_old_messages(conn, archive_after_days=None, batch_size=None):
+    """
+    把早于 archive_after_days 天的消息移入学期归档表，返回 {学期: 条数}
+    其他进程正在归档时直接返回空结果
+    """
+    config = get_chat_archive_config()
+    archive_after_days = archive_after_days or config["archive_after_days"]
+    batch_size = batch_size or config["batch_size"]
+    cutoff = datetime.now() - timedelta(days=archive_after_days)
+
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (ARCHIVE_LOCK,))
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        return {}
+    moved = {}
+    try:
+        while True:
+            batch = _archive_batch(conn, cursor, cutoff, batch_size)
+            for semester, count in batch.items():
+                moved[semester] = moved.get(semester, 0) + count
+            # 不足一批说明已遇到不需归档的消息（或热表已空）
+            if sum(batch.values()) < batch_size:
+                break
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (ARCHIVE_LOCK,))
+        cursor.fetchall()
+        cursor.close()
+    return moved
+
+
+def start_chat_archiver():
+    """启动后台归档线程（interval 为 0 时不启动，只通过命令行归档）"""
+    interval = get_chat_archive_config()["interval"]
+    if interval <= 0:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with get_pool().connection() as conn:
+                    moved = archive_old_messages(conn)
+                if moved:
+                    print(f"聊天记录归档完成: {moved}")
+            except Exception as e:
+                print(f"聊天记录归档失败，下次重试: {e}")
+
+    thread = threading.Thread(target=run, name="chat-archiver", daemon=True)
+    thread.start()
+    return thread
+
+
+# ---------------------------------------------------------------------- #
+# 读取
+# ---------------------------------------------------------------------- #
+def fetch_archived_page(cursor, user_id, peer_id, columns, before_id, limit):
+    """
+    从归档表读取两人之间 message_id < before_id（None 表示不限）的最近 limit 条，
+    返回 (messages, has_more)，messages 按 message_id 倒序；limit 为 0 时只判断是否还有更早的归档消息
+    columns 同 app.fetch_chat_page（DictCursor）
+    """
+    before_id = before_id if before_id is not None else 2 ** 31
+    cursor.execute("""
+        SELECT semester FROM chat_archive_index
+        WHERE user_a = LEAST(%s, %s) AND user_b = GREATEST(%s, %s) AND min_message_id < %s
+        ORDER BY max_message_id DESC
+    """, (user_id, peer_id, user_id, peer_id, before_id))
+    semesters = [row['semester'] for row in cursor.fetchall()]
+    if not limit:
+        return [], bool(semesters)
+
+    messages = []
+    for index, semester in enumerate(semesters):
+        cursor.execute(f"""
+            SELECT message_id, {columns}
+            FROM {archive_table(semester)}
+            WHERE ((sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s))
+              AND message_id < %s
+            ORDER BY message_id DESC LIMIT %s
+        """, (user_id, peer_id, peer_id, user_id, before_id, limit - len(messages) + 1))
+        rows = list(cursor.fetchall())
+        if len(messages) + len(rows) > limit:
+            return messages + rows[:limit - len(messages)], True
+        messages.extend(rows)
+        if len(messages) == limit:
+            return messages, index + 1 < len(semesters)
+        if rows:
+            before_id = rows[-1]['message_id']
+    return messages, False
@@ -0,0 +1,157 @@
+"""
+聊天联系人关系表
+
+chat_contacts(owner_id, contact_id, contact_role, courses) 物化“谁可以和谁聊天”，
+三个联系人列表接口按 owner_id 走主键一次查询，不再临时多表关联：
+- 辅导员 <-> 本年级（responsible_grade = 学号前4位）学生
+- 讲师 <-> 选修其所授课程（teacher_course x student_course）的学生，courses 为共同课程名
+
+维护方式（调用方负责提交/回滚事务，关系表与业务数据同时生效）：
+1. 选课/授课、辅导员负责年级变化，或新增/删除/转换角色的用户：rebuild_chat_contacts(cursor, 账号)
+   删除并重新生成与该账号有关的全部关系（两个方向）
+2. 直接改库等原因导致偏差时，执行 python sql/migrate.py reconcile 全量重建
+
+联系人列表同时带出与每个联系人的会话状态（chat_state.py 维护的未读数与最后一条消息），按最近聊天排序。
+"""
+# 联系人角色（与 chat_messages.sender_role / receiver_role 一致）
+STUDENT = "学生"
+COUNSELOR = "辅导员"
+TEACHER = "讲师"
+
+_COUNSELOR_STUDENT = """
+    FROM counselor_info co
+    JOIN student_info si ON si.grade = TRIM(co.responsible_grade)
+"""
+_TEACHER_STUDENT = """
+    FROM teacher_course tc
+    JOIN teacher_info ti ON ti.teacher_id = tc.teacher_id
+    JOIN student_course sc ON sc.course_id = tc.course_id
+    JOIN student_info si ON si.student_id = sc.student_id
+    LEFT JOIN course_info ci ON ci.course_id = tc.course_id
+"""
+_COURSES = "GROUP_CONCAT(DISTINCT ci.course_name ORDER BY ci.course_name SEPARATOR ', ')"
+
+# 关系来源：(owner 列, contact 列, contact_role, courses 表达式, FROM 子句, 是否需要 GROUP BY)
+EDGES = [
+    ("co.counselor_id", "si.student_id", STUDENT, "NULL", _COUNSELOR_STUDENT, False),
+    ("si.student_id", "co.counselor_id", COUNSELOR, "NULL", _COUNSELOR_STUDENT, False),
+    ("tc.teacher_id", "si.student_id", STUDENT, _COURSES, _TEACHER_STUDENT, True),
+    ("si.student_id", "tc.teacher_id", TEACHER, _COURSES, _TEACHER_STUDENT, True),
+]
+
+
+def _edge_sql(owner, contact, role, courses, from_sql, grouped, where=""):
+    sql = f"SELECT {owner}, {contact}, '{role}', {courses} {from_sql} {where}"
+    if grouped:
+        sql += f" GROUP BY {owner}, {contact}"
+    return sql
+
+
+def rebuild_chat_contacts(cursor, account):
+    """重新生成与 account 有关的联系人关系（account 不存在时只做删除）"""
+    cursor.execute("DELETE FROM chat_contacts WHERE owner_id = %s OR contact_id = %s", (account, account))
+    for owner, contact, role, courses, from_sql, grouped in EDGES:
+        for column in (owner, contact):
+            cursor.execute(f"""
+                INSERT IGNORE INTO chat_contacts (owner_id, contact_id, contact_role, courses)
+                {_edge_sql(owner, contact, role, courses, from_sql, grouped, f"WHERE {column} = %s")}
+            """, (account,))
+
+
+# ---------------------------------------------------------------------- #
+# 读取
+# ---------------------------------------------------------------------- #
+# 会话状态字段（chat_conversation_state 别名 cs）与排序：有聊天记录的按最后消息时间倒序在前，其余按账号
+_STATE_COLUMNS = """
+    COALESCE(cs.unread_count, 0) AS unread,
+    COALESCE(cs.last_message_id, 0) AS last_message_id,
+    COALESCE(cs.last_message_preview, '') AS last_message,
+    COALESCE(DATE_FORMAT(cs.last_time, '%%Y-%%m-%%d %%H:%%i'), '') AS last_time
+"""
+_STATE_JOIN = "LEFT JOIN chat_conversation_state cs ON cs.owner_id = cc.owner_id AND cs.peer_id = cc.contact_id"
+_STATE_ORDER = "ORDER BY cs.last_time IS NULL, cs.last_time DESC, cc.contact_id"
+
+
+def get_student_contacts(cursor, owner_id):
+    """辅导员/讲师的学生联系人 [{id, name, avatar, unread, last_message_id, last_message, last_time}]，最近聊过的在前"""
+    cursor.execute(f"""
+        SELECT si.student_id AS id, si.student_name AS name, si.student_avatar AS avatar, {_STATE_COLUMNS}
+        FROM chat_contacts cc
+        JOIN student_info si ON si.student_id = cc.contact_id
+        {_STATE_JOIN}
+        WHERE cc.owner_id = %s AND cc.contact_role = %s
+        {_STATE_ORDER}
+    """, (owner_id, STUDENT))
+    return cursor.fetchall()
+
+
+def get_staff_contacts(cursor, student_id):
+    """学生的辅导员/讲师联系人 [{id, name, role, contact, avatar, courses, unread, last_message_id, last_message, last_time}]，
+    最近聊过的在前"""
+    cursor.execute(f"""
+        SELECT cc.contact_id AS id, cc.contact_role AS role, cc.courses,
+               COALESCE(co.counselor_name, ti.teacher_name) AS name,
+               COALESCE(co.counselor_contact, ti.teacher_contact) AS contact,
+               COALESCE(co.counselor_avatar, ti.teacher_avatar) AS avatar,
+               {_STATE_COLUMNS}
+        FROM chat_contacts cc
+        LEFT JOIN counselor_info co ON cc.contact_role = %s AND co.counselor_id = cc.contact_id
+        LEFT JOIN teacher_info ti ON cc.contact_role = %s AND ti.teacher_id = cc.contact_id
+        {_STATE_JOIN}
+        WHERE cc.owner_id = %s
+        {_STATE_ORDER}
+    """, (COUNSELOR, TEACHER, student_id))
+    return cursor.fetchall()
+
+
+def get_chat_contact(cursor, owner_id, contact_id):
+    """owner_id 可以与 contact_id 聊天时返回 {role, name}，否则返回 None"""
+    cursor.execute("""
+        SELECT cc.contact_role AS role,
+               COALESCE(si.student_name, co.counselor_name, ti.teacher_name) AS name
+        FROM chat_contacts cc
+        LEFT JOIN student_info si ON cc.contact_role = %s AND si.student_id = cc.contact_id
+        LEFT JOIN counselor_info co ON cc.contact_role = %s AND co.counselor_id = cc.contact_id
+        LEFT JOIN teacher_info ti ON cc.contact_role = %s AND ti.teacher_id = cc.contact_id
+        WHERE cc.owner_id = %s AND cc.contact_id = %s
+    """, (STUDENT, COUNSELOR, TEACHER, owner_id, contact_id))
+    return cursor.fetchone()
+
+
+# ---------------------------------------------------------------------- #
+# 重建
+# ---------------------------------------------------------------------- #
+def populate_chat_contacts(cursor):
+    """清空并全量生成关系表（reconcile 使用）"""
+    cursor.execute("DELETE FROM chat_contacts")
+    for edge in EDGES:
+        cursor.execute(
+            f"INSERT IGNORE INTO chat_contacts (owner_id, contact_id, contact_role, courses) {_edge_sql(*edge)}")
+
+
+def reconcile_chat_contacts(conn):
+    """按 counselor_info / teacher_course / student_course 全量重建，返回 [(操作, owner_id, contact_id)]"""
+    cursor = conn.cursor()
+    try:
+        conn.begin()
+        cursor.execute("SELECT owner_id, contact_id, contact_role, courses FROM chat_contacts FOR UPDATE")
+        before = {(row[0], row[1]): tuple(row[2:]) for row in cursor.fetchall()}
+        populate_chat_contacts(cursor)
+        cursor.execute("SELECT owner_id, contact_id, contact_role, courses FROM chat_contacts")
+        after = {(row[0], row[1]): tuple(row[2:]) for row in cursor.fetchall()}
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    changes = []
+    for key in sorted(set(before) | set(after)):
+        if key not in before:
+            changes.append(("新增", *key))
+        elif key not in after:
+            changes.append(("删除", *key))
+        elif before[key] != after[key]:
+            changes.append(("更新", *key))
+    return changes
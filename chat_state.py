@@ -0,0 +1,255 @@
+"""
+聊天会话状态
+
+chat_conversation_state(owner_id, peer_id, unread_count, last_message_id, last_message_preview, last_time,
+last_read_message_id) 为每个用户与每个聊天对象各保存一行：未读条数、最后一条消息的预览与已读位置，
+联系人列表 LEFT JOIN 本表一次查询即可显示未读角标、最新消息并按最近聊天排序
+（见 chat_contacts.get_student_contacts / get_staff_contacts），不再逐个联系人 COUNT / 查最新消息。
+
+维护方式：
+1. 写入一条消息后：record_chat_message(cursor, message_id, 发送方, 接收方, 内容)（调用方提交事务）
+   双方的最后一条消息都更新，接收方未读数 +1
+2. 已读回执：read_receipts.mark(阅读者, 对方, 已读到的 message_id) 只在内存中记录已读位置（high-water mark），
+   后台线程每 READ_FLUSH_INTERVAL 秒把积攒的已读位置批量写入 last_read_message_id，
+   并按 message_id > last_read_message_id 重新计算未读数；拉取聊天记录因此不再写库。
+   客户端上报的已读位置（/ws/chat 的 read 消息）先经 cap_read_position 限制在会话最后一条消息以内；
+   批量写库失败时逐行重试，数据有误的行丢弃，不会让整批一直写不进去
+   尚未写入的已读位置由 apply_pending_reads 叠加到联系人列表上，刚读过的会话不会短暂显示未读
+3. 直接改库等原因导致偏差时，执行 python sql/migrate.py reconcile 按 chat_messages 与已读位置重建
+（chat_messages.is_read 不再维护，只在建表时用于生成初始已读位置）
+"""
+import atexit
+import threading
+import time
+
+import pymysql
+
+from db_pool import get_pool
+
+# 最后一条消息预览的最大字数（与 last_message_preview 列宽一致）
+PREVIEW_LENGTH = 100
+# 已读位置批量写库的间隔（秒）
+READ_FLUSH_INTERVAL = 5
+
+_UPSERT = """
+    INSERT INTO chat_conversation_state
+        (owner_id, peer_id, unread_count, last_message_id, last_message_preview, last_time)
+    VALUES (%s, %s, %s, %s, %s, NOW())
+    ON DUPLICATE KEY UPDATE unread_count = unread_count + VALUES(unread_count),
+                            last_message_id = VALUES(last_message_id),
+                            last_message_preview = VALUES(last_message_preview),
+                            last_time = VALUES(last_time)
+"""
+
+
+def record_chat_message(cursor, message_id, sender_id, receiver_id, content):
+    """插入聊天消息后调用"""
+    preview = content[:PREVIEW_LENGTH]
+    # 两行按主键顺序写入，双方同时互发消息时加锁顺序一致，避免死锁
+    cursor.executemany(_UPSERT, sorted([
+        (sender_id, receiver_id, 0, message_id, preview),
+        (receiver_id, sender_id, 1, message_id, preview),
+    ]))
+
+
+def cap_read_position(cursor, owner_id, peer_id, message_id):
+    """把客户端上报的已读位置限制在 owner_id 与 peer_id 会话的最后一条消息以内；没有该会话时返回 None"""
+    cursor.execute(
+        "SELECT last_message_id FROM chat_conversation_state WHERE owner_id = %s AND peer_id = %s",
+        (owner_id, peer_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    last_message_id = row['last_message_id'] if isinstance(row, dict) else row[0]
+    return min(int(message_id), int(last_message_id))
+
+
+# 推进已读位置并重新计算未读数；单表 UPDATE 按书写顺序赋值，计算未读数时用的已是新的已读位置
+_ADVANCE_READ = """
+    UPDATE chat_conversation_state cs
+    SET cs.last_read_message_id = GREATEST(cs.last_read_message_id, %s),
+        cs.unread_count = (
+            SELECT COUNT(*) FROM chat_messages m
+            WHERE m.sender_id = cs.peer_id AND m.receiver_id = cs.owner_id
+              AND m.message_id > cs.last_read_message_id
+        )
+    WHERE cs.owner_id = %s AND cs.peer_id = %s AND cs.last_read_message_id < %s
+"""
+
+
+class ReadReceipts:
+    """已读位置的内存缓冲：同一会话只保留最大的 message_id，定时批量写库"""
+
+    def __init__(self, interval=READ_FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending = {}  # (owner_id, peer_id) -> 已读到的 message_id
+        self._lock = threading.Lock()
+        self._flusher = None
+        self.marked = 0
+        self.flushed = 0
+        self.batches = 0
+        self.errors = 0
+        self.dropped = 0
+
+    def mark(self, owner_id, peer_id, message_id):
+        """owner_id 已读到 peer_id 发来的 message_id（含）为止的消息"""
+        key = (str(owner_id), str(peer_id))
+        message_id = int(message_id)
+        with self._lock:
+            self.marked += 1
+            if message_id > self._pending.get(key, 0):
+                self._pending[key] = message_id
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._run, name="chat-read-flusher", daemon=True)
+                self._flusher.start()
+
+    def pending_for(self, owner_id):
+        """owner_id 尚未写库的已读位置 {peer_id: message_id}"""
+        owner_id = str(owner_id)
+        with self._lock:
+            return {peer_id: message_id for (owner, peer_id), message_id in self._pending.items() if owner == owner_id}
+
+    def flush(self):
+        """把积攒的已读位置写入数据库，返回写入的会话数；失败时放回缓冲区等待下次写入"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        # 按主键顺序更新，与 record_chat_message 的加锁顺序一致
+        rows = [(message_id, owner_id, peer_id, message_id)
+                for (owner_id, peer_id), message_id in sorted(batch.items())]
+        dropped = 0
+        try:
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    cursor.executemany(_ADVANCE_READ, rows)
+                    conn.commit()
+                except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+                    raise
+                except pymysql.MySQLError:
+                    # 某一行数据有误（如 message_id 超出列范围）：回滚后逐行写入，只丢弃出错的行
+                    conn.rollback()
+                    dropped = self._apply_each(conn, cursor, rows)
+                cursor.close()
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                for key, message_id in batch.items():
+                    if message_id > self._pending.get(key, 0):
+                        self._pending[key] = message_id
+            print(f"已读位置写入失败（{len(batch)}个会话），稍后重试: {e}")
+            return 0
+        with self._lock:
+            self.flushed += len(batch) - dropped
+            self.batches += 1
+            self.dropped += dropped
+        return len(batch) - dropped
+
+    @staticmethod
+    def _apply_each(conn, cursor, rows):
+        """逐行写入已读位置，返回丢弃的行数；连接类错误照常抛出，由 flush 放回缓冲区（已写入的行重写无副作用）"""
+        dropped = 0
+        for row in rows:
+            try:
+                cursor.execute(_ADVANCE_READ, row)
+                conn.commit()
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+                raise
+            except pymysql.MySQLError as e:
+                conn.rollback()
+                dropped += 1
+                print(f"已读位置写入失败，已丢弃（{row[1]} -> {row[2]}，message_id={row[0]}）: {e}")
+        return dropped
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "interval": self.interval,
+                "pending": len(self._pending),
+                "marked": self.marked,
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "errors": self.errors,
+                "dropped": self.dropped,
+            }
+
+
+read_receipts = ReadReceipts()
+atexit.register(read_receipts.flush)
+
+
+def apply_pending_reads(owner_id, contacts):
+    """把 owner_id 尚未写库的已读位置叠加到联系人列表（需含 id / unread / last_message_id）：已读到最后一条的未读数记为 0"""
+    pending = read_receipts.pending_for(owner_id)
+    for contact in contacts:
+        if contact['unread'] and pending.get(contact['id'], 0) >= contact['last_message_id']:
+            contact['unread'] = 0
+    return contacts
+
+
+# ---------------------------------------------------------------------- #
+# 重建
+# ---------------------------------------------------------------------- #
+def populate_conversation_state(cursor):
+    """
+    按 chat_messages 全量生成（reconcile 使用）：
+    最后一条消息取自明细；已读位置保留已有值（新会话取 is_read 标记过的最大 message_id）；
+    未读数按已读位置重新计算（只计热表中的消息，已归档的视为已读）；
+    热表中已没有消息的会话（如已整体归档）保留原有的最后一条消息
+    """
+    cursor.execute(f"""
+        INSERT INTO chat_conversation_state
+            (owner_id, peer_id, unread_count, last_message_id, last_message_preview, last_time, last_read_message_id)
+        SELECT t.owner_id, t.peer_id, 0, m.message_id, LEFT(m.content, {PREVIEW_LENGTH}), m.create_time, t.read_id
+        FROM (
+            SELECT owner_id, peer_id, MAX(message_id) AS last_message_id, COALESCE(MAX(read_id), 0) AS read_id
+            FROM (
+                SELECT sender_id AS owner_id, receiver_id AS peer_id, message_id, NULL AS read_id
+                FROM chat_messages
+                UNION ALL
+                SELECT receiver_id, sender_id, message_id, IF(is_read = 1, message_id, NULL)
+                FROM chat_messages
+            ) AS sides
+            GROUP BY owner_id, peer_id
+        ) AS t
+        JOIN chat_messages m ON m.message_id = t.last_message_id
+        ON DUPLICATE KEY UPDATE last_message_id = VALUES(last_message_id),
+                                last_message_preview = VALUES(last_message_preview),
+                                last_time = VALUES(last_time),
+                                last_read_message_id = GREATEST(last_read_message_id, VALUES(last_read_message_id))
+    """)
+    cursor.execute("""
+        UPDATE chat_conversation_state cs
+        SET cs.unread_count = (
+            SELECT COUNT(*) FROM chat_messages m
+            WHERE m.sender_id = cs.peer_id AND m.receiver_id = cs.owner_id
+              AND m.message_id > cs.last_read_message_id
+        )
+    """)
+
+
+def reconcile_conversation_state(conn):
+    """按 chat_messages 与已读位置全量重建，返回 [(owner_id, peer_id, 原未读数, 新未读数)]（只列出未读数有偏差的会话）"""
+    cursor = conn.cursor()
+    try:
+        conn.begin()
+        cursor.execute("SELECT owner_id, peer_id, unread_count FROM chat_conversation_state FOR UPDATE")
+        before = {(row[0], row[1]): int(row[2]) for row in cursor.fetchall()}
+        populate_conversation_state(cursor)
+        cursor.execute("SELECT owner_id, peer_id, unread_count FROM chat_conversation_state")
+        after = {(row[0], row[1]): int(row[2]) for row in cursor.fetchall()}
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    return [(*key, before.get(key, 0), after.get(key, 0))
+            for key in sorted(set(before) | set(after)) if before.get(key, 0) != after.get(key, 0)]
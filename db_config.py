@@ -1,4 +1,6 @@
-# db_config.py
+import os
+
+
 def get_db_config():
     """返回数据库连接配置"""
     return {
@@ -8,4 +10,35 @@ def get_db_config():
         "password": "123456",
         "database": "qing2",
         "charset": "utf8mb4"
-    }
\ No newline at end of file
+    }
+
+
+def get_pool_config():
+    """返回连接池配置（可通过环境变量覆盖）"""
+    return {
+        "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),          # 每个进程最多持有的连接数
+        "max_idle": int(os.environ.get("DB_POOL_MAX_IDLE", "5")),           # 空闲时最多保留的连接数
+        "max_lifetime": int(os.environ.get("DB_POOL_MAX_LIFETIME", "1800")),  # 连接最长存活秒数，超过后回收重建
+        "ping_interval": int(os.environ.get("DB_POOL_PING_INTERVAL", "5")),   # 空闲超过该秒数的连接在借出前先 ping 检查
+        "timeout": int(os.environ.get("DB_POOL_TIMEOUT", "10")),            # 连接池耗尽时的最长等待秒数
+    }
+
+
+def get_chat_archive_config():
+    """返回聊天记录归档配置（可通过环境变量覆盖），见 chat_archive.py"""
+    return {
+        "archive_after_days": int(os.environ.get("CHAT_ARCHIVE_AFTER_DAYS", "180")),  # 发送超过该天数的消息移入学期归档表
+        "batch_size": int(os.environ.get("CHAT_ARCHIVE_BATCH_SIZE", "1000")),        # 每个事务移动的条数
+        "interval": int(os.environ.get("CHAT_ARCHIVE_INTERVAL", "21600")),           # 后台归档间隔秒数，0 表示只用命令行归档
+    }
+
+
+def get_cache_config():
+    """返回缓存配置（可通过环境变量覆盖）"""
+    return {
+        "backend": os.environ.get("CACHE_BACKEND", "memory"),              # memory：进程内缓存（单进程）；redis：多进程共享
+        "redis_url": os.environ.get("CACHE_REDIS_URL", "redis://127.0.0.1:6379/0"),
+        "key_prefix": os.environ.get("CACHE_KEY_PREFIX", "qinglema:"),     # Redis 键前缀，多套环境共用一个 Redis 时区分
+        "max_size": int(os.environ.get("CACHE_MAX_SIZE", "4096")),         # memory 后端最多保留的条目数
+        "timeout": float(os.environ.get("CACHE_TIMEOUT", "0.5")),          # Redis 连接/读写超时秒数
+    }
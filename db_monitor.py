@@ -0,0 +1,251 @@
+"""
+SQL 执行统计与慢查询日志
+
+通过 db_pool 的语句监听器记录每个请求的：
+1. 查询条数、数据库总耗时、最慢的一条语句
+2. 按路由汇总最近若干次请求的统计（供管理员接口查看）
+3. 超过阈值的语句写入慢查询日志（记录路由与参数形态，不记录参数值）
+4. （可选）N+1 查询检测：同一请求/服务调用内同一条归一化语句执行超过 N 次时告警或报错
+"""
+import logging
+import os
+import re
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+from db_pool import add_query_listener
+
+# 慢查询阈值（毫秒）与每个路由保留的最近请求数，可通过环境变量调整
+SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SQL_SLOW_THRESHOLD_MS", "200"))
+ROUTE_WINDOW_SIZE = int(os.environ.get("SQL_ROUTE_WINDOW", "200"))
+SLOW_QUERY_LOG_FILE = os.environ.get(
+    "SQL_SLOW_LOG_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", "slow_query.log"),
+)
+# N+1 检测：同一语句在一个请求内执行超过该次数即写告警日志（0 表示关闭）；
+# 需要报错时（如测试）用 detect_n_plus_one 包住被测代码，退出作用域时抛出 NPlusOneError
+NPLUS1_THRESHOLD = int(os.environ.get("SQL_NPLUS1_THRESHOLD", "0"))
+
+
+def normalize_sql(sql):
+    """压缩空白，便于日志展示与按语句归类"""
+    return re.sub(r"\s+", " ", str(sql)).strip()
+
+
+def fingerprint_sql(sql):
+    """语句指纹：去掉字面量与 IN 列表长度差异，使只差参数的语句归为同一条"""
+    sql = normalize_sql(sql)
+    sql = re.sub(r"'(?:[^'\\]|\\.)*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"(?i)\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)", "IN (...)", sql)
+    return sql
+
+
+def param_shape(params):
+    """参数形态：只保留类型与长度，如 (str, int, list[3])，避免把参数值写进日志"""
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {_value_shape(v)}" for k, v in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(_value_shape(v) for v in params) + ")"
+    return _value_shape(params)
+
+
+def _value_shape(value):
+    if isinstance(value, (list, tuple, set)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+class QueryStats:
+    """单个请求内的SQL统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+
+    def add(self, sql, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms >= self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_sql = sql
+
+    def server_timing(self):
+        """生成 Server-Timing 响应头的值"""
+        return f'db;desc="{self.count} queries";dur={self.total_ms:.1f}'
+
+
+class RouteSummary:
+    """按路由滚动汇总最近 ROUTE_WINDOW_SIZE 次请求的SQL统计"""
+
+    def __init__(self, window_size=ROUTE_WINDOW_SIZE):
+        self.window_size = window_size
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, stats):
+        with self._lock:
+            window = self._routes.get(route)
+            if window is None:
+                window = self._routes[route] = deque(maxlen=self.window_size)
+            window.append((stats.count, stats.total_ms, stats.slowest_ms, stats.slowest_sql))
+
+    def snapshot(self):
+        """返回各路由的汇总，按平均数据库耗时倒序"""
+        with self._lock:
+            items = [(route, list(window)) for route, window in self._routes.items()]
+
+        result = []
+        for route, samples in items:
+            counts = [s[0] for s in samples]
+            db_ms = sorted(s[1] for s in samples)
+            slowest = max(samples, key=lambda s: s[2])
+            result.append({
+                "route": route,
+                "requests": len(samples),
+                "avg_queries": round(sum(counts) / len(samples), 1),
+                "max_queries": max(counts),
+                "avg_db_ms": round(sum(db_ms) / len(samples), 1),
+                "p95_db_ms": round(db_ms[min(len(db_ms) - 1, int(len(db_ms) * 0.95))], 1),
+                "max_db_ms": round(db_ms[-1], 1),
+                "slowest_ms": round(slowest[2], 1),
+                "slowest_sql": normalize_sql(slowest[3])[:300] if slowest[3] else None,
+            })
+        result.sort(key=lambda r: r["avg_db_ms"], reverse=True)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_summary = RouteSummary()
+
+_slow_logger = None
+_slow_logger_lock = threading.Lock()
+
+
+def _get_slow_logger():
+    global _slow_logger
+    if _slow_logger is None:
+        with _slow_logger_lock:
+            if _slow_logger is None:
+                logger = logging.getLogger("qinglema.slow_query")
+                logger.setLevel(logging.WARNING)
+                logger.propagate = False
+                try:
+                    os.makedirs(os.path.dirname(SLOW_QUERY_LOG_FILE), exist_ok=True)
+                    handler = RotatingFileHandler(SLOW_QUERY_LOG_FILE, maxBytes=5 * 1024 * 1024,
+                                                  backupCount=3, encoding="utf-8")
+                except OSError as e:
+                    print(f"慢查询日志文件不可用，改为输出到控制台: {e}")
+                    handler = logging.StreamHandler()
+                handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                logger.addHandler(handler)
+                _slow_logger = logger
+    return _slow_logger
+
+
+def log_slow_query(route, sql, params, elapsed_ms):
+    """超过阈值的语句写入慢查询日志"""
+    if elapsed_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+    _get_slow_logger().warning(
+        "route=%s time=%.1fms params=%s sql=%s",
+        route or "-", elapsed_ms, param_shape(params), normalize_sql(sql),
+    )
+
+
+# ---------------------------------------------------------------------- #
+# N+1 查询检测
+# ---------------------------------------------------------------------- #
+class NPlusOneError(Exception):
+    """同一语句在一次请求/服务调用内重复执行次数超过阈值"""
+
+
+_nplus1_logger = logging.getLogger("qinglema.n_plus_one")
+_nplus1_local = threading.local()
+
+
+class NPlusOneDetector:
+    """统计一个作用域（请求或服务调用）内每条语句指纹的执行次数"""
+
+    def __init__(self, threshold, label=None):
+        self.threshold = threshold
+        self.label = label or "-"
+        self.counts = {}
+        self.violations = {}  # 指纹 -> 首次超限时的调用栈
+
+    def record(self, sql):
+        fingerprint = fingerprint_sql(sql)
+        count = self.counts.get(fingerprint, 0) + 1
+        self.counts[fingerprint] = count
+        if count == self.threshold + 1:
+            stack = "".join(traceback.format_stack()[:-4])
+            self.violations[fingerprint] = stack
+            _nplus1_logger.warning(
+                "疑似N+1查询：[%s] 同一语句已执行超过%d次\nSQL: %s\n调用栈:\n%s",
+                self.label, self.threshold, fingerprint, stack,
+            )
+
+    def report(self):
+        lines = [f"[{self.label}] 检测到N+1查询："]
+        for fingerprint, stack in self.violations.items():
+            lines.append(f"- 执行{self.counts[fingerprint]}次（阈值{self.threshold}）：{fingerprint}")
+            lines.append(stack)
+        return "\n".join(lines)
+
+
+def _detector_stack():
+    stack = getattr(_nplus1_local, "stack", None)
+    if stack is None:
+        stack = _nplus1_local.stack = []
+    return stack
+
+
+def _track_n_plus_one(sql, params, elapsed):
+    for detector in _detector_stack():
+        detector.record(sql)
+
+
+def begin_n_plus_one_detection(threshold=None, label=None):
+    """在当前线程开启一个检测作用域，返回检测器（需配合 end_n_plus_one_detection 使用）"""
+    if threshold is None:
+        threshold = NPLUS1_THRESHOLD or 5
+    add_query_listener(_track_n_plus_one)
+    detector = NPlusOneDetector(threshold, label)
+    _detector_stack().append(detector)
+    return detector
+
+
+def end_n_plus_one_detection(detector):
+    """结束检测作用域"""
+    stack = _detector_stack()
+    if detector in stack:
+        stack.remove(detector)
+
+
+@contextmanager
+def detect_n_plus_one(threshold=None, label=None, raise_error=True):
+    """
+    检测一段代码（如一次服务调用）内的N+1查询，测试中可直接使用：
+
+        with detect_n_plus_one(threshold=3):
+            TeacherService(pool=get_pool()).get_approved_student_leaves("201301101")
+
+    raise_error 为 True 时，退出作用域时若存在超限语句则抛出 NPlusOneError。
+    """
+    detector = begin_n_plus_one_detection(threshold, label)
+    try:
+        yield detector
+    finally:
+        end_n_plus_one_detection(detector)
+    if raise_error and detector.violations:
+        raise NPlusOneError(detector.report())
@@ -0,0 +1,293 @@
+"""
+数据库连接池
+
+为 Web 端提供有上限的 MySQL 连接复用：
+1. 连接数有上限（max_size），耗尽时等待，超时抛出 PoolTimeoutError
+2. 借出前对空闲较久的连接做 ping 健康检查，失效连接直接丢弃重建
+3. 连接超过 max_lifetime 后在归还/借出时回收，避免长连接被服务端断开
+4. 借出的连接被包装为 PooledConnection，调用 close() 即回滚未提交事务并归还连接池，
+   因此原有 "conn = get_db_connection() ... conn.close()" 的写法无需改动；
+   归还后再调用 cursor()/commit() 等方法抛出 InterfaceError；归还时关闭由它创建的游标，
+   之前拿到的游标再 execute 抛出 ProgrammingError，不会误用已借给其他请求的连接
+"""
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+import pymysql
+from flask import g, has_app_context
+
+from db_config import get_db_config, get_pool_config
+
+
+class PoolTimeoutError(pymysql.err.OperationalError):
+    """连接池耗尽且等待超时"""
+
+
+# 语句执行监听器：fn(sql, params, elapsed_seconds)，供SQL统计、N+1检测等使用
+_query_listeners = []
+
+
+def add_query_listener(fn):
+    """注册语句执行监听器（连接池借出的连接执行每条语句后回调）"""
+    if fn not in _query_listeners:
+        _query_listeners.append(fn)
+
+
+def remove_query_listener(fn):
+    """移除语句执行监听器"""
+    if fn in _query_listeners:
+        _query_listeners.remove(fn)
+
+
+def _notify_query(sql, params, elapsed):
+    for fn in list(_query_listeners):
+        try:
+            fn(sql, params, elapsed)
+        except Exception as e:
+            print(f"SQL监听器执行失败: {e}")
+
+
+class TracedCursor:
+    """包装 pymysql 游标，记录 execute/executemany 的耗时并通知监听器"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._cursor.close()
+
+    def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(query, args)
+        finally:
+            _notify_query(query, args, time.perf_counter() - start)
+
+    def executemany(self, query, args):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(query, args)
+        finally:
+            _notify_query(query, args, time.perf_counter() - start)
+
+
+class PooledConnection:
+    """连接池借出的连接：除 close() 外与 pymysql 连接用法一致"""
+
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._released = False
+        self._cursors = weakref.WeakSet()  # 本次借出期间创建的游标，归还时关闭
+
+    def __getattr__(self, name):
+        self._check_open()
+        return getattr(self._raw, name)
+
+    def _check_open(self):
+        # 归还后底层连接可能已被其他请求借出，继续使用会在别人的连接上执行语句
+        if self._released:
+            raise pymysql.err.InterfaceError(0, "连接已归还连接池，不能继续使用")
+
+    def cursor(self, *args, **kwargs):
+        self._check_open()
+        cursor = self._raw.cursor(*args, **kwargs)
+        self._cursors.add(cursor)
+        if _query_listeners:
+            return TracedCursor(cursor)
+        return cursor
+
+    @property
+    def open(self):
+        return not self._released and self._raw.open
+
+    def close(self):
+        """归还连接池（重复调用无副作用）"""
+        if self._released:
+            return
+        self._released = True
+        # 关闭游标后其 execute 不再能用到底层连接（关闭失败说明连接已坏，由 _release 丢弃）
+        for cursor in list(self._cursors):
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self._cursors.clear()
+        self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ConnectionPool:
+    """线程安全的 MySQL 连接池"""
+
+    def __init__(self, db_config, max_size=10, max_idle=5, max_lifetime=1800, ping_interval=5, timeout=10):
+        self.db_config = dict(db_config)
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._idle = deque()  # (raw, created_at, last_used)，后进先出以复用最"热"的连接
+        self._size = 0        # 已创建且未关闭的连接数（含借出与空闲）
+        self._cond = threading.Condition()
+
+    # ------------------------------------------------------------------ #
+    # 借出 / 归还
+    # ------------------------------------------------------------------ #
+    def acquire(self):
+        """借出一个连接，返回 PooledConnection"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            raw = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        raw, created_at, last_used = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(f"数据库连接池已耗尽（上限 {self.max_size}），等待超时")
+                    self._cond.wait(remaining)
+
+            if raw is None:
+                return self._create()
+
+            now = time.time()
+            if now - created_at >= self.max_lifetime:
+                self._discard(raw)
+                continue
+            if now - last_used >= self.ping_interval and not self._ping(raw):
+                self._discard(raw)
+                continue
+            return PooledConnection(self, raw, created_at)
+
+    def _create(self):
+        try:
+            raw = pymysql.connect(**self.db_config)
+        except Exception as e:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            print(f"数据库连接失败: {e}")
+            raise
+        return PooledConnection(self, raw, time.time())
+
+    def _release(self, raw, created_at):
+        """归还连接：回滚未提交事务，过期或空闲过多的连接直接关闭"""
+        try:
+            if not raw.open:
+                raise pymysql.err.InterfaceError("连接已关闭")
+            raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+
+        now = time.time()
+        if now - created_at >= self.max_lifetime:
+            self._discard(raw)
+            return
+
+        with self._cond:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((raw, created_at, now))
+                self._cond.notify()
+                return
+        self._discard(raw)
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _ping(raw):
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """with 写法：with pool.connection() as conn: ..."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------ #
+    # 管理
+    # ------------------------------------------------------------------ #
+    def close_all(self):
+        """关闭所有空闲连接（借出中的连接归还时按正常流程处理）"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        """返回连接池当前状态"""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取进程内共享的连接池（按 db_config 懒加载创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(get_db_config(), **get_pool_config())
+    return _pool
+
+
+def get_db_connection():
+    """获取数据库连接（从连接池借出）
+
+    在 Flask 应用上下文内，同一请求的多次调用（包括 ref_cache 等模块）复用同一个连接；
+    close() 只是回滚未提交事务并归还连接池，请求结束时由 app 的 teardown 兜底归还未关闭的连接。
+    应用上下文外（命令行、后台线程）每次借出新连接，由调用方 close()。
+    """
+    if not has_app_context():
+        return get_pool().acquire()
+    conn = g.get('db_conn')
+    if conn is None or not conn.open:
+        conn = get_pool().acquire()
+        g.db_conn = conn
+    return conn
@@ -0,0 +1,215 @@
+"""
+站内事件推送
+
+/api/events（SSE）与 /ws/chat（WebSocket）为每个登录用户保持长连接，业务写库提交后调用
+publish(账号列表, 事件类型, 数据) 把事件推给这些用户当前打开的全部页面：
+- chat：新聊天消息（推给接收方）
+- typing / read：对方正在输入、对方已读（由 /ws/chat 转发，推给聊天对象）
+- leave_status：请假审批结果（推给学生）
+- leave_notice：新请假涉及的课程通知（推给授课教师）
+
+投递方式随缓存后端（cache_backend 配置）：
+1. memory：只投递给本进程内的订阅者（单进程部署）
+2. redis：PUBLISH 到频道 <key_prefix>events，每个进程一个监听线程 SUBSCRIBE 后分发给本进程订阅者，
+   多个工作进程（以及 terminal 命令行）发布的事件都能送达
+事件只推送不落库：连接断开期间的事件由页面重连后补拉一次（或断开期间的轮询）获得。
+只有网页端的写操作会发布事件，terminal 命令行中的审批等操作不发布，
+学生页因此在推送正常时仍低频刷新请假记录（static/js/student.js 的 LEAVE_REFRESH_INTERVAL）。
+
+在线状态（presence）：有连接的用户在缓存 presence 命名空间中保留一个键，连接保持期间按距上次续期的时间
+（PRESENCE_REFRESH）定期续期，不论连接是否一直有消息往来，
+本进程最后一个连接断开时删除；进程异常退出时由 PRESENCE_TTL 过期兜底。is_online() 供联系人列表显示在线标记，
+redis 后端下各工作进程共享。
+"""
+import json
+import queue
+import threading
+import time
+
+from cache_backend import RedisBackend, CacheUnavailable, MISSING, get_cache
+from db_config import get_cache_config
+
+# 每个订阅者最多积压的事件数，超出时丢弃最早的（页面处理过慢或已失去响应）
+SUBSCRIBER_QUEUE_SIZE = 100
+EVENT_CHANNEL = "events"
+# 在线状态有效期（秒），需大于连接心跳间隔（app.py 的 EVENT_KEEPALIVE / CHAT_SOCKET_KEEPALIVE）
+PRESENCE_TTL = 60
+# 连接保持期间距上次续期超过该秒数时续期在线状态
+PRESENCE_REFRESH = PRESENCE_TTL // 3
+
+_presence = get_cache().namespace("presence", ttl=PRESENCE_TTL)
+
+
+class Subscription:
+    """一个 SSE 连接的事件队列"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.touched_at = time.monotonic()  # 上次续期在线状态的时间
+
+    def put(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        """返回 (事件类型, 数据)，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBus:
+    """本进程内的订阅表 + 跨进程投递（broker）"""
+
+    def __init__(self):
+        self._subscribers = {}  # user_id -> {Subscription}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.broker = None
+
+    def subscribe(self, user_id):
+        subscription = Subscription(str(user_id))
+        with self._lock:
+            self._subscribers.setdefault(subscription.user_id, set()).add(subscription)
+        self.touch(subscription.user_id)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        offline = False
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[subscription.user_id]
+                    offline = True
+        if offline:
+            _presence.delete(subscription.user_id)
+
+    def touch(self, user_id):
+        """续期在线状态"""
+        _presence.set(str(user_id), 1)
+
+    def refresh(self, subscription):
+        """连接循环每轮调用（收到消息、推送事件或心跳后）：距上次续期超过 PRESENCE_REFRESH 秒时续期"""
+        now = time.monotonic()
+        if now - subscription.touched_at >= PRESENCE_REFRESH:
+            subscription.touched_at = now
+            self.touch(subscription.user_id)
+
+    def is_online(self, user_ids):
+        """返回 {账号: 是否在线}；缓存不可用时只认本进程内的连接"""
+        with self._lock:
+            local = set(self._subscribers)
+        return {user_id: str(user_id) in local or _presence.get(str(user_id)) is not MISSING
+                for user_id in user_ids}
+
+    def publish(self, user_ids, event, data):
+        """把事件推给 user_ids 中每个用户打开的全部连接；投递失败只记录日志，不影响业务"""
+        user_ids = sorted({str(user_id) for user_id in user_ids if user_id})
+        if not user_ids:
+            return
+        with self._lock:
+            self.published += 1
+        try:
+            self.broker.publish(user_ids, event, data)
+        except CacheUnavailable as e:
+            print(f"事件推送失败（{event} -> {user_ids}）: {e}")
+
+    def deliver(self, user_ids, event, data):
+        """分发给本进程内的订阅者（由 broker 调用）"""
+        with self._lock:
+            targets = [sub for user_id in user_ids for sub in self._subscribers.get(user_id, ())]
+            self.delivered += len(targets)
+        for subscription in targets:
+            subscription.put((event, data))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "broker": self.broker.name,
+                "online_users": len(self._subscribers),
+                "connections": sum(len(subs) for subs in self._subscribers.values()),
+                "published": self.published,
+                "delivered": self.delivered,
+            }
+
+
+class MemoryBroker:
+    """单进程：直接分发"""
+
+    name = "memory"
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    def publish(self, user_ids, event, data):
+        self.bus.deliver(user_ids, event, data)
+
+
+class RedisBroker:
+    """多进程：经 Redis 频道转发，本进程的监听线程收到后分发"""
+
+    name = "redis"
+
+    def __init__(self, bus, url, prefix, timeout):
+        self.bus = bus
+        self.redis = RedisBackend(url, prefix, timeout)
+        self._listener = threading.Thread(target=self._listen, name="event-bus-listener", daemon=True)
+        self._listener.start()
+
+    def publish(self, user_ids, event, data):
+        payload = json.dumps({"users": user_ids, "event": event, "data": data}, ensure_ascii=False, default=str)
+        self.redis.publish(EVENT_CHANNEL, payload)
+
+    def _listen(self):
+        delay = 1
+        while True:
+            conn = None
+            try:
+                conn = self.redis.connect()
+                for raw in conn.subscribe(self.redis.prefix + EVENT_CHANNEL):
+                    delay = 1
+                    message = json.loads(raw.decode("utf-8"))
+                    self.bus.deliver(message["users"], message["event"], message["data"])
+            except (OSError, ValueError, CacheUnavailable) as e:
+                print(f"事件订阅连接断开，{delay}秒后重连: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_event_bus():
+    """获取进程内共享的事件总线（按 db_config.get_cache_config 选择投递方式）"""
+    global _bus
+    if _bus is None:
+        with _bus_lock:
+            if _bus is None:
+                config = get_cache_config()
+                bus = EventBus()
+                if config["backend"] == "redis":
+                    bus.broker = RedisBroker(bus, config["redis_url"], config["key_prefix"], config["timeout"])
+                else:
+                    bus.broker = MemoryBroker(bus)
+                _bus = bus
+    return _bus
+
+
+def publish(user_ids, event, data):
+    get_event_bus().publish(user_ids, event, data)
@@ -0,0 +1,183 @@
+"""
+假条签名与佐证文件登记
+
+签名（data/signatures）与佐证文件（data/certificates）写入磁盘时，同时在 leave_artifacts 表中登记
+文件名、大小与 SHA-256，详情/列表接口按表中记录直接生成访问 URL，不再逐个 os.path.exists：
+1. 写入：with save_artifact(cursor, kind, leave_id, owner_id, filename, data) as url: conn.commit()
+   登记并先写入同目录的临时文件，with 块内提交事务成功后才替换为正式文件名
+2. 读取：attach_artifact_urls(cursor, leaves) 一次查询为多条假条填充签名/佐证 URL
+3. 文件被手工增删或写库失败导致不一致时，执行 python sql/migrate.py reconcile 按磁盘文件修正
+
+文件命名沿用原规则：签名 <签名人账号>_<假条ID>.png，佐证 <学号>_<假条ID>.<扩展名>。
+"""
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SIGNATURE_FOLDER = os.path.join(BASE_DIR, 'data', 'signatures')
+CERTIFICATE_FOLDER = os.path.join(BASE_DIR, 'data', 'certificates')
+
+# 文件类别
+STUDENT_SIGNATURE = "student_signature"
+COUNSELOR_SIGNATURE = "counselor_signature"
+ATTACHMENT = "attachment"
+
+# 类别 -> (存储目录, 访问 URL 前缀)
+ARTIFACT_KINDS = {
+    STUDENT_SIGNATURE: (SIGNATURE_FOLDER, "/qianzi/"),
+    COUNSELOR_SIGNATURE: (SIGNATURE_FOLDER, "/qianzi/"),
+    ATTACHMENT: (CERTIFICATE_FOLDER, "/zhengming/"),
+}
+
+
+def artifact_url(kind, filename):
+    return ARTIFACT_KINDS[kind][1] + filename if filename else None
+
+
+def _upsert(cursor, leave_id, kind, owner_id, filename, size, content_hash):
+    cursor.execute("""
+        INSERT INTO leave_artifacts (leave_id, kind, owner_id, file_name, file_size, content_hash)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE file_name = VALUES(file_name), file_size = VALUES(file_size),
+                                content_hash = VALUES(content_hash)
+    """, (leave_id, kind, owner_id, filename, size, content_hash))
+
+
+@contextmanager
+def save_artifact(cursor, kind, leave_id, owner_id, filename, data):
+    """
+    登记 data（bytes）并写入该类别目录下的临时文件，产出访问 URL；同一假条、类别、账号只保留最新一条
+    调用方在 with 块内提交事务：块正常结束时临时文件原子替换为正式文件（os.replace），
+    块内抛出异常（如提交失败）时删除临时文件，已有的同名文件保持不变
+    替换失败时登记已提交而文件仍是旧的，执行 python sql/migrate.py reconcile 按磁盘修正
+    """
+    folder = ARTIFACT_KINDS[kind][0]
+    path = os.path.join(folder, filename)
+    # 临时文件名不符合 <账号>_<假条ID>.<扩展名> 规则，reconcile 扫描时会跳过
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    _upsert(cursor, leave_id, kind, str(owner_id), filename, len(data), hashlib.sha256(data).hexdigest())
+    os.makedirs(folder, exist_ok=True)
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        yield artifact_url(kind, filename)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+
+def attach_artifact_urls(cursor, leaves):
+    """
+    为假条（dict，需含 leave_id、student_id，可含 approver_id）填充：
+    student_signature / counselor_signature（审批人的签名）/ attachment_url，不存在时为 None
+    """
+    for leave in leaves:
+        leave['student_signature'] = leave['counselor_signature'] = leave['attachment_url'] = None
+    if not leaves:
+        return leaves
+
+    by_id = {}
+    for leave in leaves:
+        by_id.setdefault(int(leave['leave_id']), []).append(leave)
+    placeholders = ", ".join(["%s"] * len(by_id))
+    cursor.execute(f"""
+        SELECT leave_id, kind, owner_id, file_name
+        FROM leave_artifacts
+        WHERE leave_id IN ({placeholders})
+    """, list(by_id))
+    for row in cursor.fetchall():
+        if isinstance(row, dict):
+            row = (row['leave_id'], row['kind'], row['owner_id'], row['file_name'])
+        leave_id, kind, owner_id, filename = row
+        for leave in by_id.get(int(leave_id), ()):
+            if kind == STUDENT_SIGNATURE and owner_id == str(leave.get('student_id')):
+                leave['student_signature'] = artifact_url(kind, filename)
+            elif kind == COUNSELOR_SIGNATURE and owner_id == str(leave.get('approver_id') or ''):
+                leave['counselor_signature'] = artifact_url(kind, filename)
+            elif kind == ATTACHMENT:
+                leave['attachment_url'] = artifact_url(kind, filename)
+    return leaves
+
+
+# ---------------------------------------------------------------------- #
+# 按磁盘文件修正登记表
+# ---------------------------------------------------------------------- #
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _scan(folder):
+    """[(文件名, 账号, 假条ID)]，跳过子目录与不符合命名规则的文件"""
+    result = []
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return result
+    for name in names:
+        stem = os.path.splitext(name)[0]
+        owner_id, _, leave_id = stem.rpartition('_')
+        if not owner_id or not leave_id.isdigit() or not os.path.isfile(os.path.join(folder, name)):
+            continue
+        result.append((name, owner_id, int(leave_id)))
+    return result
+
+
+def reconcile_leave_artifacts(cursor):
+    """
+    扫描签名/佐证目录，使 leave_artifacts 与磁盘一致（调用方提交事务），返回 [(操作, leave_id, kind, 文件名)]：
+    新增未登记的文件、更新大小/哈希变化的文件、删除文件已不存在或假条已删除的记录
+    """
+    signatures = _scan(SIGNATURE_FOLDER)
+    attachments = _scan(CERTIFICATE_FOLDER)
+    leave_ids = sorted({item[2] for item in signatures + attachments})
+
+    students = {}
+    if leave_ids:
+        placeholders = ", ".join(["%s"] * len(leave_ids))
+        cursor.execute(f"SELECT leave_id, leave_student_id FROM student_leave WHERE leave_id IN ({placeholders})",
+                       leave_ids)
+        students = {int(row[0]): str(row[1]) for row in cursor.fetchall()}
+
+    # 磁盘上的文件：(leave_id, kind, owner_id) -> (文件名, 完整路径)；同一键有多个文件（如不同扩展名）时取最近修改的
+    on_disk = {}
+    for folder, items, is_signature in ((SIGNATURE_FOLDER, signatures, True), (CERTIFICATE_FOLDER, attachments, False)):
+        for name, owner_id, leave_id in items:
+            student_id = students.get(leave_id)
+            if student_id is None:
+                continue
+            if is_signature:
+                kind = STUDENT_SIGNATURE if owner_id == student_id else COUNSELOR_SIGNATURE
+            elif owner_id == student_id:
+                kind = ATTACHMENT
+            else:
+                continue
+            path = os.path.join(folder, name)
+            key = (leave_id, kind, owner_id)
+            if key not in on_disk or os.path.getmtime(path) > os.path.getmtime(on_disk[key][1]):
+                on_disk[key] = (name, path)
+
+    cursor.execute("SELECT leave_id, kind, owner_id, file_name, file_size, content_hash FROM leave_artifacts")
+    registered = {(int(row[0]), row[1], row[2]): row[3:] for row in cursor.fetchall()}
+
+    changes = []
+    for key, (name, path) in sorted(on_disk.items()):
+        size, content_hash = os.path.getsize(path), _file_hash(path)
+        current = registered.get(key)
+        if current and tuple(current) == (name, size, content_hash):
+            continue
+        _upsert(cursor, key[0], key[1], key[2], name, size, content_hash)
+        changes.append(("更新" if current else "新增", key[0], key[1], name))
+
+    for key, (name, _, _) in sorted(registered.items()):
+        if key not in on_disk:
+            cursor.execute("DELETE FROM leave_artifacts WHERE leave_id = %s AND kind = %s AND owner_id = %s", key)
+            changes.append(("删除", key[0], key[1], name))
+    return changes
@@ -0,0 +1,199 @@
+"""
+请假物化统计
+
+在写 student_leave 的同一事务内增量维护以下汇总表，计数/统计接口只读汇总表，不再扫描 student_leave：
+- leave_counters(grade, approval_status, count)：各年级各状态的请假条数（辅导员角标）
+- leave_stats_monthly(grade, month, sort, approval_status, leave_count, leave_days)：
+  按年级、开始月份、请假类型、状态汇总的条数与请假天数（统计页图表）
+- leave_stats_student_monthly(grade, month, student_id, student_name, leave_count, leave_days)：
+  按年级、开始月份、学生汇总的条数与请假天数，不分状态（统计页排行）
+
+写入钩子（参数为请假ID，年级/月份/类型/天数由数据库从该记录计算，调用方无需关心）：
+1. 新建请假：record_new_leave(cursor, leave_id)
+2. 审批改状态：record_status_change(cursor, leave_id, old_status, new_status)
+3. 直接改库等原因导致汇总偏差时，执行 python sql/migrate.py reconcile 按 student_leave 重建
+
+调用方负责提交/回滚事务，汇总与请假记录同时生效。
+"""
+# 审批状态（与 student_leave.approval_status 一致）
+PENDING = "待审批"
+APPROVED = "已批准"
+REJECTED = "已驳回"
+
+# 单条请假的统计口径（student_leave 别名为 sl）：月份按开始时间，未填类型归为“其他”，
+# 天数 = 跨越天数 + 1（与原统计页按 (end - start).days + 1 计算一致）
+MONTH_SQL = "DATE_FORMAT(sl.leave_start_time, '%%Y-%%m')"
+SORT_SQL = "COALESCE(NULLIF(sl.sort, ''), '其他')"
+DAYS_SQL = "GREATEST(TIMESTAMPDIFF(DAY, sl.leave_start_time, sl.leave_end_time) + 1, 0)"
+
+
+def _apply(cursor, leave_id, deltas):
+    """deltas: [(approval_status, +1/-1)]，按该请假记录增减两张汇总表"""
+    delta_sql = " UNION ALL ".join(
+        ["SELECT %s AS approval_status, %s AS delta"] + ["SELECT %s, %s"] * (len(deltas) - 1))
+    params = [value for delta in deltas for value in delta] + [leave_id]
+    cursor.execute(f"""
+        INSERT INTO leave_counters (grade, approval_status, count)
+        SELECT sl.grade, d.approval_status, d.delta
+        FROM student_leave sl
+        JOIN ({delta_sql}) d
+        WHERE sl.leave_id = %s
+        ON DUPLICATE KEY UPDATE count = count + VALUES(count)
+    """, params)
+    cursor.execute(f"""
+        INSERT INTO leave_stats_monthly (grade, month, sort, approval_status, leave_count, leave_days)
+        SELECT sl.grade, {MONTH_SQL}, {SORT_SQL}, d.approval_status, d.delta, d.delta * {DAYS_SQL}
+        FROM student_leave sl
+        JOIN ({delta_sql}) d
+        WHERE sl.leave_id = %s
+        ON DUPLICATE KEY UPDATE leave_count = leave_count + VALUES(leave_count),
+                                leave_days = leave_days + VALUES(leave_days)
+    """, params)
+
+
+def record_new_leave(cursor, leave_id, status=PENDING):
+    """插入请假记录后调用"""
+    _apply(cursor, leave_id, [(status, 1)])
+    cursor.execute(f"""
+        INSERT INTO leave_stats_student_monthly (grade, month, student_id, student_name, leave_count, leave_days)
+        SELECT sl.grade, {MONTH_SQL}, sl.leave_student_id, sl.leave_student_name, 1, {DAYS_SQL}
+        FROM student_leave sl
+        WHERE sl.leave_id = %s
+        ON DUPLICATE KEY UPDATE student_name = VALUES(student_name),
+                                leave_count = leave_count + 1,
+                                leave_days = leave_days + VALUES(leave_days)
+    """, (leave_id,))
+
+
+def record_status_change(cursor, leave_id, old_status, new_status):
+    """请假状态由 old_status 改为 new_status 后调用"""
+    if old_status == new_status:
+        return
+    _apply(cursor, leave_id, [(old_status, -1), (new_status, 1)])
+
+
+# ---------------------------------------------------------------------- #
+# 读取
+# ---------------------------------------------------------------------- #
+def _rows(cursor):
+    return [tuple(row.values()) if isinstance(row, dict) else row for row in cursor.fetchall()]
+
+
+def get_leave_counts(cursor, grade=None):
+    """{approval_status: count}；grade 为空时汇总所有年级"""
+    if grade:
+        cursor.execute(
+            "SELECT approval_status, count FROM leave_counters WHERE grade = %s", (grade,))
+    else:
+        cursor.execute(
+            "SELECT approval_status, SUM(count) FROM leave_counters GROUP BY approval_status")
+    return {status: int(count or 0) for status, count in _rows(cursor)}
+
+
+def get_monthly_stats(cursor, since_month, grade=None):
+    """since_month（'YYYY-MM'）起的月度汇总 [(grade, month, sort, approval_status, leave_count, leave_days)]"""
+    sql = """
+        SELECT grade, month, sort, approval_status, leave_count, leave_days
+        FROM leave_stats_monthly
+        WHERE month >= %s AND leave_count > 0
+    """
+    params = [since_month]
+    if grade:
+        sql += " AND grade = %s"
+        params.append(grade)
+    cursor.execute(sql, params)
+    return _rows(cursor)
+
+
+def get_top_students(cursor, since_month, grade=None, limit=10):
+    """
+    since_month 起请假条数最多的学生 [(student_id, student_name, leave_count, leave_days)]
+    姓名取 student_info 中的当前姓名，学生已删除时取请假记录中的
+    """
+    sql = """
+        SELECT t.student_id, COALESCE(si.student_name, t.student_name), t.leave_count, t.leave_days
+        FROM (
+            SELECT student_id, MAX(student_name) AS student_name,
+                   SUM(leave_count) AS leave_count, SUM(leave_days) AS leave_days
+            FROM leave_stats_student_monthly
+            WHERE month >= %s
+    """
+    params = [since_month]
+    if grade:
+        sql += " AND grade = %s"
+        params.append(grade)
+    sql += """
+            GROUP BY student_id
+            ORDER BY leave_count DESC
+            LIMIT %s
+        ) t
+        LEFT JOIN student_info si ON si.student_id = t.student_id
+        ORDER BY t.leave_count DESC
+    """
+    params.append(limit)
+    cursor.execute(sql, params)
+    return _rows(cursor)
+
+
+# ---------------------------------------------------------------------- #
+# 重建
+# ---------------------------------------------------------------------- #
+def _rebuild(cursor, table, key_columns, value_columns, select_sql):
+    """清空并按 select_sql 重新生成汇总表，返回有偏差的 [(key, 旧值, 新值)]"""
+    columns = ", ".join(key_columns + value_columns)
+    width = len(key_columns)
+    cursor.execute(f"SELECT {columns} FROM {table} FOR UPDATE")
+    before = {tuple(row[:width]): tuple(row[width:]) for row in cursor.fetchall()}
+    cursor.execute(f"DELETE FROM {table}")
+    cursor.execute(f"INSERT INTO {table} ({columns}) {select_sql}", ())  # 传空参数，使 %% 按转义处理
+    cursor.execute(f"SELECT {columns} FROM {table}")
+    after = {tuple(row[:width]): tuple(row[width:]) for row in cursor.fetchall()}
+
+    zero = (0,) * len(value_columns)
+    drift = []
+    for key in sorted(set(before) | set(after)):
+        old, new = before.get(key, zero), after.get(key, zero)
+        if old != new:
+            drift.append((key, old, new))
+    return drift
+
+
+def reconcile_leave_counters(conn):
+    """
+    按 student_leave 重建三张汇总表，返回 {表名: [(key, 旧值, 新值)]}
+
+    DELETE 锁住全部汇总行，INSERT ... SELECT 对 student_leave 加共享锁，
+    重建期间并发的提交/审批会等待本事务结束，不会丢失计数。
+    """
+    cursor = conn.cursor()
+    try:
+        conn.begin()
+        result = {
+            "leave_counters": _rebuild(
+                cursor, "leave_counters", ["grade", "approval_status"], ["count"], """
+                SELECT sl.grade, sl.approval_status, COUNT(*)
+                FROM student_leave sl
+                GROUP BY sl.grade, sl.approval_status
+            """),
+            "leave_stats_monthly": _rebuild(
+                cursor, "leave_stats_monthly", ["grade", "month", "sort", "approval_status"],
+                ["leave_count", "leave_days"], f"""
+                SELECT sl.grade, {MONTH_SQL}, {SORT_SQL}, sl.approval_status, COUNT(*), SUM({DAYS_SQL})
+                FROM student_leave sl
+                GROUP BY 1, 2, 3, 4
+            """),
+            "leave_stats_student_monthly": _rebuild(
+                cursor, "leave_stats_student_monthly", ["grade", "month", "student_id"],
+                ["student_name", "leave_count", "leave_days"], f"""
+                SELECT sl.grade, {MONTH_SQL}, sl.leave_student_id, MAX(sl.leave_student_name), COUNT(*), SUM({DAYS_SQL})
+                FROM student_leave sl
+                GROUP BY 1, 2, 3
+            """),
+        }
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return result
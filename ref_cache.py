@@ -0,0 +1,120 @@
+"""
+基础数据缓存
+
+课程（course_info）、教师（teacher_info）及课程-授课教师、教师-所授课程（teacher_course）几乎不变，
+却在多个接口中每次请求都被整表读取。这里提供读穿透缓存（存放在 cache_backend 的 "ref" 命名空间）：
+1. 未命中时从数据库加载并缓存，命中时直接返回
+2. 每项缓存有 TTL（REF_CACHE_TTL 秒），条目上限与后端（进程内 / Redis）由 cache_backend 配置决定
+3. 管理员修改用户、授课信息后调用 invalidate_reference_data() 按类别标签失效；
+   使用 Redis 后端时所有工作进程同时生效，其他写入方（如 terminal 命令行）的修改依靠 TTL 过期后生效
+
+返回的列表/字典为缓存对象本身（进程内后端时），调用方不要修改（需要改动时先复制）。
+"""
+import os
+
+from flask import has_app_context
+
+from cache_backend import get_cache
+from db_pool import get_db_connection
+
+REF_CACHE_TTL = float(os.environ.get("REF_CACHE_TTL", "300"))
+
+# 缓存类别（同时作为失效标签 ref:<类别>）
+COURSES = "courses"
+TEACHERS = "teachers"
+COURSE_TEACHERS = "course_teachers"
+TEACHER_COURSES = "teacher_courses"
+ALL_KINDS = (COURSES, TEACHERS, COURSE_TEACHERS, TEACHER_COURSES)
+
+_cache = get_cache().namespace("ref", ttl=REF_CACHE_TTL)
+
+
+def _tag(kind):
+    return f"ref:{kind}"
+
+
+def _query(sql, params=None):
+    # 请求内复用该请求已借出的连接（请求结束时统一归还），缓存未命中时不会让一个请求占用两个连接
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        if not has_app_context():
+            conn.close()
+
+
+# ---------------------------------------------------------------------- #
+# 读取
+# ---------------------------------------------------------------------- #
+def get_course_map():
+    """{course_id: course_name}，按 course_id 排序"""
+    def load():
+        rows = _query("SELECT course_id, course_name FROM course_info ORDER BY course_id")
+        return {row[0]: row[1] for row in rows}
+    return _cache.get_or_load(COURSES, load, tags=(_tag(COURSES),))
+
+
+def get_courses():
+    """[{course_id, course_name}, ...]，按 course_id 排序"""
+    return [{"course_id": cid, "course_name": name} for cid, name in get_course_map().items()]
+
+
+def course_names(course_ids):
+    """把逗号分隔的课程ID转为课程名称字符串，未知课程保留原ID"""
+    if not course_ids:
+        return ''
+    course_map = get_course_map()
+    return ', '.join(course_map.get(cid.strip(), cid.strip()) for cid in course_ids.split(','))
+
+
+def get_teacher_map():
+    """{teacher_id: teacher_name}，按 teacher_id 排序"""
+    def load():
+        rows = _query("SELECT teacher_id, teacher_name FROM teacher_info ORDER BY teacher_id")
+        return {row[0]: row[1] for row in rows}
+    return _cache.get_or_load(TEACHERS, load, tags=(_tag(TEACHERS),))
+
+
+def get_teachers():
+    """[{teacher_id, teacher_name}, ...]，按 teacher_id 排序"""
+    return [{"teacher_id": tid, "teacher_name": name} for tid, name in get_teacher_map().items()]
+
+
+def get_course_teachers(course_id):
+    """某课程的授课教师 [{teacher_id, teacher_name}, ...]（仅包含 teacher_info 中存在的教师）"""
+    def load():
+        rows = _query("SELECT teacher_id FROM teacher_course WHERE course_id = %s", (course_id,))
+        return [row[0] for row in rows]
+    teacher_ids = _cache.get_or_load(f"{COURSE_TEACHERS}:{course_id}", load,
+                                     tags=(_tag(COURSE_TEACHERS), f"course:{course_id}"))
+    teacher_map = get_teacher_map()
+    return [{"teacher_id": tid, "teacher_name": teacher_map[tid]} for tid in teacher_ids if tid in teacher_map]
+
+
+def get_teacher_course_ids(teacher_id):
+    """某教师所授课程的ID列表（按 course_id 排序），用于审批等权限校验"""
+    def load():
+        rows = _query("SELECT course_id FROM teacher_course WHERE teacher_id = %s ORDER BY course_id", (teacher_id,))
+        return [row[0] for row in rows]
+    return _cache.get_or_load(f"{TEACHER_COURSES}:{teacher_id}", load,
+                              tags=(_tag(TEACHER_COURSES), f"teacher:{teacher_id}"))
+
+
+# ---------------------------------------------------------------------- #
+# 失效与统计
+# ---------------------------------------------------------------------- #
+def invalidate_reference_data(*kinds):
+    """数据变更后调用，如 invalidate_reference_data(TEACHERS, COURSE_TEACHERS)；不传参数时全部失效"""
+    get_cache().invalidate_tags(*[_tag(kind) for kind in (kinds or ALL_KINDS)])
+
+
+def invalidate_teacher_courses(teacher_id):
+    """某教师授课信息变更（或教师被删除）后调用，只失效该教师的课程集合"""
+    get_cache().invalidate_tags(f"teacher:{teacher_id}")
+
+
+def reference_cache_stats():
+    return _cache.stats()
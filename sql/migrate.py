@@ -0,0 +1,353 @@
+"""
+数据库迁移工具
+
+按版本号顺序执行 sql/migrations 下的迁移脚本，已执行的版本记录在 schema_migrations 表中：
+- NNNN_name.sql：按 ; 分隔逐条执行（-- 开头的行视为注释）
+- NNNN_name.py：提供 upgrade(cursor, schema) 函数，schema 用于判断表/列/索引是否已存在
+
+用法：
+    python sql/migrate.py status     查看各版本执行情况
+    python sql/migrate.py upgrade    执行所有未执行的迁移
+    python sql/migrate.py check      对热点查询执行 EXPLAIN，确认走了预期索引
+    python sql/migrate.py reconcile  按明细重建请假汇总表、聊天联系人表与会话状态表、按磁盘文件修正 leave_artifacts，并列出偏差
+    python sql/migrate.py archive    把超过保留天数的聊天记录移入学期归档表（见 chat_archive.py）
+"""
+import argparse
+import importlib.util
+import os
+import re
+import sys
+
+import pymysql
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chat_archive import archive_old_messages
+from chat_contacts import reconcile_chat_contacts
+from chat_state import reconcile_conversation_state
+from db_config import get_db_config
+from leave_artifacts import reconcile_leave_artifacts
+from leave_counters import reconcile_leave_counters
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_(\w+)\.(sql|py)$")
+
+# 热点查询：(说明, EXPLAIN 中要检查的表（别名）, SQL, 参数, 可接受的索引)
+HOT_QUERIES = [
+    ("聊天记录（增量拉取）", "chat_messages",
+     "SELECT message_id FROM chat_messages "
+     "WHERE ((sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s)) "
+     "AND message_id > %s ORDER BY message_id ASC LIMIT 51",
+     ("0", "1", "1", "0", 0), {"idx_sender_receiver_msg"}),
+    ("聊天记录（按时间）", "chat_messages",
+     "SELECT message_id FROM chat_messages "
+     "WHERE ((sender_id = %s AND receiver_id = %s) OR (sender_id = %s AND receiver_id = %s)) "
+     "AND create_time > %s",
+     ("0", "1", "1", "0", "2000-01-01"), {"idx_sender_receiver_time"}),
+    ("聊天未读数（已读位置之后）", "chat_messages",
+     "SELECT COUNT(*) FROM chat_messages WHERE sender_id = %s AND receiver_id = %s AND message_id > %s",
+     ("0", "1", 0), {"idx_sender_receiver_msg"}),
+    ("学生请假记录", "student_leave",
+     "SELECT leave_id FROM student_leave WHERE leave_student_id = %s ORDER BY leave_start_time DESC",
+     ("0",), {"idx_student_start"}),
+    ("辅导员待审批列表", "sl",
+     "SELECT sl.leave_id FROM student_leave sl "
+     "WHERE sl.grade = %s AND sl.approval_status = '待审批' ORDER BY sl.leave_start_time DESC",
+     ("0000",), {"idx_grade_status_start"}),
+    ("学生请假版本号（ETag）", "student_leave",
+     "SELECT COUNT(*), MAX(update_time) FROM student_leave WHERE leave_student_id = %s",
+     ("0",), {"idx_student_update"}),
+    ("年级请假版本号（ETag）", "student_leave",
+     "SELECT COUNT(*), MAX(update_time) FROM student_leave WHERE grade = %s",
+     ("0000",), {"idx_grade_update"}),
+    ("辅导员统计", "student_leave",
+     "SELECT COUNT(*) FROM student_leave WHERE grade = %s",
+     ("0000",), {"idx_grade_start", "idx_grade_status_start"}),
+    ("辅导员审批数量", "student_leave",
+     "SELECT COUNT(*) FROM student_leave WHERE approver_id = %s AND approval_status IN ('已批准', '已驳回')",
+     ("0",), {"idx_approver_time"}),
+    ("教师相关请假", "slc",
+     "SELECT slc.leave_id FROM student_leave_course slc WHERE slc.teacher_id = %s",
+     ("0",), {"idx_teacher_leave"}),
+    ("课程授课教师", "teacher_course",
+     "SELECT teacher_id FROM teacher_course WHERE course_id = %s",
+     ("0",), {"idx_course_teacher"}),
+    ("课程选课学生", "student_course",
+     "SELECT student_id FROM student_course WHERE course_id = %s",
+     ("0",), {"idx_course_student"}),
+    ("课程通知", "teacher_notifications",
+     "SELECT leave_id FROM teacher_notifications WHERE course_id = %s ORDER BY start_time DESC",
+     ("0",), {"idx_course_start"}),
+    ("年级辅导员", "counselor_info",
+     "SELECT counselor_id FROM counselor_info WHERE responsible_grade = %s",
+     ("0000",), {"idx_responsible_grade"}),
+    ("年级请假数量", "leave_counters",
+     "SELECT approval_status, count FROM leave_counters WHERE grade = %s",
+     ("0000",), {"PRIMARY"}),
+    ("年级月度统计", "leave_stats_monthly",
+     "SELECT month, sort, approval_status, leave_count, leave_days FROM leave_stats_monthly "
+     "WHERE month >= %s AND grade = %s",
+     ("2000-01", "0000"), {"PRIMARY"}),
+    ("统计页请假排行", "leave_stats_student_monthly",
+     "SELECT student_id, SUM(leave_count) FROM leave_stats_student_monthly "
+     "WHERE month >= %s AND grade = %s GROUP BY student_id",
+     ("2000-01", "0000"), {"PRIMARY"}),
+    ("年级学生", "student_info",
+     "SELECT student_id FROM student_info WHERE grade = %s",
+     ("0000",), {"idx_grade_student"}),
+    ("聊天联系人", "cc",
+     "SELECT cc.contact_id FROM chat_contacts cc WHERE cc.owner_id = %s ORDER BY cc.contact_id",
+     ("0",), {"PRIMARY"}),
+    ("聊天归档索引", "chat_archive_index",
+     "SELECT semester FROM chat_archive_index "
+     "WHERE user_a = %s AND user_b = %s AND min_message_id < %s ORDER BY max_message_id DESC",
+     ("0", "1", 0), {"PRIMARY"}),
+    ("聊天联系人会话状态", "cs",
+     "SELECT cc.contact_id, cs.unread_count FROM chat_contacts cc "
+     "LEFT JOIN chat_conversation_state cs ON cs.owner_id = cc.owner_id AND cs.peer_id = cc.contact_id "
+     "WHERE cc.owner_id = %s",
+     ("0",), {"PRIMARY"}),
+    ("聊天联系人重建", "chat_contacts",
+     "SELECT owner_id FROM chat_contacts WHERE contact_id = %s",
+     ("0",), {"idx_contact"}),
+]
+
+
+class Schema:
+    """供 .py 迁移脚本使用的表结构查询工具（基于 information_schema，作用于当前库）"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def table_exists(self, table):
+        self.cursor.execute(
+            "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table,))
+        return self.cursor.fetchone() is not None
+
+    def column_exists(self, table, column):
+        self.cursor.execute(
+            "SELECT 1 FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+            (table, column))
+        return self.cursor.fetchone() is not None
+
+    def index_exists(self, table, index_name):
+        self.cursor.execute(
+            "SELECT 1 FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+            (table, index_name))
+        return self.cursor.fetchone() is not None
+
+    def add_index(self, table, index_name, columns):
+        """索引不存在时创建"""
+        if self.index_exists(table, index_name):
+            return False
+        self.cursor.execute(f"ALTER TABLE {table} ADD INDEX {index_name} ({columns})")
+        print(f"  创建索引 {table}.{index_name} ({columns})")
+        return True
+
+
+def get_connection():
+    return pymysql.connect(**get_db_config())
+
+
+def ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(4) NOT NULL PRIMARY KEY COMMENT '迁移版本号',
+            name VARCHAR(100) NOT NULL COMMENT '迁移名称',
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '执行时间'
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='数据库迁移记录表'
+    """)
+
+
+def load_migrations():
+    """按版本号返回 [(version, name, path)]"""
+    migrations = []
+    seen = {}
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        version, name, _ = match.groups()
+        if version in seen:
+            raise ValueError(f"迁移版本号重复: {seen[version]} / {filename}")
+        seen[version] = filename
+        migrations.append((version, name, os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def split_sql(text):
+    """去掉 -- 注释行后按 ; 拆分语句"""
+    lines = [line for line in text.splitlines() if not line.strip().startswith("--")]
+    return [stmt.strip() for stmt in "\n".join(lines).split(";") if stmt.strip()]
+
+
+def run_migration(cursor, path):
+    if path.endswith(".sql"):
+        with open(path, encoding="utf-8") as f:
+            for statement in split_sql(f.read()):
+                cursor.execute(statement)
+        return
+
+    spec = importlib.util.spec_from_file_location(f"migration_{os.path.basename(path)[:-3]}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.upgrade(cursor, Schema(cursor))
+
+
+def cmd_status(conn):
+    cursor = conn.cursor()
+    ensure_migrations_table(cursor)
+    applied = applied_versions(cursor)
+    for version, name, _ in load_migrations():
+        state = "已执行" if version in applied else "未执行"
+        print(f"{version}  {name:<30} {state}")
+    return 0
+
+
+def cmd_upgrade(conn):
+    cursor = conn.cursor()
+    ensure_migrations_table(cursor)
+    applied = applied_versions(cursor)
+    pending = [m for m in load_migrations() if m[0] not in applied]
+    if not pending:
+        print("数据库已是最新版本")
+        return 0
+
+    for version, name, path in pending:
+        print(f"执行迁移 {version}_{name} ...")
+        try:
+            run_migration(cursor, path)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+        except Exception as e:
+            # MySQL 的 DDL 会隐式提交，无法整体回滚；迁移脚本均可重复执行，修复后重新 upgrade 即可
+            conn.rollback()
+            print(f"迁移 {version}_{name} 失败: {e}")
+            return 1
+    print(f"完成 {len(pending)} 个迁移")
+    return 0
+
+
+def cmd_check(conn):
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    failures = 0
+    for desc, table, sql, params, expected in HOT_QUERIES:
+        try:
+            cursor.execute("EXPLAIN " + sql, params)
+            rows = [r for r in cursor.fetchall() if r.get("table") == table]
+        except Exception as e:
+            print(f"[失败] {desc}: EXPLAIN 执行出错 {e}")
+            failures += 1
+            continue
+        if not rows:
+            print(f"[失败] {desc}: EXPLAIN 结果中没有表 {table}")
+            failures += 1
+            continue
+
+        row = rows[0]
+        used = set(filter(None, (row.get("key") or "").split(",")))
+        possible = set(filter(None, (row.get("possible_keys") or "").split(",")))
+        if used & expected:
+            print(f"[通过] {desc}: 使用索引 {row['key']}")
+        elif possible & expected:
+            # 表数据很少时优化器可能选择全表扫描，索引存在即可
+            print(f"[警告] {desc}: 可用索引 {', '.join(sorted(possible & expected))}，"
+                  f"但当前执行计划为 type={row.get('type')} key={row.get('key')}（数据量较小时属正常）")
+        else:
+            print(f"[失败] {desc}: 期望索引 {', '.join(sorted(expected))}，"
+                  f"实际 type={row.get('type')} key={row.get('key')} possible_keys={row.get('possible_keys')}")
+            failures += 1
+
+    if failures:
+        print(f"{failures} 条热点查询未命中预期索引，请执行 python sql/migrate.py upgrade")
+        return 1
+    print("所有热点查询均可使用预期索引")
+    return 0
+
+
+def cmd_reconcile(conn):
+    try:
+        result = reconcile_leave_counters(conn)
+    except Exception as e:
+        print(f"重建汇总表失败: {e}")
+        return 1
+    for table, drift in result.items():
+        if not drift:
+            print(f"{table} 与 student_leave 一致")
+            continue
+        for key, old, new in drift:
+            print(f"  {table} {' '.join(key)}: {old} -> {new}")
+        print(f"{table} 已重建，修正 {len(drift)} 项偏差")
+
+    try:
+        changes = reconcile_leave_artifacts(conn.cursor())
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"修正 leave_artifacts 失败: {e}")
+        return 1
+    for action, leave_id, kind, filename in changes:
+        print(f"  leave_artifacts {action} {kind} {leave_id}: {filename}")
+    print(f"leave_artifacts 修正 {len(changes)} 项" if changes else "leave_artifacts 与磁盘文件一致")
+
+    try:
+        changes = reconcile_chat_contacts(conn)
+    except Exception as e:
+        print(f"重建 chat_contacts 失败: {e}")
+        return 1
+    for action, owner_id, contact_id in changes:
+        print(f"  chat_contacts {action} {owner_id} -> {contact_id}")
+    print(f"chat_contacts 已重建，修正 {len(changes)} 项" if changes else "chat_contacts 与选课/授课/负责年级一致")
+
+    try:
+        drift = reconcile_conversation_state(conn)
+    except Exception as e:
+        print(f"重建 chat_conversation_state 失败: {e}")
+        return 1
+    for owner_id, peer_id, old, new in drift:
+        print(f"  chat_conversation_state {owner_id} <- {peer_id} 未读: {old} -> {new}")
+    print(f"chat_conversation_state 已重建，修正 {len(drift)} 项未读数" if drift
+          else "chat_conversation_state 与 chat_messages 一致")
+    return 0
+
+
+def cmd_archive(conn):
+    try:
+        moved = archive_old_messages(conn)
+    except Exception as e:
+        print(f"归档聊天记录失败: {e}")
+        return 1
+    for semester, count in sorted(moved.items()):
+        print(f"  {semester}: {count} 条")
+    print(f"已归档 {sum(moved.values())} 条聊天记录" if moved else "没有需要归档的聊天记录（或其他进程正在归档）")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="数据库迁移工具")
+    parser.add_argument("command", choices=["status", "upgrade", "check", "reconcile", "archive"],
+                        help="status / upgrade / check / reconcile / archive")
+    args = parser.parse_args(argv)
+
+    commands = {"status": cmd_status, "upgrade": cmd_upgrade, "check": cmd_check, "reconcile": cmd_reconcile,
+                "archive": cmd_archive}
+    try:
+        conn = get_connection()
+    except Exception as e:
+        print(f"数据库连接失败: {e}")
+        return 1
+    try:
+        return commands[args.command](conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
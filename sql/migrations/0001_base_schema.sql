@@ -0,0 +1,135 @@
+-- 基础表结构：与 app.py 中的查询保持一致；已存在的表不受影响（CREATE TABLE IF NOT EXISTS）
+CREATE TABLE IF NOT EXISTS admin_info (
+    admin_id VARCHAR(4) NOT NULL PRIMARY KEY COMMENT '管理员账号（4位）',
+    admin_name VARCHAR(50) NOT NULL COMMENT '姓名',
+    admin_password VARCHAR(100) NOT NULL COMMENT '密码',
+    admin_dept VARCHAR(100) COMMENT '部门',
+    admin_avatar VARCHAR(255) COMMENT '头像文件名',
+    admin_create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    admin_update_time DATETIME COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='管理员信息表';
+
+CREATE TABLE IF NOT EXISTS counselor_info (
+    counselor_id VARCHAR(8) NOT NULL PRIMARY KEY COMMENT '辅导员工号（8位）',
+    counselor_name VARCHAR(50) NOT NULL COMMENT '姓名',
+    counselor_password VARCHAR(100) NOT NULL COMMENT '密码',
+    counselor_dept VARCHAR(100) COMMENT '部门',
+    responsible_grade VARCHAR(10) COMMENT '负责年级',
+    responsible_major VARCHAR(100) COMMENT '负责专业',
+    counselor_contact VARCHAR(50) COMMENT '联系方式',
+    counselor_avatar VARCHAR(255) COMMENT '头像文件名',
+    counselor_create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    counselor_update_time DATETIME COMMENT '更新时间',
+    update_time DATETIME COMMENT '联系方式更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='辅导员信息表';
+
+CREATE TABLE IF NOT EXISTS teacher_info (
+    teacher_id VARCHAR(9) NOT NULL PRIMARY KEY COMMENT '教师工号（9位）',
+    teacher_name VARCHAR(50) NOT NULL COMMENT '姓名',
+    teacher_password VARCHAR(100) NOT NULL COMMENT '密码',
+    teacher_dept VARCHAR(100) COMMENT '部门',
+    teacher_contact VARCHAR(50) COMMENT '联系方式',
+    teacher_avatar VARCHAR(255) COMMENT '头像文件名',
+    teacher_create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    teacher_update_time DATETIME COMMENT '更新时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='教师信息表';
+
+CREATE TABLE IF NOT EXISTS student_info (
+    student_id VARCHAR(12) NOT NULL PRIMARY KEY COMMENT '学号（12位，前4位为入学年份）',
+    student_name VARCHAR(50) NOT NULL COMMENT '姓名',
+    student_password VARCHAR(100) NOT NULL COMMENT '密码',
+    dept_name VARCHAR(100) COMMENT '学院',
+    student_dept_id INT COMMENT '学院代码',
+    student_grade VARCHAR(10) COMMENT '年级（如2024级）',
+    major VARCHAR(100) COMMENT '专业',
+    major_code VARCHAR(4) COMMENT '专业代码',
+    class_num VARCHAR(4) COMMENT '班级',
+    student_contact VARCHAR(50) COMMENT '联系方式',
+    student_avatar VARCHAR(255) COMMENT '头像文件名',
+    student_create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    student_update_time DATETIME COMMENT '更新时间',
+    times INT NOT NULL DEFAULT 0 COMMENT '已批准请假次数'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='学生信息表';
+
+CREATE TABLE IF NOT EXISTS course_info (
+    course_id VARCHAR(20) NOT NULL PRIMARY KEY COMMENT '课程ID',
+    course_name VARCHAR(100) NOT NULL COMMENT '课程名称'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='课程信息表';
+
+CREATE TABLE IF NOT EXISTS student_course (
+    student_id VARCHAR(12) NOT NULL COMMENT '学号',
+    course_id VARCHAR(20) NOT NULL COMMENT '课程ID',
+    PRIMARY KEY (student_id, course_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='学生选课表';
+
+CREATE TABLE IF NOT EXISTS teacher_course (
+    teacher_id VARCHAR(9) NOT NULL COMMENT '教师工号',
+    course_id VARCHAR(20) NOT NULL COMMENT '课程ID',
+    PRIMARY KEY (teacher_id, course_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='教师授课表';
+
+CREATE TABLE IF NOT EXISTS student_leave (
+    leave_id INT AUTO_INCREMENT PRIMARY KEY COMMENT '请假ID',
+    leave_student_id VARCHAR(12) NOT NULL COMMENT '学号',
+    leave_student_name VARCHAR(50) COMMENT '学生姓名',
+    leave_dept VARCHAR(100) COMMENT '学院',
+    leave_course_id VARCHAR(255) COMMENT '课程ID（多个以逗号分隔）',
+    leave_teacher_id VARCHAR(255) COMMENT '教师工号（多个以逗号分隔）',
+    leave_reason TEXT COMMENT '请假原因',
+    leave_start_time DATETIME NOT NULL COMMENT '开始时间',
+    leave_end_time DATETIME NOT NULL COMMENT '结束时间',
+    approval_status VARCHAR(10) NOT NULL DEFAULT '待审批' COMMENT '审批状态：待审批/已批准/已驳回',
+    leave_times INT COMMENT '第几次请假',
+    sort VARCHAR(20) COMMENT '请假类型',
+    attachment VARCHAR(255) COMMENT '佐证文件名',
+    approver_id VARCHAR(20) COMMENT '审批人工号',
+    approver_name VARCHAR(50) COMMENT '审批人姓名',
+    approval_time DATETIME COMMENT '审批时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='学生请假表';
+
+CREATE TABLE IF NOT EXISTS teacher_leave (
+    leave_id VARCHAR(20) NOT NULL PRIMARY KEY COMMENT '请假单号（年月日+序号）',
+    teacher_id VARCHAR(9) NOT NULL COMMENT '教师工号',
+    dept VARCHAR(100) COMMENT '部门',
+    course_id VARCHAR(20) COMMENT '课程ID',
+    leave_reason TEXT COMMENT '请假原因',
+    start_time DATETIME NOT NULL COMMENT '开始时间',
+    end_time DATETIME NOT NULL COMMENT '结束时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='教师请假表';
+
+CREATE TABLE IF NOT EXISTS teacher_notifications (
+    leave_id VARCHAR(20) NOT NULL PRIMARY KEY COMMENT '通知ID',
+    teacher_id VARCHAR(9) NOT NULL COMMENT '教师工号',
+    course_id VARCHAR(20) COMMENT '课程ID',
+    reason TEXT COMMENT '通知内容',
+    priority VARCHAR(10) COMMENT '优先级',
+    start_time DATETIME COMMENT '通知时间'
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='教师课程通知表（旧）';
+
+CREATE TABLE IF NOT EXISTS teacher_notice (
+    id INT AUTO_INCREMENT PRIMARY KEY COMMENT '通知ID',
+    teacher_id VARCHAR(9) NOT NULL COMMENT '教师工号',
+    course_id VARCHAR(20) COMMENT '课程ID',
+    content TEXT COMMENT '通知内容',
+    create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+    INDEX idx_teacher (teacher_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='教师课程通知表';
+
+CREATE TABLE IF NOT EXISTS admin_operation_logs (
+    log_id INT AUTO_INCREMENT PRIMARY KEY COMMENT '日志ID',
+    admin_account VARCHAR(50) NOT NULL COMMENT '操作管理员账号',
+    admin_name VARCHAR(100) COMMENT '操作管理员姓名',
+    operation_type VARCHAR(20) NOT NULL COMMENT '操作类型：ADD/UPDATE/DELETE/VIEW',
+    target_user_account VARCHAR(50) COMMENT '目标用户账号',
+    target_user_name VARCHAR(100) COMMENT '目标用户姓名',
+    target_user_role VARCHAR(20) COMMENT '目标用户角色：student/counselor/teacher/admin',
+    operation_details TEXT COMMENT '操作详情JSON',
+    operation_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '操作时间',
+    ip_address VARCHAR(50) COMMENT 'IP地址',
+    status VARCHAR(20) DEFAULT 'SUCCESS' COMMENT '操作状态：SUCCESS/FAILED',
+    error_message TEXT COMMENT '错误信息（如果失败）',
+    INDEX idx_admin_account (admin_account),
+    INDEX idx_operation_time (operation_time),
+    INDEX idx_operation_type (operation_type),
+    INDEX idx_target_user (target_user_account)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='管理员操作日志表';
@@ -0,0 +1,59 @@
+"""
+聊天消息表：按 app.py 使用的字段建表
+
+旧版 create_chat_table.py 建出的表字段为 id / sender_type / created_at，
+与 app.py 查询的 message_id / sender_role / create_time / is_read 不一致，此处就地转换。
+"""
+
+ROLE_NAMES = {"student": "学生", "counselor": "辅导员", "teacher": "讲师", "admin": "管理员"}
+
+
+def upgrade(cursor, schema):
+    if not schema.table_exists("chat_messages"):
+        cursor.execute("""
+            CREATE TABLE chat_messages (
+                message_id INT AUTO_INCREMENT PRIMARY KEY COMMENT '消息ID',
+                sender_id VARCHAR(20) NOT NULL COMMENT '发送者账号',
+                sender_name VARCHAR(50) COMMENT '发送者姓名',
+                sender_role VARCHAR(10) NOT NULL COMMENT '发送者角色：学生/辅导员/讲师',
+                receiver_id VARCHAR(20) NOT NULL COMMENT '接收者账号',
+                receiver_name VARCHAR(50) COMMENT '接收者姓名',
+                receiver_role VARCHAR(10) COMMENT '接收者角色',
+                content TEXT NOT NULL COMMENT '消息内容',
+                is_read TINYINT NOT NULL DEFAULT 0 COMMENT '是否已读',
+                create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '发送时间'
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='聊天消息表'
+        """)
+    else:
+        _convert_legacy(cursor, schema)
+
+    # 会话查询：WHERE (sender_id=? AND receiver_id=?) OR (...) ORDER BY create_time
+    schema.add_index("chat_messages", "idx_sender_receiver_time", "sender_id, receiver_id, create_time")
+    # 标记已读 / 未读数：WHERE receiver_id=? AND is_read=0
+    schema.add_index("chat_messages", "idx_receiver_read", "receiver_id, is_read")
+
+
+def _convert_legacy(cursor, schema):
+    if schema.column_exists("chat_messages", "id") and not schema.column_exists("chat_messages", "message_id"):
+        cursor.execute("ALTER TABLE chat_messages CHANGE COLUMN id message_id INT NOT NULL AUTO_INCREMENT COMMENT '消息ID'")
+    if schema.column_exists("chat_messages", "created_at") and not schema.column_exists("chat_messages", "create_time"):
+        cursor.execute("ALTER TABLE chat_messages CHANGE COLUMN created_at create_time DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '发送时间'")
+    if schema.column_exists("chat_messages", "sender_type") and not schema.column_exists("chat_messages", "sender_role"):
+        cursor.execute("ALTER TABLE chat_messages CHANGE COLUMN sender_type sender_role VARCHAR(10) NOT NULL COMMENT '发送者角色：学生/辅导员/讲师'")
+        for old, new in ROLE_NAMES.items():
+            cursor.execute("UPDATE chat_messages SET sender_role = %s WHERE sender_role = %s", (new, old))
+
+    columns = [
+        ("sender_name", "VARCHAR(50) COMMENT '发送者姓名' AFTER sender_id"),
+        ("receiver_name", "VARCHAR(50) COMMENT '接收者姓名' AFTER receiver_id"),
+        ("receiver_role", "VARCHAR(10) COMMENT '接收者角色' AFTER receiver_name"),
+        ("is_read", "TINYINT NOT NULL DEFAULT 0 COMMENT '是否已读' AFTER content"),
+    ]
+    for name, definition in columns:
+        if not schema.column_exists("chat_messages", name):
+            cursor.execute(f"ALTER TABLE chat_messages ADD COLUMN {name} {definition}")
+
+    # 旧索引被新的复合索引覆盖
+    for index_name in ("idx_sender_receiver", "idx_created_at"):
+        if schema.index_exists("chat_messages", index_name):
+            cursor.execute(f"ALTER TABLE chat_messages DROP INDEX {index_name}")
@@ -0,0 +1,22 @@
+"""
+为 student_leave / student_info 增加按学号前4位生成的年级列，替代 LEFT(student_id, 4) 过滤
+
+STORED 生成列在 ALTER 时会为已有数据逐行计算（即完成回填），之后随 INSERT/UPDATE 自动维护；需 MySQL 5.7+
+"""
+
+
+def upgrade(cursor, schema):
+    if not schema.column_exists("student_leave", "grade"):
+        cursor.execute("""
+            ALTER TABLE student_leave
+                ADD COLUMN grade CHAR(4) AS (LEFT(leave_student_id, 4)) STORED COMMENT '年级（学号前4位）'
+        """)
+    schema.add_index("student_leave", "idx_grade_status_start", "grade, approval_status, leave_start_time")
+    schema.add_index("student_leave", "idx_grade_start", "grade, leave_start_time")
+
+    if not schema.column_exists("student_info", "grade"):
+        cursor.execute("""
+            ALTER TABLE student_info
+                ADD COLUMN grade CHAR(4) AS (LEFT(student_id, 4)) STORED COMMENT '年级（学号前4位）'
+        """)
+    schema.add_index("student_info", "idx_grade_student", "grade, student_id")
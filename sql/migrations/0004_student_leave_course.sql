@@ -0,0 +1,24 @@
+-- 请假-课程-教师关联表：拆分 student_leave.leave_course_id / leave_teacher_id 中逗号拼接的多值，
+-- 教师端按 teacher_id 走索引查询，替代 FIND_IN_SET 全表扫描
+CREATE TABLE IF NOT EXISTS student_leave_course (
+    leave_id INT NOT NULL COMMENT '请假ID（student_leave.leave_id）',
+    course_id VARCHAR(20) NOT NULL COMMENT '课程ID',
+    teacher_id VARCHAR(20) NOT NULL DEFAULT '' COMMENT '该课程对应的教师工号',
+    PRIMARY KEY (leave_id, course_id, teacher_id),
+    INDEX idx_teacher_leave (teacher_id, leave_id),
+    INDEX idx_course_leave (course_id, leave_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='请假课程教师关联表';
+
+-- 回填已有请假记录：按位置把第 n 个课程与第 n 个教师配对（单条请假最多 20 门课程）
+INSERT IGNORE INTO student_leave_course (leave_id, course_id, teacher_id)
+SELECT sl.leave_id,
+       TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(sl.leave_course_id, ',', seq.n), ',', -1)),
+       COALESCE(TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(sl.leave_teacher_id, ',', seq.n), ',', -1)), '')
+FROM student_leave sl
+JOIN (
+    SELECT 1 AS n UNION ALL SELECT 2 UNION ALL SELECT 3 UNION ALL SELECT 4 UNION ALL SELECT 5
+    UNION ALL SELECT 6 UNION ALL SELECT 7 UNION ALL SELECT 8 UNION ALL SELECT 9 UNION ALL SELECT 10
+    UNION ALL SELECT 11 UNION ALL SELECT 12 UNION ALL SELECT 13 UNION ALL SELECT 14 UNION ALL SELECT 15
+    UNION ALL SELECT 16 UNION ALL SELECT 17 UNION ALL SELECT 18 UNION ALL SELECT 19 UNION ALL SELECT 20
+) seq ON seq.n <= 1 + LENGTH(sl.leave_course_id) - LENGTH(REPLACE(sl.leave_course_id, ',', ''))
+WHERE sl.leave_course_id IS NOT NULL AND sl.leave_course_id <> '';
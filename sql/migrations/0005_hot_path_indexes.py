@@ -0,0 +1,23 @@
+"""
+热点查询索引（与 migrate.py check 中的 HOT_QUERIES 对应）
+"""
+
+INDEXES = [
+    # 学生请假记录：WHERE leave_student_id=? ORDER BY leave_start_time DESC
+    ("student_leave", "idx_student_start", "leave_student_id, leave_start_time"),
+    # 审批记录：WHERE approver_id=? ORDER BY approval_time DESC
+    ("student_leave", "idx_approver_time", "approver_id, approval_time"),
+    # 课程 -> 教师 / 课程 -> 学生（主键分别以 teacher_id / student_id 开头，反向查找需要单独索引）
+    ("teacher_course", "idx_course_teacher", "course_id, teacher_id"),
+    ("student_course", "idx_course_student", "course_id, student_id"),
+    # 学生端课程通知 / 教师请假：经 student_course 按 course_id 关联，按时间排序
+    ("teacher_notifications", "idx_course_start", "course_id, start_time"),
+    ("teacher_leave", "idx_course_start", "course_id, start_time"),
+    # 按负责年级查找辅导员
+    ("counselor_info", "idx_responsible_grade", "responsible_grade"),
+]
+
+
+def upgrade(cursor, schema):
+    for table, index_name, columns in INDEXES:
+        schema.add_index(table, index_name, columns)
@@ -0,0 +1,7 @@
+"""
+聊天记录按 message_id 游标增量拉取：WHERE (sender_id=? AND receiver_id=?) OR (...) AND message_id > ? ORDER BY message_id
+"""
+
+
+def upgrade(cursor, schema):
+    schema.add_index("chat_messages", "idx_sender_receiver_msg", "sender_id, receiver_id, message_id")
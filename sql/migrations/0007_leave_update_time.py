@@ -0,0 +1,20 @@
+"""
+student_leave 增加由数据库自动维护的 update_time，用于列表接口的 ETag / Last-Modified：
+版本号 = 符合条件的记录数 + MAX(update_time)，按学生或年级走索引计算
+"""
+
+
+def upgrade(cursor, schema):
+    if not schema.column_exists("student_leave", "update_time"):
+        # 毫秒精度，避免同一秒内的两次审批得到相同版本号；已有数据取提交/审批时间作为初值
+        cursor.execute("""
+            ALTER TABLE student_leave
+                ADD COLUMN update_time DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3)
+                    ON UPDATE CURRENT_TIMESTAMP(3) COMMENT '最后更新时间'
+        """)
+        cursor.execute("""
+            UPDATE student_leave
+            SET update_time = COALESCE(approval_time, leave_start_time)
+        """)
+    schema.add_index("student_leave", "idx_student_update", "leave_student_id, update_time")
+    schema.add_index("student_leave", "idx_grade_update", "grade, update_time")
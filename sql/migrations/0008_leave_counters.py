@@ -0,0 +1,22 @@
+"""
+按年级、审批状态物化的请假数量表 leave_counters，由写请假的事务同步维护（见 leave_counters.py），
+辅导员角标按主键读取；建表时按 student_leave 回填
+"""
+
+
+def upgrade(cursor, schema):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leave_counters (
+            grade CHAR(4) NOT NULL COMMENT '年级（学号前4位）',
+            approval_status VARCHAR(20) NOT NULL COMMENT '审批状态',
+            count INT NOT NULL DEFAULT 0 COMMENT '请假条数',
+            PRIMARY KEY (grade, approval_status)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='按年级的请假数量'
+    """)
+    cursor.execute("""
+        INSERT INTO leave_counters (grade, approval_status, count)
+        SELECT grade, approval_status, COUNT(*)
+        FROM student_leave
+        GROUP BY grade, approval_status
+        ON DUPLICATE KEY UPDATE count = VALUES(count)
+    """)
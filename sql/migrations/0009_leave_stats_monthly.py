@@ -0,0 +1,28 @@
+"""
+统计页月度汇总表 leave_stats_monthly：按年级、开始月份、请假类型、审批状态汇总请假条数与天数，
+由写请假的事务同步维护（见 leave_counters.py），统计接口只读最近 12 个月；建表时按 student_leave 回填
+"""
+
+
+def upgrade(cursor, schema):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leave_stats_monthly (
+            grade CHAR(4) NOT NULL COMMENT '年级（学号前4位）',
+            month CHAR(7) NOT NULL COMMENT '请假开始月份 YYYY-MM',
+            sort VARCHAR(20) NOT NULL COMMENT '请假类型（未填为“其他”）',
+            approval_status VARCHAR(20) NOT NULL COMMENT '审批状态',
+            leave_count INT NOT NULL DEFAULT 0 COMMENT '请假条数',
+            leave_days INT NOT NULL DEFAULT 0 COMMENT '请假天数合计',
+            PRIMARY KEY (grade, month, sort, approval_status),
+            KEY idx_month (month)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='请假月度汇总'
+    """)
+    cursor.execute("""
+        INSERT INTO leave_stats_monthly (grade, month, sort, approval_status, leave_count, leave_days)
+        SELECT grade, DATE_FORMAT(leave_start_time, '%Y-%m'), COALESCE(NULLIF(sort, ''), '其他'),
+               approval_status, COUNT(*),
+               SUM(GREATEST(TIMESTAMPDIFF(DAY, leave_start_time, leave_end_time) + 1, 0))
+        FROM student_leave
+        GROUP BY 1, 2, 3, 4
+        ON DUPLICATE KEY UPDATE leave_count = VALUES(leave_count), leave_days = VALUES(leave_days)
+    """)
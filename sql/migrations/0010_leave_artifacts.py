@@ -0,0 +1,83 @@
+"""
+假条签名/佐证文件登记表 leave_artifacts：写文件时同步登记文件名、大小与 SHA-256（见 leave_artifacts.py），
+详情/列表接口据此生成 URL，不再访问文件系统；建表后按磁盘上已有的文件回填
+（回填规则固定在本迁移中，不引用 leave_artifacts.py，之后修改该模块不影响本迁移）
+"""
+import hashlib
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'data')
+
+
+def _scan(folder):
+    """[(文件名, 完整路径, 账号, 假条ID)]，文件名为 <账号>_<假条ID>.<扩展名>"""
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return []
+    result = []
+    for name in names:
+        owner_id, _, leave_id = os.path.splitext(name)[0].rpartition('_')
+        path = os.path.join(folder, name)
+        if owner_id and leave_id.isdigit() and os.path.isfile(path):
+            result.append((name, path, owner_id, int(leave_id)))
+    return result
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def upgrade(cursor, schema):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leave_artifacts (
+            leave_id INT NOT NULL COMMENT '假条ID',
+            kind VARCHAR(20) NOT NULL COMMENT '类别：student_signature/counselor_signature/attachment',
+            owner_id VARCHAR(20) NOT NULL COMMENT '签名人/上传人账号',
+            file_name VARCHAR(255) NOT NULL COMMENT '文件名',
+            file_size INT NOT NULL COMMENT '文件大小（字节）',
+            content_hash CHAR(64) NOT NULL COMMENT '文件内容 SHA-256',
+            create_time DATETIME DEFAULT CURRENT_TIMESTAMP COMMENT '登记时间',
+            update_time DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+            PRIMARY KEY (leave_id, kind, owner_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='假条签名与佐证文件'
+    """)
+
+    # 签名：签名人为请假学生本人时是学生签名，否则是辅导员签名；佐证只登记请假学生本人上传的
+    signatures = _scan(os.path.join(DATA_DIR, 'signatures'))
+    attachments = _scan(os.path.join(DATA_DIR, 'certificates'))
+    leave_ids = sorted({item[3] for item in signatures + attachments})
+    if not leave_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(leave_ids))
+    cursor.execute(f"SELECT leave_id, leave_student_id FROM student_leave WHERE leave_id IN ({placeholders})",
+                   leave_ids)
+    students = {int(row[0]): str(row[1]) for row in cursor.fetchall()}
+
+    # 同一假条、类别、账号有多个文件（如不同扩展名）时取最近修改的
+    found = {}
+    for items, is_signature in ((signatures, True), (attachments, False)):
+        for name, path, owner_id, leave_id in items:
+            student_id = students.get(leave_id)
+            if student_id is None or (not is_signature and owner_id != student_id):
+                continue
+            if is_signature:
+                kind = "student_signature" if owner_id == student_id else "counselor_signature"
+            else:
+                kind = "attachment"
+            key = (leave_id, kind, owner_id)
+            if key not in found or os.path.getmtime(path) > os.path.getmtime(found[key][1]):
+                found[key] = (name, path)
+
+    for (leave_id, kind, owner_id), (name, path) in sorted(found.items()):
+        cursor.execute("""
+            INSERT INTO leave_artifacts (leave_id, kind, owner_id, file_name, file_size, content_hash)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE file_name = VALUES(file_name), file_size = VALUES(file_size),
+                                    content_hash = VALUES(content_hash)
+        """, (leave_id, kind, owner_id, name, os.path.getsize(path), _file_hash(path)))
+        print(f"  登记 {kind} {leave_id}: {name}")
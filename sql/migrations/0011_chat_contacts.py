@@ -0,0 +1,40 @@
+"""
+聊天联系人关系表 chat_contacts：辅导员/讲师与学生之间可聊天的关系，随选课、授课、负责年级与用户增删同步维护
+（见 chat_contacts.py），联系人列表按 owner_id 走主键读取；建表后全量生成
+（生成规则固定在本迁移中，不引用 chat_contacts.py）
+"""
+_COUNSELOR_STUDENT = """
+    FROM counselor_info co
+    JOIN student_info si ON si.grade = TRIM(co.responsible_grade)
+"""
+_TEACHER_STUDENT = """
+    FROM teacher_course tc
+    JOIN teacher_info ti ON ti.teacher_id = tc.teacher_id
+    JOIN student_course sc ON sc.course_id = tc.course_id
+    JOIN student_info si ON si.student_id = sc.student_id
+    LEFT JOIN course_info ci ON ci.course_id = tc.course_id
+"""
+_COURSES = "GROUP_CONCAT(DISTINCT ci.course_name ORDER BY ci.course_name SEPARATOR ', ')"
+
+# 辅导员 <-> 本年级学生，讲师 <-> 选修其课程的学生（两个方向各一条关系）
+_BACKFILL = [
+    f"SELECT co.counselor_id, si.student_id, '学生', NULL {_COUNSELOR_STUDENT}",
+    f"SELECT si.student_id, co.counselor_id, '辅导员', NULL {_COUNSELOR_STUDENT}",
+    f"SELECT tc.teacher_id, si.student_id, '学生', {_COURSES} {_TEACHER_STUDENT} GROUP BY tc.teacher_id, si.student_id",
+    f"SELECT si.student_id, tc.teacher_id, '讲师', {_COURSES} {_TEACHER_STUDENT} GROUP BY si.student_id, tc.teacher_id",
+]
+
+
+def upgrade(cursor, schema):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_contacts (
+            owner_id VARCHAR(20) NOT NULL COMMENT '联系人列表所属账号',
+            contact_id VARCHAR(20) NOT NULL COMMENT '联系人账号',
+            contact_role VARCHAR(10) NOT NULL COMMENT '联系人角色：学生/辅导员/讲师',
+            courses VARCHAR(1000) DEFAULT NULL COMMENT '讲师与学生的共同课程名（逗号分隔）',
+            PRIMARY KEY (owner_id, contact_id),
+            KEY idx_contact (contact_id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='聊天联系人关系'
+    """)
+    for select_sql in _BACKFILL:
+        cursor.execute(f"INSERT IGNORE INTO chat_contacts (owner_id, contact_id, contact_role, courses) {select_sql}")
@@ -0,0 +1,39 @@
+"""
+聊天会话状态表 chat_conversation_state：每个用户与每个聊天对象的未读数与最后一条消息（见 chat_state.py），
+联系人列表据此显示未读角标、最新消息并按最近聊天排序；建表后按 chat_messages 全量生成
+（生成规则固定在本迁移中，不引用 chat_state.py）
+"""
+
+
+def upgrade(cursor, schema):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_conversation_state (
+            owner_id VARCHAR(20) NOT NULL COMMENT '会话所属账号',
+            peer_id VARCHAR(20) NOT NULL COMMENT '聊天对象账号',
+            unread_count INT NOT NULL DEFAULT 0 COMMENT '对方发来的未读消息数',
+            last_message_id INT NOT NULL COMMENT '最后一条消息ID',
+            last_message_preview VARCHAR(100) NOT NULL DEFAULT '' COMMENT '最后一条消息预览',
+            last_time DATETIME NOT NULL COMMENT '最后一条消息时间',
+            PRIMARY KEY (owner_id, peer_id),
+            KEY idx_owner_time (owner_id, last_time)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='聊天会话状态（未读数与最后一条消息）'
+    """)
+    # 每个会话两行（双方各一行）：最后一条消息取双方往来中最大的 message_id，未读数按 chat_messages.is_read 统计
+    cursor.execute("DELETE FROM chat_conversation_state")
+    cursor.execute("""
+        INSERT INTO chat_conversation_state
+            (owner_id, peer_id, unread_count, last_message_id, last_message_preview, last_time)
+        SELECT t.owner_id, t.peer_id, t.unread_count, m.message_id, LEFT(m.content, 100), m.create_time
+        FROM (
+            SELECT owner_id, peer_id, SUM(unread) AS unread_count, MAX(message_id) AS last_message_id
+            FROM (
+                SELECT sender_id AS owner_id, receiver_id AS peer_id, message_id, 0 AS unread
+                FROM chat_messages
+                UNION ALL
+                SELECT receiver_id, sender_id, message_id, is_read = 0
+                FROM chat_messages
+            ) AS sides
+            GROUP BY owner_id, peer_id
+        ) AS t
+        JOIN chat_messages m ON m.message_id = t.last_message_id
+    """)
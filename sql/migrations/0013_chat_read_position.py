@@ -0,0 +1,33 @@
+"""
+聊天已读改为按会话记录已读位置：chat_conversation_state 增加 last_read_message_id（已读到的对方消息ID），
+已读回执在内存中合并后批量写入（见 chat_state.ReadReceipts），未读数 = 对方发来的 message_id > 已读位置的消息数，
+拉取聊天记录不再 UPDATE chat_messages.is_read。已有会话按 is_read 生成初始已读位置并重算未读数
+（回填规则固定在本迁移中，不引用 chat_state.py）
+"""
+
+
+def upgrade(cursor, schema):
+    if not schema.column_exists("chat_conversation_state", "last_read_message_id"):
+        cursor.execute("""
+            ALTER TABLE chat_conversation_state
+                ADD COLUMN last_read_message_id INT NOT NULL DEFAULT 0 COMMENT '已读到的对方消息ID'
+        """)
+        # 初始已读位置：对方发来的、is_read 已标记的最大 message_id
+        cursor.execute("""
+            UPDATE chat_conversation_state cs
+            JOIN (
+                SELECT receiver_id AS owner_id, sender_id AS peer_id, MAX(message_id) AS read_id
+                FROM chat_messages
+                WHERE is_read = 1
+                GROUP BY receiver_id, sender_id
+            ) r ON r.owner_id = cs.owner_id AND r.peer_id = cs.peer_id
+            SET cs.last_read_message_id = r.read_id
+        """)
+        cursor.execute("""
+            UPDATE chat_conversation_state cs
+            SET cs.unread_count = (
+                SELECT COUNT(*) FROM chat_messages m
+                WHERE m.sender_id = cs.peer_id AND m.receiver_id = cs.owner_id
+                  AND m.message_id > cs.last_read_message_id
+            )
+        """)
@@ -0,0 +1,18 @@
+"""
+聊天记录分层存储：chat_archive_index 按会话登记各学期归档表（chat_messages_<学期>）中的消息范围，
+向上翻看历史翻过热表后按本表定位归档表（见 chat_archive.py）；学期归档表由归档任务按需创建
+"""
+
+
+def upgrade(cursor, schema):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chat_archive_index (
+            user_a VARCHAR(20) NOT NULL COMMENT '会话一方账号（较小的一个）',
+            user_b VARCHAR(20) NOT NULL COMMENT '会话另一方账号（较大的一个）',
+            semester VARCHAR(12) NOT NULL COMMENT '学期，如 2025_autumn，对应表 chat_messages_2025_autumn',
+            min_message_id INT NOT NULL COMMENT '该学期归档的最早消息ID',
+            max_message_id INT NOT NULL COMMENT '该学期归档的最晚消息ID',
+            message_count INT NOT NULL DEFAULT 0 COMMENT '该学期归档的消息数',
+            PRIMARY KEY (user_a, user_b, semester)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='聊天记录归档索引（按会话）'
+    """)
@@ -0,0 +1,28 @@
+"""
+统计页请假排行汇总表 leave_stats_student_monthly：按年级、开始月份、学生汇总请假条数与天数（不分状态），
+由新建请假的事务同步维护（见 leave_counters.py），排行只读统计窗口内的汇总行，不再 GROUP BY student_leave；
+建表时按 student_leave 回填
+"""
+
+
+def upgrade(cursor, schema):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS leave_stats_student_monthly (
+            grade CHAR(4) NOT NULL COMMENT '年级（学号前4位）',
+            month CHAR(7) NOT NULL COMMENT '请假开始月份 YYYY-MM',
+            student_id VARCHAR(20) NOT NULL COMMENT '学号',
+            student_name VARCHAR(50) COMMENT '学生姓名（最近一条请假记录中的）',
+            leave_count INT NOT NULL DEFAULT 0 COMMENT '请假条数',
+            leave_days INT NOT NULL DEFAULT 0 COMMENT '请假天数合计',
+            PRIMARY KEY (grade, month, student_id),
+            KEY idx_month (month)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='请假按学生月度汇总'
+    """)
+    cursor.execute("""
+        INSERT INTO leave_stats_student_monthly (grade, month, student_id, student_name, leave_count, leave_days)
+        SELECT grade, DATE_FORMAT(leave_start_time, '%Y-%m'), leave_student_id, MAX(leave_student_name), COUNT(*),
+               SUM(GREATEST(TIMESTAMPDIFF(DAY, leave_start_time, leave_end_time) + 1, 0))
+        FROM student_leave
+        GROUP BY 1, 2, 3
+        ON DUPLICATE KEY UPDATE leave_count = VALUES(leave_count), leave_days = VALUES(leave_days)
+    """)
@@ -3,10 +3,12 @@
 class CounselorApp {
   constructor() {
     // 全局变量
-    this.allLeaveRequests = [];
+    this.allLeaveRequests = [];   // 当前页的请假记录（筛选与分页由后端完成）
     this.currentFilter = 'all';
     this.currentPage = 1;
     this.pageSize = 10;
+    this.pageCursors = [''];      // 第 n 页对应的游标为 pageCursors[n-1]
+    this.totalCount = 0;
   }
 
   // 初始化应用
@@ -23,8 +25,9 @@ class CounselorApp {
     // 从URL获取初始筛选类型
     this.setInitialFilter();
     
-    // 加载请假数据
+    // 加载请假数据与统计
     await this.loadLeaveRequests();
+    this.loadDetailedStatistics();
   }
   
   // 设置初始筛选类型
@@ -161,23 +164,34 @@ class CounselorApp {
     }
   }
 
-  // 加载请假数据
+  // 加载当前页请假数据（状态、关键字、年级筛选与分页均交给后端）
   async loadLeaveRequests() {
     try {
-      const response = await fetch('/api/counselor/leave_requests');
+      const params = new URLSearchParams({ limit: this.pageSize });
+      if (this.currentFilter !== 'all') params.set('status', this.currentFilter);
+      const searchTerm = document.getElementById('searchInput')?.value.trim() || '';
+      if (searchTerm) params.set('keyword', searchTerm);
+      const selectedGrade = document.getElementById('gradeSelect')?.value || '';
+      if (selectedGrade) params.set('grade', selectedGrade);
+      const cursor = this.pageCursors[this.currentPage - 1];
+      if (cursor) params.set('cursor', cursor);
+      
+      const response = await fetch(`/api/counselor/leave_requests?${params.toString()}`);
       if (!response.ok) {
         throw new Error('网络响应异常');
       }
       const data = await response.json();
       
-      // 存储所有请假记录
       this.allLeaveRequests = data.data || [];
-      
-      // 更新统计数据
-      this.updateStatistics();
-      
-      // 更新年级选择
-      this.updateGradeSelect();
+      // 总数只在首页返回，翻页时沿用
+      const total = response.headers.get('X-Total-Count');
+      if (total !== null) {
+        this.totalCount = parseInt(total, 10) || 0;
+      }
+      this.pageCursors.length = this.currentPage;
+      if (data.next_cursor) {
+        this.pageCursors.push(data.next_cursor);
+      }
       
       // 渲染请假记录
       this.renderLeaveRequests();
@@ -196,11 +210,11 @@ class CounselorApp {
   }
 
   // 更新统计数据
-  updateStatistics() {
-    const pendingCount = this.allLeaveRequests.filter(req => req.approval_status === '待审批').length;
-    const approvedCount = this.allLeaveRequests.filter(req => req.approval_status === '已批准').length;
-    const rejectedCount = this.allLeaveRequests.filter(req => req.approval_status === '已驳回').length;
-    const totalCount = this.allLeaveRequests.length;
+  updateStatistics(statusData, total) {
+    const pendingCount = statusData['待审批'] || 0;
+    const approvedCount = statusData['已批准'] || 0;
+    const rejectedCount = statusData['已驳回'] || 0;
+    const totalCount = total || 0;
     
     if (document.getElementById('pendingCount')) {
       document.getElementById('pendingCount').textContent = pendingCount;
@@ -214,9 +228,6 @@ class CounselorApp {
     if (document.getElementById('totalCount')) {
       document.getElementById('totalCount').textContent = totalCount;
     }
-    
-    // 加载详细统计
-    this.loadDetailedStatistics();
   }
 
   // 加载详细统计数据并渲染图表
@@ -228,6 +239,10 @@ class CounselorApp {
       if (result.success) {
         const data = result.data;
         
+        // 更新状态计数与年级选择
+        this.updateStatistics(data.by_status || {}, data.total);
+        this.updateGradeSelect(Object.keys(data.by_grade || {}));
+        
         // 渲染状态饼图
         this.renderStatusChart(data.by_status || {});
         
@@ -356,12 +371,13 @@ class CounselorApp {
   }
 
   // 更新年级选择
-  updateGradeSelect() {
+  updateGradeSelect(gradeLabels) {
     const gradeSelect = document.getElementById('gradeSelect');
-    if (!gradeSelect) return;
+    if (!gradeSelect || gradeSelect.dataset.loaded) return;
+    gradeSelect.dataset.loaded = '1';
     
-    // 从请假记录中提取所有年级（学生ID前4位）
-    const grades = [...new Set(this.allLeaveRequests.map(req => req.student_id.substring(0, 4)))];
+    // 年级统计的键为 "2023级"，取前4位
+    const grades = gradeLabels.map(label => label.substring(0, 4));
     grades.sort();
     
     // 添加年级选项
@@ -376,7 +392,6 @@ class CounselorApp {
   // 筛选请假记录
   filterLeaveRequests(filterType) {
     this.currentFilter = filterType;
-    this.currentPage = 1;
     
     // 更新按钮样式
     const buttons = [
@@ -397,20 +412,25 @@ class CounselorApp {
       }
     });
     
-    // 渲染筛选后的请假记录
-    this.renderLeaveRequests();
+    // 重新加载筛选后的请假记录
+    this.reloadFromFirstPage();
   }
 
   // 搜索请假记录
   searchLeaveRequests() {
-    this.currentPage = 1;
-    this.renderLeaveRequests();
+    this.reloadFromFirstPage();
   }
 
   // 按年级筛选
   filterByGrade() {
+    this.reloadFromFirstPage();
+  }
+
+  // 筛选条件变化后回到第一页
+  reloadFromFirstPage() {
     this.currentPage = 1;
-    this.renderLeaveRequests();
+    this.pageCursors = [''];
+    this.loadLeaveRequests();
   }
 
   // 渲染请假记录
@@ -418,45 +438,13 @@ class CounselorApp {
     const container = document.getElementById('leaveListContainer');
     if (!container) return;
     
-    // 获取搜索关键词
-    const searchTerm = document.getElementById('searchInput')?.value.toLowerCase() || '';
-    const selectedGrade = document.getElementById('gradeSelect')?.value || '';
-    
-    // 应用筛选条件
-    let filteredRequests = [...this.allLeaveRequests];
-    
-    // 应用状态筛选
-    if (this.currentFilter !== 'all') {
-      filteredRequests = filteredRequests.filter(req => req.approval_status === this.currentFilter);
-    }
-    
-    // 应用搜索筛选
-    if (searchTerm) {
-      filteredRequests = filteredRequests.filter(req => 
-        req.student_name.toLowerCase().includes(searchTerm) || 
-        req.student_id.includes(searchTerm)
-      );
-    }
-    
-    // 应用年级筛选
-    if (selectedGrade) {
-      filteredRequests = filteredRequests.filter(req => 
-        req.student_id.startsWith(selectedGrade)
-      );
-    }
-    
-    // 按开始时间倒序排序
-    filteredRequests.sort((a, b) => new Date(b.start_time) - new Date(a.start_time));
-    
-    // 计算分页
-    const totalPages = Math.ceil(filteredRequests.length / this.pageSize);
-    const startIndex = (this.currentPage - 1) * this.pageSize;
-    const endIndex = startIndex + this.pageSize;
-    const currentRequests = filteredRequests.slice(startIndex, endIndex);
+    // 当前页数据已由后端筛选并按开始时间倒序排列
+    const currentRequests = this.allLeaveRequests;
+    const totalPages = Math.max(Math.ceil(this.totalCount / this.pageSize), this.pageCursors.length);
     
     // 更新记录数量显示
     if (document.getElementById('recordCount')) {
-      document.getElementById('recordCount').textContent = `${filteredRequests.length}条记录`;
+      document.getElementById('recordCount').textContent = `${this.totalCount}条记录`;
     }
     
     // 更新分页按钮状态
@@ -646,37 +634,15 @@ class CounselorApp {
   goToPrevPage() {
     if (this.currentPage > 1) {
       this.currentPage--;
-      this.renderLeaveRequests();
+      this.loadLeaveRequests();
     }
   }
 
-  // 下一页
+  // 下一页（仅当上一次加载返回了 next_cursor 时可用）
   goToNextPage() {
-    const searchTerm = document.getElementById('searchInput')?.value.toLowerCase() || '';
-    const selectedGrade = document.getElementById('gradeSelect')?.value || '';
-    
-    // 获取当前筛选条件下的记录数
-    let filteredRequests = [...this.allLeaveRequests];
-    if (this.currentFilter !== 'all') {
-      filteredRequests = filteredRequests.filter(req => req.approval_status === this.currentFilter);
-    }
-    if (searchTerm) {
-      filteredRequests = filteredRequests.filter(req => 
-        req.student_name.toLowerCase().includes(searchTerm) || 
-        req.student_id.includes(searchTerm)
-      );
-    }
-    if (selectedGrade) {
-      filteredRequests = filteredRequests.filter(req => 
-        req.student_id.startsWith(selectedGrade)
-      );
-    }
-    
-    const totalPages = Math.ceil(filteredRequests.length / this.pageSize);
-    
-    if (this.currentPage < totalPages) {
+    if (this.currentPage < this.pageCursors.length) {
       this.currentPage++;
-      this.renderLeaveRequests();
+      this.loadLeaveRequests();
     }
   }
 
@@ -847,9 +813,9 @@ function showLeaveDetail(request) {
         </div>
         <div class="bg-gray-50 rounded-xl p-4"><p class="text-xs text-gray-400 mb-1"><i class="fa-solid fa-calendar-days mr-1"></i>请假时间</p><p class="font-semibold text-gray-800">${formatDate(request.start_time)} 至 ${formatDate(request.end_time)}</p><p class="text-sm text-primary mt-1">共 ${days} 天</p></div>
         <div class="bg-gray-50 rounded-xl p-4"><p class="text-xs text-gray-400 mb-1"><i class="fa-solid fa-comment mr-1"></i>请假原因</p><p class="text-gray-800">${request.leave_reason || '无'}</p></div>
-        ${request.attachment ? `<div class="bg-gray-50 rounded-xl p-4"><p class="text-xs text-gray-400 mb-2"><i class="fa-solid fa-paperclip mr-1"></i>佐证材料</p>${request.attachment.toLowerCase().endsWith('.pdf') ? `<div class="flex items-center justify-between"><div class="flex items-center space-x-2"><div class="w-8 h-8 bg-red-100 rounded-lg flex items-center justify-center"><i class="fa-solid fa-file-pdf text-red-500"></i></div><span class="text-gray-700 text-sm">${request.attachment}</span></div><a href="/zhengming/${request.attachment}" target="_blank" class="px-3 py-1.5 bg-primary text-white rounded-lg text-sm hover:bg-primary/80"><i class="fa-solid fa-eye mr-1"></i>预览</a></div>` : `<img src="/zhengming/${request.attachment}" class="max-w-full max-h-48 rounded-lg cursor-pointer hover:opacity-90" onclick="window.open('/zhengming/${request.attachment}', '_blank')" onerror="this.outerHTML='<span class=text-gray-400>文件加载失败</span>'" />`}</div>` : ''}
+        ${request.attachment_url ? `<div class="bg-gray-50 rounded-xl p-4"><p class="text-xs text-gray-400 mb-2"><i class="fa-solid fa-paperclip mr-1"></i>佐证材料</p>${request.attachment.toLowerCase().endsWith('.pdf') ? `<div class="flex items-center justify-between"><div class="flex items-center space-x-2"><div class="w-8 h-8 bg-red-100 rounded-lg flex items-center justify-center"><i class="fa-solid fa-file-pdf text-red-500"></i></div><span class="text-gray-700 text-sm">${request.attachment}</span></div><a href="${request.attachment_url}" target="_blank" class="px-3 py-1.5 bg-primary text-white rounded-lg text-sm hover:bg-primary/80"><i class="fa-solid fa-eye mr-1"></i>预览</a></div>` : `<img src="${request.attachment_url}" class="max-w-full max-h-48 rounded-lg cursor-pointer hover:opacity-90" onclick="window.open('${request.attachment_url}', '_blank')" onerror="this.outerHTML='<span class=text-gray-400>文件加载失败</span>'" />`}</div>` : ''}
         ${request.approval_comment ? `<div class="bg-primary/5 rounded-xl p-4 border border-primary/10"><p class="text-xs text-primary/70 mb-1"><i class="fa-solid fa-pen mr-1"></i>审批意见</p><p class="text-gray-800">${request.approval_comment}</p></div>` : ''}
-        ${request.approval_status === '已批准' ? `<div class="bg-gray-50 rounded-xl p-4"><p class="text-xs text-gray-400 mb-2"><i class="fa-solid fa-signature mr-1"></i>审批人签名</p><img src="/qianzi/${request.approver_id}_${request.leave_id}.png" alt="签名" class="max-w-[180px] max-h-[80px] object-contain" onerror="this.outerHTML='<p class=text-gray-400>暂无签名</p>'"></div>` : ''}
+        ${request.approval_status === '已批准' ? `<div class="bg-gray-50 rounded-xl p-4"><p class="text-xs text-gray-400 mb-2"><i class="fa-solid fa-signature mr-1"></i>审批人签名</p>${request.counselor_signature ? `<img src="${request.counselor_signature}" alt="签名" class="max-w-[180px] max-h-[80px] object-contain" onerror="this.outerHTML='<p class=text-gray-400>签名加载失败</p>'">` : '<p class="text-gray-400">暂无签名</p>'}</div>` : ''}
       </div>
       <div class="px-6 pb-6">
         ${request.approval_status === '待审批' ? `
@@ -1108,6 +1074,7 @@ async function rejectLeaveRequest(requestId, comment) {
       const app = window.counselorApp;
       if (app) {
         await app.loadLeaveRequests();
+        app.loadDetailedStatistics();
         showCustomModal('成功', '<p class="text-center">请假已成功驳回</p>', null, '确定', null);
       }
     } else {
@@ -0,0 +1,152 @@
+// events.js - 站内事件推送（/api/events，Server-Sent Events）与聊天长连接（/ws/chat，WebSocket）
+//
+// subscribeEvents(handlers, poll, interval)
+//   handlers: { 事件类型: function(data) }，事件类型见 event_bus.py（chat / leave_status / leave_notice）
+//   poll:     连接不可用时的轮询函数；连接断开期间每 interval 毫秒调用一次，
+//             重新连上后再补拉一次（断开期间可能漏掉事件），然后停止轮询
+// 浏览器不支持 EventSource 或服务端拒绝连接（如登录过期）时一直轮询。
+
+function subscribeEvents(handlers, poll, interval) {
+  let timer = null;
+  let dropped = false;
+
+  function startPolling() {
+    if (!timer && poll) timer = setInterval(poll, interval);
+  }
+
+  function stopPolling() {
+    if (timer) {
+      clearInterval(timer);
+      timer = null;
+    }
+  }
+
+  if (!window.EventSource) {
+    startPolling();
+    return null;
+  }
+
+  const source = new EventSource('/api/events');
+  source.onopen = () => {
+    stopPolling();
+    if (dropped && poll) poll();
+    dropped = false;
+  };
+  source.onerror = () => {
+    dropped = true;
+    startPolling();
+  };
+  Object.keys(handlers).forEach(type => {
+    source.addEventListener(type, e => {
+      try {
+        handlers[type](JSON.parse(e.data));
+      } catch (err) {
+        console.error(`处理事件 ${type} 失败:`, err);
+      }
+    });
+  });
+  return source;
+}
+
+// connectChat(handlers, poll, interval) - 聊天长连接（/ws/chat，WebSocket）
+//   handlers / poll / interval 同 subscribeEvents，另有 typing（对方正在输入）、read（对方已读）事件
+//   首次连接失败（浏览器或服务器不支持 WebSocket）时改用 subscribeEvents；连上后断开则退避重连，
+//   断开期间按 interval 轮询，重新连上后补拉一次
+// 返回对象：
+//   send(to, content)  经长连接发送，Promise 返回 ack / error 消息；长连接不可用时返回 null，由调用方改用 HTTP 接口
+//   typing(to)         通知对方正在输入（每 3 秒最多一次）
+//   read(contactId, messageId)  已读到对方发来的 messageId 为止的消息（对方收到 read 事件）
+function connectChat(handlers, poll, interval) {
+  const ACK_TIMEOUT = 10000;
+  const pending = {};  // client_id -> resolve
+  let socket = null;
+  let ready = false;
+  let retries = 0;
+  let seq = 0;
+  let lastTyping = 0;
+  let timer = null;
+
+  function stopPolling() {
+    if (timer) {
+      clearInterval(timer);
+      timer = null;
+    }
+  }
+
+  function settle(clientId, reply) {
+    const resolve = pending[clientId];
+    if (resolve) {
+      delete pending[clientId];
+      resolve(reply);
+    }
+  }
+
+  function post(message) {
+    if (!ready) return false;
+    socket.send(JSON.stringify(message));
+    return true;
+  }
+
+  function open() {
+    let opened = false;
+    socket = new WebSocket(`${location.protocol === 'https:' ? 'wss:' : 'ws:'}//${location.host}/ws/chat`);
+    socket.onopen = () => {
+      opened = true;
+      ready = true;
+      stopPolling();
+      if (retries > 0 && poll) poll();
+      retries = 0;
+    };
+    socket.onmessage = e => {
+      let message;
+      try {
+        message = JSON.parse(e.data);
+      } catch (err) {
+        return;
+      }
+      if (message.type === 'ack' || message.type === 'error') {
+        if (message.client_id) settle(message.client_id, message);
+        else console.error('聊天连接错误:', message.message);
+      } else if (message.type !== 'pong' && handlers[message.type]) {
+        try {
+          handlers[message.type](message.data);
+        } catch (err) {
+          console.error(`处理事件 ${message.type} 失败:`, err);
+        }
+      }
+    };
+    socket.onclose = () => {
+      ready = false;
+      Object.keys(pending).forEach(id => settle(id, { type: 'error', message: '连接已断开，请重试' }));
+      if (!opened && retries === 0) {
+        subscribeEvents(handlers, poll, interval);
+        return;
+      }
+      if (!timer && poll) timer = setInterval(poll, interval);
+      retries += 1;
+      setTimeout(open, Math.min(30000, 1000 * 2 ** retries));
+    };
+  }
+
+  if (window.WebSocket) open();
+  else subscribeEvents(handlers, poll, interval);
+
+  return {
+    send(to, content) {
+      if (!ready) return Promise.resolve(null);
+      const clientId = `c${Date.now()}-${++seq}`;
+      return new Promise(resolve => {
+        pending[clientId] = resolve;
+        post({ type: 'send', client_id: clientId, to, content });
+        setTimeout(() => settle(clientId, { type: 'error', message: '发送超时，请重试' }), ACK_TIMEOUT);
+      });
+    },
+    typing(to) {
+      if (Date.now() - lastTyping < 3000) return;
+      if (post({ type: 'typing', to })) lastTyping = Date.now();
+    },
+    read(contactId, messageId) {
+      post({ type: 'read', contact_id: contactId, message_id: messageId });
+    }
+  };
+}
@@ -448,6 +448,8 @@ function updateStats() {
 // ========== 聊天功能 ==========
 let chatMessages = [];
 let currentContact = null; // {id, name, role, courses, avatar}
+let chatConnection = null; // connectChat() 返回的聊天长连接
+let typingTimer = null;
 let studentAvatar = null; // 学生头像
 
 async function loadChatContacts() {
@@ -471,6 +473,16 @@ function getAvatarHtml(avatar, name, colorClass) {
   return `<div class="w-full h-full rounded-full bg-gradient-to-br ${colorClass} flex items-center justify-center text-white font-bold">${name.charAt(0)}</div>`;
 }
 
+// 联系人未读角标
+function getUnreadBadge(unread) {
+  return unread > 0 ? `<span class="unread-badge bg-red-500 text-white text-xs px-2 py-0.5 rounded-full flex-shrink-0">${unread}</span>` : '';
+}
+
+// 联系人在线标记（有打开的聊天/事件连接）
+function getOnlineDot(online) {
+  return online ? '<span class="absolute bottom-0 right-0 w-3 h-3 rounded-full bg-green-500 border-2 border-white" title="在线"></span>' : '';
+}
+
 function renderChatContacts(contacts) {
   const counselorContainer = document.getElementById('counselor-contacts');
   const teacherContainer = document.getElementById('teacher-contacts');
@@ -480,13 +492,17 @@ function renderChatContacts(contacts) {
     counselorContainer.innerHTML = contacts.counselors.map(c => `
       <div class="contact-item p-3 rounded-xl cursor-pointer hover:bg-white hover:shadow transition-all flex items-center space-x-3"
            onclick="selectContact('${c.id}', '${c.name}', '辅导员', '', '${c.avatar || ''}')">
-        <div class="w-10 h-10 rounded-full overflow-hidden flex-shrink-0">
-          ${getAvatarHtml(c.avatar, c.name, 'from-blue-400 to-blue-600')}
+        <div class="relative w-10 h-10 flex-shrink-0">
+          <div class="w-10 h-10 rounded-full overflow-hidden">
+            ${getAvatarHtml(c.avatar, c.name, 'from-blue-400 to-blue-600')}
+          </div>
+          ${getOnlineDot(c.online)}
         </div>
         <div class="flex-1 min-w-0">
           <p class="font-medium text-gray-800 truncate">${c.name}</p>
           <p class="text-xs text-gray-400">辅导员</p>
         </div>
+        ${getUnreadBadge(c.unread)}
       </div>
     `).join('');
   } else {
@@ -498,13 +514,17 @@ function renderChatContacts(contacts) {
     teacherContainer.innerHTML = contacts.teachers.map(t => `
       <div class="contact-item p-3 rounded-xl cursor-pointer hover:bg-white hover:shadow transition-all flex items-center space-x-3"
            onclick="selectContact('${t.id}', '${t.name}', '讲师', '${t.courses || ''}', '${t.avatar || ''}')">
-        <div class="w-10 h-10 rounded-full overflow-hidden flex-shrink-0">
-          ${getAvatarHtml(t.avatar, t.name, 'from-green-400 to-green-600')}
+        <div class="relative w-10 h-10 flex-shrink-0">
+          <div class="w-10 h-10 rounded-full overflow-hidden">
+            ${getAvatarHtml(t.avatar, t.name, 'from-green-400 to-green-600')}
+          </div>
+          ${getOnlineDot(t.online)}
         </div>
         <div class="flex-1 min-w-0">
           <p class="font-medium text-gray-800 truncate">${t.name}</p>
           <p class="text-xs text-gray-400 truncate">${t.courses || '讲师'}</p>
         </div>
+        ${getUnreadBadge(t.unread)}
       </div>
     `).join('');
   } else {
@@ -524,13 +544,18 @@ function selectContact(id, name, role, courses, avatar) {
   const btn = document.getElementById('send-btn');
   input.disabled = false;
   input.placeholder = `给${name}发送消息...`;
+  input.oninput = () => {
+    if (chatConnection && currentContact) chatConnection.typing(currentContact.id);
+  };
   btn.disabled = false;
   
   // 高亮选中的联系人
   document.querySelectorAll('.contact-item').forEach(el => el.classList.remove('bg-white', 'shadow', 'ring-2', 'ring-primary'));
   event.currentTarget.classList.add('bg-white', 'shadow', 'ring-2', 'ring-primary');
+  event.currentTarget.querySelector('.unread-badge')?.remove();
   
   // 加载聊天记录
+  chatMessages = [];
   loadChatMessages();
 }
 
@@ -548,13 +573,21 @@ async function loadChatMessages() {
     return;
   }
   
+  // 首次加载最近一页，之后只拉取 message_id 大于已加载最后一条的新消息；
+  // 本地先显示、尚未确认的消息（pending）保留在末尾，发送成功后由服务端记录替换
+  const contact = currentContact;
+  const confirmed = chatMessages.filter(msg => !msg.pending);
+  const pending = chatMessages.filter(msg => msg.pending);
+  const lastId = confirmed.length ? confirmed[confirmed.length - 1].message_id : null;
   try {
-    const res = await fetch(`/api/student/chat/messages?contact_id=${currentContact.id}&contact_role=${currentContact.role}`);
+    const res = await fetch(`/api/student/chat/messages?contact_id=${contact.id}&contact_role=${contact.role}` + (lastId ? `&after_id=${lastId}` : ''));
     const data = await res.json();
-    if (data.success && data.data) {
-      chatMessages = data.data;
-      renderChatMessages();
-    }
+    if (contact !== currentContact || !data.success || !data.data) return;
+    if (lastId !== null && !data.data.length) return;
+    chatMessages = confirmed.concat(data.data, pending);
+    renderChatMessages();
+    // 一次没拉完则继续拉取
+    if (lastId !== null && data.has_more) loadChatMessages();
   } catch (err) {
     console.error('加载聊天记录失败:', err);
   }
@@ -609,15 +642,28 @@ async function sendMessage() {
   
   input.value = '';
   
-  // 立即显示发送的消息
-  chatMessages.push({
+  // 立即显示发送的消息，发送成功后拉取服务端记录替换
+  const pendingMsg = {
     content: message,
     sender_type: '学生',
-    created_at: new Date().toISOString()
-  });
+    created_at: new Date().toISOString(),
+    pending: true
+  };
+  chatMessages.push(pendingMsg);
   renderChatMessages();
+  const confirmSent = () => {
+    chatMessages = chatMessages.filter(msg => msg !== pendingMsg);
+    loadChatMessages();
+  };
   
   try {
+    // 优先经聊天长连接发送，不可用时走 HTTP 接口
+    const reply = chatConnection ? await chatConnection.send(currentContact.id, message) : null;
+    if (reply) {
+      if (reply.type === 'error') showToast(reply.message || '发送失败', 'error');
+      else confirmSent();
+      return;
+    }
     const res = await fetch('/api/student/chat/send', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
@@ -630,6 +676,8 @@ async function sendMessage() {
     const data = await res.json();
     if (!data.success) {
       showToast(data.message || '发送失败', 'error');
+    } else {
+      confirmSent();
     }
   } catch (err) {
     showToast('发送失败，请重试', 'error');
@@ -1916,6 +1964,8 @@ function initApprovalCheck() {
 }
 
 // ========== 初始化 ==========
+const LEAVE_REFRESH_INTERVAL = 120000;
+
 document.addEventListener('DOMContentLoaded', async () => {
   await loadCourses();
   document.querySelectorAll('.course-teacher-row').forEach(row => bindRowEvents(row));
@@ -1926,15 +1976,36 @@ document.addEventListener('DOMContentLoaded', async () => {
   // 加载通知相关数据
   await loadFilterOptions();
   
-  // 定期检查新消息
-  setInterval(loadChatMessages, 30000);
-  
-  // 定期检查审批状态变化（每30秒）
-  setInterval(async () => {
-    const oldRecords = [...leaveRecords];
+  // 新消息与审批结果由服务端推送；推送断开时每30秒轮询
+  const refreshLeaveRecords = async () => {
     await loadLeaveRecords();
     checkApprovalStatus();
+  };
+  chatConnection = connectChat({
+    chat: msg => {
+      if (currentContact && msg.sender_id === currentContact.id) {
+        loadChatMessages();
+        chatConnection.read(currentContact.id, msg.message_id);
+      } else {
+        loadChatContacts();
+      }
+    },
+    typing: data => {
+      if (!currentContact || data.sender_id !== currentContact.id) return;
+      const roleEl = document.getElementById('chat-contact-role');
+      roleEl.textContent = '对方正在输入...';
+      clearTimeout(typingTimer);
+      typingTimer = setTimeout(() => {
+        if (currentContact) roleEl.textContent = currentContact.role + (currentContact.courses ? ` · ${currentContact.courses}` : '');
+      }, 3000);
+    },
+    leave_status: refreshLeaveRecords
+  }, () => {
+    loadChatMessages();
+    refreshLeaveRecords();
   }, 30000);
+  // 命令行（terminal）等不经网页端的审批不会推送事件，推送正常时也低频刷新请假记录（未变化时服务端返回 304）
+  setInterval(refreshLeaveRecords, LEAVE_REFRESH_INTERVAL);
 });
 
 // 在加载记录后渲染图表和日历
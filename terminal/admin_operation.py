@@ -1,14 +1,16 @@
 import pymysql
 from db_config import get_db_config
+from chat_contacts import rebuild_chat_contacts
 from datetime import datetime
 
 
 class AdminOperation:
-    def __init__(self):
-        # 初始化数据库连接
+    def __init__(self, pool=None):
+        # 初始化数据库连接（pool：可选，注入Web端共享的连接池；不传时终端交互自行连接）
         self.conn = None
         self.cursor = None
         self.config = get_db_config()
+        self.pool = pool
         # 角色映射配置（整合web端的角色映射）
         self.role_mapping = {
             1: {  # 学生
@@ -45,14 +47,16 @@ class AdminOperation:
     def _connect_db(self):
         """连接数据库"""
         try:
-            self.conn = pymysql.connect(**self.config)
+            self.conn = self.get_db_connection()
             self.cursor = self.conn.cursor()
         except pymysql.MySQLError as e:
             print(f"数据库连接失败：{e}")
             exit()
 
     def get_db_connection(self):
-        """获取新的数据库连接（供web接口使用）"""
+        """获取新的数据库连接（供web接口使用，注入连接池时从池中借出）"""
+        if self.pool is not None:
+            return self.pool.acquire()
         return pymysql.connect(** self.config)
 
     def _close_db(self):
@@ -141,6 +145,7 @@ class AdminOperation:
                 (student_id, student_password, student_name, dept_name, student_dept_id, student_grade, class_num, major, major_code, student_contact, student_create_time, student_update_time, times)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (student_id, password, student_name, dept, dept_id, grade, class_num, major, major_code, contact, create_time, update_time, times))
+            rebuild_chat_contacts(self.cursor, student_id)
             self.conn.commit()
             print("学生添加成功")
         except pymysql.MySQLError as e:
@@ -202,6 +207,7 @@ class AdminOperation:
                 return
 
             self.cursor.execute("DELETE FROM student_info WHERE student_id = %s", (student_id,))
+            rebuild_chat_contacts(self.cursor, student_id)
             self.conn.commit()
             print("学生删除成功")
         except pymysql.MySQLError as e:
@@ -245,6 +251,7 @@ class AdminOperation:
                 (teacher_id, teacher_password, teacher_name, teacher_dept, teacher_contact, teacher_create_time, teacher_update_time)
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
             """, (teacher_id, password, teacher_name, dept, contact, create_time, update_time))
+            rebuild_chat_contacts(self.cursor, teacher_id)
             self.conn.commit()
             print("教师添加成功")
         except pymysql.MySQLError as e:
@@ -292,6 +299,7 @@ class AdminOperation:
                 (counselor_id, counselor_password, counselor_name, counselor_dept, responsible_grade, responsible_major, counselor_contact, counselor_create_time, counselor_update_time)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (counselor_id, password, counselor_name, dept, responsible_grade, responsible_major, contact, create_time, update_time))
+            rebuild_chat_contacts(self.cursor, counselor_id)
             self.conn.commit()
             print("辅导员添加成功")
         except pymysql.MySQLError as e:
@@ -353,6 +361,7 @@ class AdminOperation:
                 return
 
             self.cursor.execute("DELETE FROM counselor_info WHERE counselor_id = %s", (counselor_id,))
+            rebuild_chat_contacts(self.cursor, counselor_id)
             self.conn.commit()
             print("辅导员删除成功")
         except pymysql.MySQLError as e:
@@ -520,6 +529,7 @@ class AdminOperation:
                     VALUES (%s, %s, %s)
                 """
                 cursor.execute(sql, (account, password, user_name))
+            rebuild_chat_contacts(cursor, account)
             
             conn.commit()
             return {"success": True, "message": f"{mapping['role_name']}添加成功"}
@@ -585,6 +595,7 @@ class AdminOperation:
                         VALUES (%s, %s, %s)
                     """
                     cursor.execute(insert_sql, (account, pwd, name))
+                rebuild_chat_contacts(cursor, account)
             
             # 仅修改姓名或密码
             else:
@@ -645,6 +656,7 @@ class AdminOperation:
             # 执行删除
             del_sql = f"DELETE FROM {original_mapping['table']} WHERE {original_mapping['account']} = %s"
             cursor.execute(del_sql, (account,))
+            rebuild_chat_contacts(cursor, account)
             conn.commit()
             return {"success": True, "message": f"{original_mapping['role_name']}删除成功"}
             
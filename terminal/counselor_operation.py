@@ -1,17 +1,27 @@
 import pymysql
 from db_config import get_db_config
+from leave_counters import record_status_change
 from datetime import datetime
 import json
 
 class CounselorOperation:
-    def __init__(self, counselor_id, counselor_name, responsible_grade):
-        """初始化：接收辅导员ID、姓名、负责年级"""
+    def __init__(self, counselor_id, counselor_name, responsible_grade, conn=None):
+        """初始化：接收辅导员ID、姓名、负责年级
+
+        conn：可选，注入已有的数据库连接（如Web端请求内的连接池连接），
+        注入时不再自行建立连接，_close_db() 也不会关闭该连接；
+        不传时（终端交互）自行连接数据库。
+        """
         self.counselor_id = counselor_id  # 辅导员工号（主键）
         self.counselor_name = counselor_name  # 辅导员姓名
-        self.responsible_grade = responsible_grade  # 负责年级
-        self.conn = None
+        self.responsible_grade = str(responsible_grade or '').strip()  # 负责年级（与 grade 列同为字符串，保证走索引）
+        self.conn = conn
         self.cursor = None
-        self._connect_db()
+        self._owns_conn = conn is None
+        if self._owns_conn:
+            self._connect_db()
+        else:
+            self.cursor = self.conn.cursor()
 
     def _connect_db(self):
         """连接数据库"""
@@ -24,10 +34,10 @@ class CounselorOperation:
             raise Exception(f"数据库连接失败：{e}")
 
     def _close_db(self):
-        """关闭数据库连接"""
+        """关闭数据库连接（注入的连接只关闭游标，连接由调用方管理）"""
         if self.cursor:
             self.cursor.close()
-        if self.conn and self.conn.open:
+        if self._owns_conn and self.conn and self.conn.open:
             self.conn.close()
 
     def show_menu(self):
@@ -107,7 +117,7 @@ class CounselorOperation:
                 SELECT sl.leave_id, sl.leave_student_id, sl.leave_student_name, sl.leave_course_id, 
                        sl.leave_reason, sl.leave_start_time, sl.leave_end_time, sl.approval_status
                 FROM student_leave sl
-                WHERE LEFT(sl.leave_student_id, 4) = %s
+                WHERE sl.grade = %s
                   AND sl.approval_status = '待审批'
                 ORDER BY sl.leave_start_time DESC
             """
@@ -136,7 +146,7 @@ class CounselorOperation:
                 SELECT sl.leave_id, sl.leave_student_id, sl.leave_student_name, sl.leave_course_id, 
                        sl.approval_status, sl.approver_id, sl.approver_name, sl.approval_time
                 FROM student_leave sl
-                WHERE LEFT(sl.leave_student_id, 4) = %s
+                WHERE sl.grade = %s
                 ORDER BY sl.approval_time DESC, sl.leave_start_time DESC
             """
             self.cursor.execute(sql, (self.responsible_grade,))
@@ -170,7 +180,7 @@ class CounselorOperation:
                 FROM student_leave sl
                 LEFT JOIN student_info si ON sl.leave_student_id = si.student_id
                 WHERE sl.leave_id = %s
-                  AND LEFT(sl.leave_student_id, 4) = %s
+                  AND sl.grade = %s
             """
             self.cursor.execute(sql_check, (leave_id, self.responsible_grade))
             result = self.cursor.fetchone()
@@ -207,7 +217,7 @@ class CounselorOperation:
             approval_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             approver_name = self.counselor_name  # 当前辅导员姓名
 
-            # 4. 事务处理：更新请假记录 + （仅同意时）更新学生times
+            # 4. 事务处理：更新请假记录 + 请假数量 + （仅同意时）更新学生times
             self.conn.begin()
             # 4.1 更新student_leave表
             sql_update_leave = """
@@ -216,9 +226,14 @@ class CounselorOperation:
                     approver_id = %s, 
                     approver_name = %s, 
                     approval_time = %s
-                WHERE leave_id = %s
+                WHERE leave_id = %s AND approval_status = '待审批'
             """
             self.cursor.execute(sql_update_leave, (new_status, self.counselor_id, approver_name, approval_time, leave_id))
+            if self.cursor.rowcount != 1:
+                self.conn.rollback()
+                print("❌ 该请假记录已被审批，无需重复审批")
+                return
+            record_status_change(self.cursor, leave_id, "待审批", new_status)
 
             # 4.2 仅“同意”时，更新student_info的times字段
             update_msg = ""
@@ -291,7 +306,7 @@ class CounselorOperation:
                 FROM student_leave sl
                 LEFT JOIN student_info si ON sl.leave_student_id = si.student_id
                 WHERE sl.leave_id = %s
-                  AND LEFT(sl.leave_student_id, 4) = %s
+                  AND sl.grade = %s
             """
             self.cursor.execute(sql_check, (leave_id, self.responsible_grade))
             result = self.cursor.fetchone()
@@ -321,7 +336,7 @@ class CounselorOperation:
             approval_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             approver_name = self.counselor_name  # 当前辅导员姓名
 
-            # 4. 事务处理：更新请假记录 + （仅同意时）更新学生times
+            # 4. 事务处理：更新请假记录 + 请假数量 + （仅同意时）更新学生times
             self.conn.begin()
             # 4.1 更新student_leave表
             sql_update_leave = """
@@ -330,9 +345,13 @@ class CounselorOperation:
                     approver_id = %s, 
                     approver_name = %s, 
                     approval_time = %s
-                WHERE leave_id = %s
+                WHERE leave_id = %s AND approval_status = '待审批'
             """
             self.cursor.execute(sql_update_leave, (new_status, self.counselor_id, approver_name, approval_time, leave_id))
+            if self.cursor.rowcount != 1:
+                self.conn.rollback()
+                return {"success": False, "message": "该请假记录已被审批，无需重复审批"}
+            record_status_change(self.cursor, leave_id, "待审批", new_status)
 
             # 4.2 仅“同意”时，更新student_info的times字段
             if action == "approve":
@@ -344,7 +363,8 @@ class CounselorOperation:
                 self.cursor.execute(sql_update_student, (approval_time, student_id))
 
             self.conn.commit()
-            return {"success": True, "message": f"审批成功！请假ID{leave_id}状态更新为「{new_status}」"}
+            return {"success": True, "message": f"审批成功！请假ID{leave_id}状态更新为「{new_status}」",
+                    "student_id": student_id, "approval_status": new_status}
 
         except pymysql.MySQLError as e:
             if self.conn:
@@ -4,6 +4,7 @@ from login import login
 from terminal.admin_operation import AdminOperation
 from terminal.student_operation import StudentOperation
 from terminal.counselor_operation import CounselorOperation
+from db_pool import get_pool
 
 # 尝试导入老师操作类，如果失败则设置为None
 TeacherOperation = None
@@ -77,7 +78,8 @@ def main():
             if TeacherOperation is not None:
                 try:
                     print("👨‍🏫 正在进入老师工作台...")
-                    teacher = TeacherOperation(user_info)
+                    # 老师工作台每次查询借出连接，共享连接池复用空闲连接，不再每次重新连接数据库
+                    teacher = TeacherOperation(user_info, pool=get_pool())
                     teacher.show_menu()
                 except Exception as e:
                     print(f"\n⚠️ 讲师功能可能尚未完全开发：{str(e)}")
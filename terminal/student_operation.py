@@ -1,13 +1,19 @@
 import pymysql
 from db_config import get_db_config
+from leave_counters import record_new_leave
 from datetime import datetime, timedelta
 
 class StudentOperation:
-    def __init__(self, student_id):
+    def __init__(self, student_id, conn=None):
+        """conn：可选，注入已有的数据库连接；不传时（终端交互）自行连接数据库"""
         self.student_id = student_id
-        self.conn = None
+        self.conn = conn
         self.cursor = None
-        self._connect_db()
+        self._owns_conn = conn is None
+        if self._owns_conn:
+            self._connect_db()
+        else:
+            self.cursor = self.conn.cursor()
 
     def _connect_db(self):
         """连接数据库"""
@@ -20,10 +26,10 @@ class StudentOperation:
             exit()
 
     def _close_db(self):
-        """关闭数据库连接"""
+        """关闭数据库连接（注入的连接只关闭游标，连接由调用方管理）"""
         if self.cursor:
             self.cursor.close()
-        if self.conn and self.conn.open:
+        if self._owns_conn and self.conn and self.conn.open:
             self.conn.close()
 
     def show_menu(self):
@@ -257,6 +263,15 @@ class StudentOperation:
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """, (self.student_id, student_name, dept, course_id, teacher_id, leave_reason, start_time, end_time, approval_status, current_times))
             
+            leave_id = self.cursor.lastrowid
+            
+            # 同一事务内写入请假-课程-教师关联表
+            self.cursor.execute("""
+                INSERT IGNORE INTO student_leave_course (leave_id, course_id, teacher_id)
+                VALUES (%s, %s, %s)
+            """, (leave_id, course_id, teacher_id))
+            record_new_leave(self.cursor, leave_id)
+            
             self.conn.commit()
             print("✅ 请假申请提交成功，等待审批")
             print(f"   请假时间: {start_time} 至 {end_time}")
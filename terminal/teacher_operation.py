@@ -9,6 +9,7 @@ from db_config import get_db_config
 
 # 统一维护相关表名，方便后续调整
 STUDENT_LEAVE_TABLE = "student_leave"
+LEAVE_COURSE_TABLE = "student_leave_course"
 TEACHER_LEAVE_TABLE = "teacher_leave"
 COURSE_TABLE = "course_info"
 TEACHER_TABLE = "teacher_info"
@@ -24,13 +25,20 @@ class TeacherService:
     2. 老师发起请假并同步给课程内学生（学生可通过自己的查询接口查看到课程老师的请假）
     """
 
-    def __init__(self):
+    def __init__(self, pool=None):
+        """
+        pool：可选，注入共享连接池（terminal/main.py 的老师工作台传入 db_pool.get_pool()），
+        每次查询从池中借出连接、用完归还；不传时每次直连数据库。
+        """
         self.config = {**get_db_config(), "cursorclass": DictCursor}
+        self.pool = pool
 
     # ------------------------------------------------------------------ #
     # 公共工具方法
     # ------------------------------------------------------------------ #
     def _connect(self):
+        if self.pool is not None:
+            return self.pool.acquire()
         return pymysql.connect(**self.config)
 
     @staticmethod
@@ -84,7 +92,7 @@ class TeacherService:
         
         try:
             with self._connect() as conn:
-                with conn.cursor() as cursor:
+                with conn.cursor(DictCursor) as cursor:
                     cursor.execute(sql)
                     rows = cursor.fetchall()
         except pymysql.MySQLError as exc:
@@ -114,9 +122,9 @@ class TeacherService:
         status_list = DEFAULT_APPROVED_STATUSES
         placeholders = ", ".join(["%s"] * len(status_list))
         
-        # 构建SQL查询条件
+        # 构建SQL查询条件（通过请假课程关联表按 teacher_id 走索引）
         conditions = [
-            "FIND_IN_SET(%s, sl.leave_teacher_id) > 0",
+            "slc.teacher_id = %s",
             f"sl.approval_status IN ({placeholders})"
         ]
         params = [teacher_id, *status_list]
@@ -129,48 +137,33 @@ class TeacherService:
         
         where_clause = " AND ".join(conditions)
         
-        # 先尝试连接 course_info 表获取课程名称，如果失败则只查询基础信息
+        # 一次查询带出该老师在每条请假中涉及的课程编号与课程名称
         sql = f"""
             SELECT
                 sl.leave_id,
                 sl.leave_student_id as student_id,
                 sl.leave_student_name as student_name,
                 sl.leave_dept as dept,
-                sl.leave_course_id as course_code,
+                GROUP_CONCAT(slc.course_id ORDER BY slc.course_id SEPARATOR ',') as course_code,
+                GROUP_CONCAT(c.course_name ORDER BY slc.course_id SEPARATOR ', ') as course_name,
                 sl.leave_reason,
                 sl.leave_start_time as start_time,
                 sl.leave_end_time as end_time,
                 sl.approval_status,
                 sl.approval_time,
                 sl.leave_times as times
-            FROM {STUDENT_LEAVE_TABLE} sl
+            FROM {LEAVE_COURSE_TABLE} slc
+            JOIN {STUDENT_LEAVE_TABLE} sl ON sl.leave_id = slc.leave_id
+            LEFT JOIN {COURSE_TABLE} c ON c.course_id = slc.course_id
             WHERE {where_clause}
+            GROUP BY sl.leave_id
             ORDER BY sl.approval_time DESC, sl.leave_start_time DESC
         """
         try:
             with self._connect() as conn:
-                with conn.cursor() as cursor:
+                with conn.cursor(DictCursor) as cursor:
                     cursor.execute(sql, tuple(params))
                     rows = cursor.fetchall()
-                    
-                    # 获取课程名称：student_leave.course_code 对应 course_info.course_id
-                    for row in rows:
-                        course_code = row.get('course_code')
-                        row['course_name'] = None  # 默认值
-                        if course_code:
-                            try:
-                                # course_info 表的主键是 course_id，student_leave 表中存储的是 course_code
-                                # 所以用 course_code 的值去 course_info 表的 course_id 字段查询
-                                cursor.execute(
-                                    f"SELECT course_name FROM {COURSE_TABLE} WHERE course_id = %s",
-                                    (course_code,)
-                                )
-                                course = cursor.fetchone()
-                                if course:
-                                    row['course_name'] = course.get('course_name') if isinstance(course, dict) else (course[0] if course else None)
-                            except Exception as e:
-                                # 忽略错误，保持 course_name 为 None
-                                pass
         except pymysql.MySQLError as exc:
             return {
                 "success": False,
@@ -235,7 +228,7 @@ class TeacherService:
 
         try:
             with self._connect() as conn:
-                with conn.cursor() as cursor:
+                with conn.cursor(DictCursor) as cursor:
                     cursor.execute(teacher_sql, (teacher_id,))
                     teacher = cursor.fetchone()
                     if not teacher:
@@ -318,10 +311,10 @@ class TeacherOperation:
     终端版老师菜单，复用 TeacherService。
     """
 
-    def __init__(self, teacher_info: dict):
+    def __init__(self, teacher_info: dict, pool=None):
         self.teacher_id = teacher_info["user_account"]
         self.teacher_name = teacher_info["user_name"]
-        self.service = TeacherService()
+        self.service = TeacherService(pool=pool)
 
     def show_menu(self):
         while True:
@@ -0,0 +1,236 @@
+"""
+cache_backend.RedisBackend 测试：在本机起一个极简的 RESP 服务（只实现后端用到的命令），
+不依赖真实 Redis。运行：python -m pytest tests 或 python -m unittest discover tests
+"""
+import socket
+import threading
+import time
+import unittest
+
+from cache_backend import Cache, CacheUnavailable, MISSING, RedisBackend
+
+
+class FakeRedisServer:
+    """单线程处理每个连接的 RESP 服务；数据保存在内存中，过期按真实时间判断"""
+
+    def __init__(self):
+        self.values = {}      # key -> bytes
+        self.zsets = {}       # key -> {member: score}
+        self.expires = {}     # key -> 毫秒时间戳
+        self.fail_next = None  # 设置为命令名时，下一条该命令返回错误
+        self.lock = threading.Lock()
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.connections = []
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+        self.drop_connections()
+
+    def drop_connections(self):
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+                conn.close()
+            except OSError:
+                pass
+        self.connections = []
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        reader = conn.makefile("rb")
+        try:
+            while True:
+                line = reader.readline()
+                if not line:
+                    return
+                args = []
+                for _ in range(int(line[1:-2])):
+                    length = int(reader.readline()[1:-2])
+                    args.append(reader.read(length + 2)[:-2])
+                with self.lock:
+                    reply = self._execute(args[0].decode().upper(), args[1:])
+                conn.sendall(reply)
+        except OSError:
+            return
+
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _bulk(value):
+        if value is None:
+            return b"$-1\r\n"
+        if not isinstance(value, bytes):
+            value = str(value).encode()
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _array(self, items):
+        return b"*%d\r\n" % len(items) + b"".join(self._bulk(item) for item in items)
+
+    def _alive(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires <= time.time() * 1000:
+            self._delete(key)
+        return key in self.values or key in self.zsets
+
+    def _delete(self, key):
+        found = any(store.pop(key, None) is not None for store in (self.values, self.zsets))
+        self.expires.pop(key, None)
+        return found
+
+    @staticmethod
+    def _score(raw):
+        return float(raw.decode().lstrip("("))
+
+    def _execute(self, cmd, args):
+        if self.fail_next == cmd:
+            self.fail_next = None
+            return b"-ERR injected failure\r\n"
+        if cmd == "GET":
+            return self._bulk(self.values.get(args[0]) if self._alive(args[0]) else None)
+        if cmd == "SET":
+            self._delete(args[0])
+            self.values[args[0]] = args[1]
+            if len(args) > 3 and args[2].upper() == b"PX":
+                self.expires[args[0]] = time.time() * 1000 + int(args[3])
+            return b"+OK\r\n"
+        if cmd == "DEL":
+            return b":%d\r\n" % sum(self._alive(key) and self._delete(key) for key in args)
+        if cmd == "ZADD":
+            self._alive(args[0])
+            self.zsets.setdefault(args[0], {})[args[2]] = self._score(args[1])
+            return b":1\r\n"
+        if cmd == "ZREMRANGEBYSCORE":
+            zset = self.zsets.get(args[0], {}) if self._alive(args[0]) else {}
+            low, high = args[1].decode(), args[2].decode()
+            exclusive = high.startswith("(")
+            high_score = float(high.lstrip("("))
+            removed = [member for member, score in zset.items()
+                       if score >= float(low) and (score < high_score if exclusive else score <= high_score)]
+            for member in removed:
+                del zset[member]
+            if not zset:
+                self._delete(args[0])
+            return b":%d\r\n" % len(removed)
+        if cmd == "ZRANGE":
+            zset = self.zsets.get(args[0], {}) if self._alive(args[0]) else {}
+            ordered = sorted(zset.items(), key=lambda item: (item[1], item[0]))
+            start, stop = int(args[1]), int(args[2])
+            stop = len(ordered) + stop if stop < 0 else stop
+            start = max(len(ordered) + start if start < 0 else start, 0)
+            selected = ordered[start:stop + 1]
+            if len(args) > 3:
+                items = []
+                for member, score in selected:
+                    items += [member, "inf" if score == float("inf") else str(int(score))]
+                return self._array(items)
+            return self._array([member for member, _ in selected])
+        if cmd == "PTTL":
+            if not self._alive(args[0]):
+                return b":-2\r\n"
+            if args[0] not in self.expires:
+                return b":-1\r\n"
+            return b":%d\r\n" % int(self.expires[args[0]] - time.time() * 1000)
+        if cmd == "PEXPIREAT":
+            if not self._alive(args[0]):
+                return b":0\r\n"
+            self.expires[args[0]] = int(args[1])
+            return b":1\r\n"
+        if cmd == "PERSIST":
+            return b":%d\r\n" % (self.expires.pop(args[0], None) is not None)
+        return b"-ERR unknown command\r\n"
+
+
+class RedisBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeRedisServer()
+        self.backend = RedisBackend(f"redis://127.0.0.1:{self.server.port}/0", prefix="t:", timeout=1)
+
+    def tearDown(self):
+        self.server.close()
+
+    def tag_ttl(self, tag):
+        expires = self.server.expires.get(f"t:tags:{tag}".encode())
+        return None if expires is None else expires - time.time() * 1000
+
+    def test_get_set_roundtrip(self):
+        self.assertIs(self.backend.get("missing"), MISSING)
+        self.backend.set("k", {"name": "张三", "ids": [1, 2]}, ttl=10)
+        self.assertEqual(self.backend.get("k"), {"name": "张三", "ids": [1, 2]})
+
+    def test_entry_expires(self):
+        self.backend.set("k", 1, ttl=0.05)
+        time.sleep(0.1)
+        self.assertIs(self.backend.get("k"), MISSING)
+
+    def test_invalidate_tags_deletes_tagged_keys_only(self):
+        self.backend.set("a", 1, ttl=10, tags=("user:1",))
+        self.backend.set("b", 2, ttl=10, tags=("user:1", "ai"))
+        self.backend.set("c", 3, ttl=10, tags=("ai",))
+        self.backend.set("d", 4, ttl=10)
+        self.backend.invalidate_tags("user:1")
+        self.assertIs(self.backend.get("a"), MISSING)
+        self.assertIs(self.backend.get("b"), MISSING)
+        self.assertEqual(self.backend.get("c"), 3)
+        self.assertEqual(self.backend.get("d"), 4)
+        self.assertNotIn(b"t:tags:user:1", self.server.zsets)
+
+    def test_tag_set_expires_no_earlier_than_its_entries(self):
+        self.backend.set("long", 1, ttl=60, tags=("ai",))
+        self.assertGreater(self.tag_ttl("ai"), 59000)
+        # 较短 TTL 的条目不会缩短标签集合的过期时间
+        self.backend.set("short", 2, ttl=5, tags=("ai",))
+        self.assertGreater(self.tag_ttl("ai"), 59000)
+
+    def test_expired_members_are_pruned_on_write(self):
+        for index in range(5):
+            self.backend.set(f"q{index}", index, ttl=0.05, tags=("ai",))
+        time.sleep(0.1)
+        self.backend.set("fresh", 1, ttl=10, tags=("ai",))
+        self.assertEqual(list(self.server.zsets[b"t:tags:ai"]), [b"t:fresh"])
+
+    def test_entry_without_ttl_keeps_tag_set(self):
+        self.backend.set("forever", 1, tags=("ref:courses",))
+        self.backend.set("brief", 2, ttl=5, tags=("ref:courses",))
+        self.assertIsNone(self.tag_ttl("ref:courses"))
+        self.backend.invalidate_tags("ref:courses")
+        self.assertIs(self.backend.get("forever"), MISSING)
+
+    def test_pipeline_error_drops_connection_and_recovers(self):
+        self.backend.set("k", 1, ttl=10, tags=("ai",))
+        self.server.fail_next = "ZADD"
+        with self.assertRaises(CacheUnavailable):
+            self.backend.set("k2", 2, ttl=10, tags=("ai",))
+        # 出错的连接已丢弃（流水线中未读的响应不会错位到下一次调用）
+        self.assertEqual(self.backend.get("k"), 1)
+        self.backend.set("k2", 2, ttl=10, tags=("ai",))
+        self.assertEqual(self.backend.get("k2"), 2)
+
+    def test_reconnects_after_server_drops_connection(self):
+        self.backend.set("k", 1, ttl=10)
+        self.server.drop_connections()
+        with self.assertRaises(CacheUnavailable):
+            self.backend.get("k")
+        self.assertEqual(self.backend.get("k"), 1)
+
+    def test_namespace_treats_unavailable_cache_as_miss(self):
+        namespace = Cache(self.backend).namespace("ref", ttl=10)
+        self.server.close()
+        self.assertEqual(namespace.get_or_load("courses", lambda: {"c1": "数学"}), {"c1": "数学"})
+        self.assertGreaterEqual(namespace.stats()["errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""
+db_monitor 的 N+1 查询检测测试：语句经 db_pool.TracedCursor 执行（底层为不连数据库的假游标），
+不需要 MySQL。运行：python -m pytest tests
+"""
+import unittest
+
+from db_monitor import NPlusOneError, detect_n_plus_one, fingerprint_sql
+from db_pool import TracedCursor
+
+
+class FakeCursor:
+    """只记录执行过的语句"""
+
+    def __init__(self):
+        self.executed = []
+
+    def execute(self, query, args=None):
+        self.executed.append((query, args))
+        return 1
+
+    def executemany(self, query, args):
+        self.executed.extend((query, row) for row in args)
+        return len(args)
+
+    def close(self):
+        pass
+
+
+class NPlusOneDetectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cursor = TracedCursor(FakeCursor())
+
+    def query_each(self, student_ids):
+        for student_id in student_ids:
+            self.cursor.execute("SELECT student_name FROM student_info WHERE student_id = %s", (student_id,))
+
+    def test_repeated_statement_over_threshold_raises(self):
+        with self.assertRaises(NPlusOneError) as caught:
+            with detect_n_plus_one(threshold=3, label="逐个查学生"):
+                self.query_each(["s1", "s2", "s3", "s4"])
+        self.assertIn("逐个查学生", str(caught.exception))
+        self.assertIn("执行4次（阈值3）", str(caught.exception))
+
+    def test_literal_values_count_as_same_statement(self):
+        with self.assertRaises(NPlusOneError):
+            with detect_n_plus_one(threshold=2):
+                for leave_id in (1, 2, 3):
+                    self.cursor.execute(f"SELECT * FROM student_leave WHERE leave_id = {leave_id}")
+
+    def test_statements_within_threshold_pass(self):
+        with detect_n_plus_one(threshold=3) as detector:
+            self.query_each(["s1", "s2", "s3"])
+            self.cursor.execute("SELECT student_name FROM student_info WHERE student_id IN (%s, %s)", ("s1", "s2"))
+        self.assertEqual(detector.violations, {})
+        self.assertEqual(detector.counts[fingerprint_sql(
+            "SELECT student_name FROM student_info WHERE student_id = %s")], 3)
+
+    def test_statements_outside_scope_are_not_counted(self):
+        self.query_each(["s1", "s2", "s3", "s4"])
+        with detect_n_plus_one(threshold=3) as detector:
+            self.query_each(["s5"])
+        self.assertEqual(sum(detector.counts.values()), 1)
+
+    def test_raise_error_false_only_reports(self):
+        with detect_n_plus_one(threshold=1, raise_error=False) as detector:
+            self.cursor.executemany("UPDATE student_info SET student_name = %s WHERE student_id = %s",
+                                    [("张三", "s1"), ("李四", "s2")])
+            self.query_each(["s1", "s2"])
+        self.assertEqual(len(detector.violations), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+聊天 WebSocket 网关
+
+每个打开聊天页面的用户与 /ws/chat 保持一条 WebSocket 连接，发消息、回执、“正在输入”、已读都走这条连接，
+不再每条消息一个 HTTP 请求。这里只负责协议本身（RFC 6455 的握手与帧收发，仅文本消息），
+消息内容与路由由 app.py 中的 /ws/chat 处理：
+1. 连接建立后订阅 event_bus，本进程或其他工作进程发布给该用户的事件经写线程推送到连接
+2. 客户端发来的 JSON 消息逐条交给处理函数，处理函数的返回值（如 ack）回写给该连接
+
+运行在内置服务器（app.run / server.py）下，握手通过 environ["werkzeug.socket"] 直接接管连接；
+其他 WSGI 服务器不提供该接口，/ws/chat 返回 400，页面自动改用 SSE + HTTP 接口。
+"""
+import base64
+import hashlib
+import select
+import socket
+import struct
+import threading
+
+from werkzeug.wrappers import Response
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_MESSAGE_SIZE = 64 * 1024
+# 一帧开始到达后读完整帧、以及每次发送的最长等待时间（秒），超时视为连接失效
+IO_TIMEOUT = 10
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+class WebSocketClosed(Exception):
+    """连接已关闭（对方关闭、网络断开或协议错误）"""
+
+
+class WebSocketUnsupported(Exception):
+    """不是 WebSocket 握手请求，或当前服务器无法接管连接"""
+
+
+class WebSocketResponse(Response):
+    """连接已被 WebSocket 接管并结束：不再写出 HTTP 响应，内置服务器按连接断开处理"""
+
+    def __call__(self, environ, start_response):
+        raise ConnectionError("WebSocket 连接已结束")
+
+
+class WebSocket:
+    """服务端一侧的 WebSocket 连接：receive() 只在处理线程调用，send() 可在任意线程调用"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.settimeout(IO_TIMEOUT)
+        self.closed = False
+        self._send_lock = threading.Lock()
+
+    @classmethod
+    def accept(cls, environ):
+        """校验握手请求并回复 101，返回连接对象"""
+        sock = environ.get("werkzeug.socket")
+        key = environ.get("HTTP_SEC_WEBSOCKET_KEY")
+        if (sock is None or not key or environ.get("HTTP_UPGRADE", "").lower() != "websocket"
+                or environ.get("HTTP_SEC_WEBSOCKET_VERSION") != "13"):
+            raise WebSocketUnsupported("需要 WebSocket 握手请求（且运行在内置服务器下）")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode("ascii")).digest()).decode("ascii")
+        sock.sendall(("HTTP/1.1 101 Switching Protocols\r\n"
+                      "Upgrade: websocket\r\n"
+                      "Connection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("ascii"))
+        return cls(sock)
+
+    # ------------------------------------------------------------------ #
+    # 收
+    # ------------------------------------------------------------------ #
+    def _recv_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise WebSocketClosed("连接已断开")
+            data += chunk
+        return data
+
+    def _read_frame(self):
+        first, second = self._recv_exact(2)
+        fin, opcode = first & 0x80, first & 0x0F
+        masked, length = second & 0x80, second & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._recv_exact(8))[0]
+        if not masked:
+            raise WebSocketClosed("客户端帧未加掩码")
+        if length > MAX_MESSAGE_SIZE:
+            raise WebSocketClosed("消息过大")
+        mask = self._recv_exact(4)
+        payload = self._recv_exact(length)
+        if length:
+            key = (mask * (length // 4 + 1))[:length]
+            payload = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(length, "big")
+        return bool(fin), opcode, payload
+
+    def receive(self, timeout=None):
+        """返回一条文本消息（str）；timeout 秒内没有数据返回 None；连接关闭时抛出 WebSocketClosed"""
+        if self.closed:
+            raise WebSocketClosed("连接已关闭")
+        parts = []
+        try:
+            while True:
+                # 等待下一帧开始到达（分片消息的后续帧按 IO_TIMEOUT 等待）；帧开始后整帧按 IO_TIMEOUT 读取
+                readable, _, _ = select.select([self.sock], [], [], IO_TIMEOUT if parts else timeout)
+                if not readable:
+                    if parts:
+                        raise WebSocketClosed("分片消息接收超时")
+                    return None
+                fin, opcode, payload = self._read_frame()
+                if opcode == OP_PING:
+                    self._send_frame(OP_PONG, payload)
+                elif opcode == OP_PONG:
+                    continue
+                elif opcode == OP_CLOSE:
+                    self.close()
+                    raise WebSocketClosed("对方关闭连接")
+                elif opcode in (OP_TEXT, OP_BINARY, OP_CONTINUATION):
+                    parts.append(payload)
+                    if sum(len(part) for part in parts) > MAX_MESSAGE_SIZE:
+                        raise WebSocketClosed("消息过大")
+                    if fin:
+                        return b"".join(parts).decode("utf-8")
+                else:
+                    raise WebSocketClosed(f"未知的帧类型 {opcode}")
+        except (OSError, UnicodeDecodeError) as e:
+            self.closed = True
+            raise WebSocketClosed(str(e)) from e
+
+    # ------------------------------------------------------------------ #
+    # 发
+    # ------------------------------------------------------------------ #
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            self.sock.sendall(header + payload)
+
+    def send(self, text):
+        """发送一条文本消息；连接已关闭时抛出 WebSocketClosed"""
+        if self.closed:
+            raise WebSocketClosed("连接已关闭")
+        try:
+            self._send_frame(OP_TEXT, text.encode("utf-8"))
+        except OSError as e:
+            self.closed = True
+            raise WebSocketClosed(str(e)) from e
+
+    def ping(self):
+        """发送 ping 帧（浏览器自动回复 pong），避免代理按空闲断开连接"""
+        if self.closed:
+            raise WebSocketClosed("连接已关闭")
+        try:
+            self._send_frame(OP_PING, b"")
+        except OSError as e:
+            self.closed = True
+            raise WebSocketClosed(str(e)) from e
+
+    def close(self, code=1000):
+        """发送关闭帧并断开 TCP 连接（服务端先断开，内置服务器随后结束该连接的处理线程）"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._send_frame(OP_CLOSE, struct.pack("!H", code))
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass